@@ -1,481 +1,254 @@
-import mysql.connector
-from mysql.connector import Error
+from abc import ABCMeta, abstractmethod
 from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.events import SlotSet
-from difflib import SequenceMatcher
-from textblob import TextBlob
-from typing import Dict, Text, Any, List
-
-# Utility: String similarity
-def is_similar(a: str, b: str) -> bool:
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio() > 0.5
-
-# Utility: General column query for matching product names
-def query_product_info(cursor, product_name: str, column: str):
-    product_name = product_name.strip().lower()
-    found_data = []
-
-    query = f"""
-        SELECT user_id, `Product Name`, {column}
-        FROM product_catalog
+from .concurrency import get_action_executor
+from .db import db_cursor, mysql_connector
+from .feedback_queue import get_feedback_queue
+from .metrics import ACTION_ERRORS, start_metrics_server, timed_action
+from .tracing import configure as configure_tracing, traced_action
+from .warmup import attach_ready_route, start_warmup
+from .products import BACKENDS, CATALOG_SNAPSHOT, PRODUCT_BACKEND, ProductLookupError, ProductRecord, get_resolver
+from .search_index import get_product_search
+from .shared_index import start_publisher
+from .workers import is_server_manager, shared_index_enabled
+from typing import Callable, Dict, Text, Any, List, Optional, Tuple
+
+# GET /ready on the action server's port, answered 200 once every worker is warm
+attach_ready_route()
+
+if is_server_manager():
+    # The Sanic manager runs no actions; with several workers it builds the
+    # product index (and catalog snapshot) once and every worker maps it
+    # (CHATON_SHARED_INDEX)
+    if shared_index_enabled():
+        start_publisher(BACKENDS[PRODUCT_BACKEND](), catalog=CATALOG_SNAPSHOT)
+else:
+    # GET /metrics for this action server, on CHATON_ACTIONS_METRICS_PORT (+ worker number)
+    start_metrics_server()
+    # Spans to CHATON_TRACE_FILE, when set
+    configure_tracing("chaton-actions")
+    # Pool, indexes and sentiment model load in the background; GET /ready reports when done
+    start_warmup()
+
+# Utility: Product name from the latest entity, falling back to the slot
+def get_product_name(tracker: Tracker) -> Optional[str]:
+    entities = tracker.latest_message.get("entities", [])
+    new_product = next((e["value"] for e in entities if e["entity"] == "product_name"), None)
+    product_name = new_product or tracker.get_slot("product_name")
+    return product_name.strip().lower() if product_name else None
+
+# Utility: (positive, negative, neutral) feedback counts kept by the feedback queue
+def feedback_counts(product_id: int) -> Tuple[int, int, int]:
+    with db_cursor() as cursor:
+        cursor.execute("""
+            SELECT positive, negative, neutral
+            FROM feedback_product_rollup
+            WHERE product_id = %s
+        """, (product_id,))
+        return cursor.fetchone() or (0, 0, 0)
+
+
+class AsyncAction(Action, metaclass=ABCMeta):
+    """Base for the custom actions: `arun` is a coroutine on the Sanic event loop.
+
+    Anything that may block (database, index builds, spool writes) is
+    awaited through `blocking`, which runs it on the action thread pool, so
+    one conversation waiting on MySQL does not hold up the others. Calls
+    wait for a slot first (CHATON_ACTION_CONCURRENCY / CHATON_ACTION_LIMITS).
     """
-    cursor.execute(query)
-    for (user_id, db_name, value) in cursor.fetchall():
-        if is_similar(product_name, db_name):
-            found_data.append(f"User {user_id}: {value}")
-    return found_data
 
-
-class ActionCheckAvailability(Action):
+    @abstractmethod
     def name(self) -> str:
-        return "action_check_availability"
+        ...
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    @abstractmethod
+    async def arun(self, dispatcher: CollectingDispatcher,
+                   tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+        ...
 
-        entities = tracker.latest_message.get("entities", [])
-        new_product = next((e["value"] for e in entities if e["entity"] == "product_name"), None)
+    @traced_action
+    @timed_action
+    async def run(self, dispatcher: CollectingDispatcher,
+                  tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+        async with get_action_executor().slot(self.name()):
+            return await self.arun(dispatcher, tracker, domain)
 
-        if new_product:
-            product_name = new_product.strip().lower()
-        else:
-            slot_product = tracker.get_slot("product_name")
-            product_name = slot_product.strip().lower() if slot_product else None
+    async def blocking(self, func: Callable[..., Any], *args) -> Any:
+        return await get_action_executor().run(func, *args)
 
-        if not product_name:
-            dispatcher.utter_message("sorry we don't have any product like that/n do you want any other product?")
-            return []
 
-        available_users = []
-        connection = None
-        cursor = None
+class ProductLookupAction(AsyncAction):
+    """Shared flow for the product questions: resolve the name, then answer.
 
-        try:
-            connection = mysql.connector.connect(
-                host="localhost", port=3308, user="root",
-                password="", database="product_data"
-            )
-            cursor = connection.cursor()
-
-            cursor.execute("""
-                SELECT DISTINCT user_id, `Product Name`
-                FROM product_catalog
-            """)
-            for (user_id, name) in cursor.fetchall():
-                if is_similar(product_name, name):
-                    available_users.append(f"User {user_id}")
-
-            if available_users:
-                dispatcher.utter_message(
-                    text=f"The '{product_name}' is available."
-                )
-                dispatcher.utter_message(
-                    response="utter_offer_more_options"
-                )
-                return [SlotSet("product_name", product_name)]
-            else:
-                dispatcher.utter_message(
-                    text=f"Sorry, we don't have a product named '{product_name}'."
-                )
-                return [SlotSet("product_name", None)]
-
-        except Error as err:
-            dispatcher.utter_message(f"Database error: {err}")
-            return []
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
-
-
-class ActionGettingPrice(Action):
-    def name(self) -> str:
-        return "action_getting_price"
+    Subclasses set `missing_product_message` and implement `respond`, which
+    receives the matching products (with owner details) best match first;
+    only the best one when `first_match_only` is set.
+    """
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    missing_product_message = "Please provide the product name."
+    first_match_only = False
 
-        entities = tracker.latest_message.get("entities", [])
-        new_product = next((e["value"] for e in entities if e["entity"] == "product_name"), None)
+    @abstractmethod
+    def respond(self, dispatcher: CollectingDispatcher, product_name: str,
+                products: List[ProductRecord]) -> List[Dict[Text, Any]]:
+        ...
 
-        if new_product:
-            product_name = new_product.strip().lower()
-        else:
-            product_name = tracker.get_slot("product_name")
-            if product_name:
-                product_name = product_name.strip().lower()
+    async def arun(self, dispatcher: CollectingDispatcher,
+                   tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
+        product_name = get_product_name(tracker)
         if not product_name:
-            dispatcher.utter_message("sorry we don't have any product like that")
+            dispatcher.utter_message(self.missing_product_message)
             return []
 
-        connection = None
-        cursor = None
-
         try:
-            connection = mysql.connector.connect(
-                host="localhost", port=3308, user="root",
-                password="", database="product_data"
-            )
-            cursor = connection.cursor()
-
-            cursor.execute("SELECT `Product Name`, SellPrice FROM product_catalog")
-            found = None
-            for (db_name, price) in cursor.fetchall():
-                if is_similar(product_name, db_name):
-                    found = (db_name, price)
-                    break
-
-            if found:
-                dispatcher.utter_message(
-                    text=f"The price of '{found[0]}' is {found[1]}."
-                )
-                dispatcher.utter_message(
-                    response="utter_offer_more_options"
-                )
-                return [SlotSet("product_name", found[0])]
+            resolver = get_resolver()
+            if self.first_match_only:
+                products = list(filter(None, [await self.blocking(resolver.resolve_first, product_name)]))
             else:
-                dispatcher.utter_message(
-                    text=f"Sorry, we don't have a product named '{product_name}'."
-                )
-                return [SlotSet("product_name", None)]
-
-        except Error as err:
+                products = await self.blocking(resolver.resolve, product_name)
+        except ProductLookupError as err:
+            ACTION_ERRORS.inc(action=self.name(), error=type(err).__name__)
             dispatcher.utter_message(f"Database error: {err}")
             return []
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
 
+        if not products:
+            dispatcher.utter_message(
+                text=f"Sorry, we don't have a product named '{product_name}'."
+            )
+            return [SlotSet("product_name", None)]
 
-class ActionQueryBrand(Action):
-    def name(self) -> str:
-        return "action_getting_brand"
+        return self.respond(dispatcher, product_name, products)
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker, domain) -> list:
 
-        entities = tracker.latest_message.get("entities", [])
-        new_product = next((e["value"] for e in entities if e["entity"] == "product_name"), None)
+class ActionCheckAvailability(ProductLookupAction):
+    missing_product_message = "sorry we don't have any product like that/n do you want any other product?"
+    # Any match answers the question
+    first_match_only = True
 
-        if new_product:
-            product_name = new_product.strip().lower()
-        else:
-            product_name = tracker.get_slot("product_name")
-            if product_name:
-                product_name = product_name.strip().lower()
+    def name(self) -> str:
+        return "action_check_availability"
 
-        if not product_name:
-            dispatcher.utter_message("Please provide the product name.")
-            return []
+    def respond(self, dispatcher, product_name, products):
+        dispatcher.utter_message(
+            text=f"The '{product_name}' is available."
+        )
+        dispatcher.utter_message(
+            response="utter_offer_more_options"
+        )
+        return [SlotSet("product_name", product_name)]
 
-        connection = None
-        cursor = None
-
-        try:
-            connection = mysql.connector.connect(
-                host="localhost", port=3308, user="root",
-                password="", database="product_data"
-            )
-            cursor = connection.cursor()
-            results = query_product_info(cursor, product_name, "Brand")
-
-            if results:
-                dispatcher.utter_message(
-                    text=f"Brand(s) for '{product_name}': {', '.join(results)}."
-                )
-                dispatcher.utter_message(
-                    response="utter_offer_more_options"
-                )
-                return [SlotSet("product_name", product_name)]
-            else:
-                dispatcher.utter_message(
-                    text=f"Sorry, we don't have a product named '{product_name}'."
-                )
-                return [SlotSet("product_name", None)]
-
-        except Error as err:
-            dispatcher.utter_message(f"Database error: {err}")
-            return []
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
 
+class ActionGettingPrice(ProductLookupAction):
+    missing_product_message = "sorry we don't have any product like that"
+    first_match_only = True
 
-class ActionQueryDescription(Action):
     def name(self) -> str:
-        return "action_getting_description"
+        return "action_getting_price"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker, domain) -> list:
+    def respond(self, dispatcher, product_name, products):
+        found = products[0]
+        dispatcher.utter_message(
+            text=f"The price of '{found.name}' is {found.price}."
+        )
+        dispatcher.utter_message(
+            response="utter_offer_more_options"
+        )
+        return [SlotSet("product_name", found.name)]
 
-        entities = tracker.latest_message.get("entities", [])
-        new_product = next((e["value"] for e in entities if e["entity"] == "product_name"), None)
 
-        if new_product:
-            product_name = new_product.strip().lower()
-        else:
-            product_name = tracker.get_slot("product_name")
-            if product_name:
-                product_name = product_name.strip().lower()
+class ProductColumnAction(ProductLookupAction):
+    """Lists one catalog column for every matching product, per owner."""
 
-        if not product_name:
-            dispatcher.utter_message("Please provide the product name.")
-            return []
+    column = None
+    label = None
 
-        connection = None
-        cursor = None
+    def respond(self, dispatcher, product_name, products):
+        results = [f"User {p.user_id}: {getattr(p, self.column)}" for p in products]
+        dispatcher.utter_message(
+            text=self.label.format(product_name=product_name, results=", ".join(results))
+        )
+        dispatcher.utter_message(
+            response="utter_offer_more_options"
+        )
+        return [SlotSet("product_name", product_name)]
 
-        try:
-            connection = mysql.connector.connect(
-                host="localhost", port=3308, user="root",
-                password="", database="product_data"
-            )
-            cursor = connection.cursor()
-            results = query_product_info(cursor, product_name, "Description")
-
-            if results:
-                dispatcher.utter_message(
-                    text=f"Description(s): {', '.join(results)}."
-                )
-                dispatcher.utter_message(
-                    response="utter_offer_more_options"
-                )
-                return [SlotSet("product_name", product_name)]
-            else:
-                dispatcher.utter_message(
-                    text=f"Sorry, we don't have a product named '{product_name}'."
-                )
-                return [SlotSet("product_name", None)]
 
-        except Error as err:
-            dispatcher.utter_message(f"Database error: {err}")
-            return []
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
+class ActionQueryBrand(ProductColumnAction):
+    column = "brand"
+    label = "Brand(s) for '{product_name}': {results}."
 
-
-class ActionQuerySize(Action):
     def name(self) -> str:
-        return "action_getting_size"
-
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker, domain) -> list:
+        return "action_getting_brand"
 
-        entities = tracker.latest_message.get("entities", [])
-        new_product = next((e["value"] for e in entities if e["entity"] == "product_name"), None)
 
-        if new_product:
-            product_name = new_product.strip().lower()
-        else:
-            product_name = tracker.get_slot("product_name")
-            if product_name:
-                product_name = product_name.strip().lower()
-
-        if not product_name:
-            dispatcher.utter_message("Please provide the product name.")
-            return []
+class ActionQueryDescription(ProductColumnAction):
+    column = "description"
+    label = "Description(s): {results}."
 
-        connection = None
-        cursor = None
+    def name(self) -> str:
+        return "action_getting_description"
 
-        try:
-            connection = mysql.connector.connect(
-                host="localhost", port=3308, user="root",
-                password="", database="product_data"
-            )
-            cursor = connection.cursor()
-            results = query_product_info(cursor, product_name, "Size")
-
-            if results:
-                dispatcher.utter_message(
-                    text=f"Size(s): {', '.join(results)}."
-                )
-                dispatcher.utter_message(
-                    response="utter_offer_more_options"
-                )
-                return [SlotSet("product_name", product_name)]
-            else:
-                dispatcher.utter_message(
-                    text=f"Sorry, we don't have a product named '{product_name}'."
-                )
-                return [SlotSet("product_name", None)]
 
-        except Error as err:
-            dispatcher.utter_message(f"Database error: {err}")
-            return []
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
+class ActionQuerySize(ProductColumnAction):
+    column = "size"
+    label = "Size(s): {results}."
 
-class ActionQueryLocation(Action):
     def name(self) -> str:
-        return "action_getting_location"
-
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker, domain) -> list:
-
-        entities = tracker.latest_message.get("entities", [])
-        new_product = next((e["value"] for e in entities if e["entity"] == "product_name"), None)
+        return "action_getting_size"
 
-        if new_product:
-            product_name = new_product.strip().lower()
-        else:
-            product_name = tracker.get_slot("product_name")
-            if product_name:
-                product_name = product_name.strip().lower()
 
-        if not product_name:
-            dispatcher.utter_message("we don't have a relevent product.")
-            return []
+class ActionQueryLocation(ProductLookupAction):
+    missing_product_message = "we don't have a relevent product."
+    first_match_only = True
 
-        connection = None
-        cursor = None
+    def name(self) -> str:
+        return "action_getting_location"
 
-        try:
-            connection = mysql.connector.connect(
-                host="localhost", port=3308, user="root",
-                password="", database="product_data"
+    def respond(self, dispatcher, product_name, products):
+        found = products[0]
+        if found.shop_address:
+            dispatcher.utter_message(
+                text=f"The shop location is: {found.shop_address}"
             )
-            cursor = connection.cursor()
-
-            owner_id = None
-            cursor.execute("""
-                SELECT DISTINCT user_id, `Product Name`
-                FROM product_catalog
-            """)
-            for (uid, db_name) in cursor.fetchall():
-                if is_similar(product_name, db_name):
-                    owner_id = uid
-                    product_name = db_name
-                    break
-
-            if owner_id is None:
-                dispatcher.utter_message(
-                    text=f"Sorry, we don't have a product named '{product_name}'."
-                )
-                return [SlotSet("product_name", None)]
-
-            cursor.execute("SELECT shop_address FROM users WHERE id = %s", (owner_id,))
-            result = cursor.fetchone()
-            if result:
-                dispatcher.utter_message(
-                    text=f"The shop location is: {result[0]}"
-                )
-                dispatcher.utter_message(
-                    response="utter_offer_more_options"
-                )
-                return [SlotSet("product_name", product_name)]
-            else:
-                dispatcher.utter_message("No shop address found.")
-                return [SlotSet("product_name", product_name)]
+            dispatcher.utter_message(
+                response="utter_offer_more_options"
+            )
+        else:
+            dispatcher.utter_message("No shop address found.")
+        return [SlotSet("product_name", found.name)]
 
-        except Error as err:
-            dispatcher.utter_message(f"Database error: {err}")
-            return []
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
 
+class ActionQueryContact(ProductLookupAction):
+    first_match_only = True
 
-class ActionQueryContact(Action):
     def name(self) -> str:
         return "action_getting_contact"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker, domain) -> list:
-
-        entities = tracker.latest_message.get("entities", [])
-        new_product = next((e["value"] for e in entities if e["entity"] == "product_name"), None)
-
-        if new_product:
-            product_name = new_product.strip().lower()
-        else:
-            product_name = tracker.get_slot("product_name")
-            if product_name:
-                product_name = product_name.strip().lower()
-
-        if not product_name:
-            dispatcher.utter_message("Please provide the product name.")
-            return []
-
-        connection = None
-        cursor = None
-
-        try:
-            connection = mysql.connector.connect(
-                host="localhost", port=3308, user="root",
-                password="", database="product_data"
-            )
-            cursor = connection.cursor()
-
-            owner_id = None
-            cursor.execute("""
-                SELECT DISTINCT user_id, `Product Name`
-                FROM product_catalog
-            """)
-            for (uid, db_name) in cursor.fetchall():
-                if is_similar(product_name, db_name):
-                    owner_id = uid
-                    product_name = db_name
-                    break
-
-            if owner_id is None:
-                dispatcher.utter_message(
-                    text=f"Sorry, we don't have a product named '{product_name}'."
-                )
-                return [SlotSet("product_name", None)]
-
-            cursor.execute(
-                "SELECT contact_email, phone_number FROM users WHERE id = %s", (owner_id,)
+    def respond(self, dispatcher, product_name, products):
+        found = products[0]
+        if found.contact_email or found.phone_number:
+            msg = "Contact info:\n"
+            if found.contact_email:
+                msg += f"- Email: {found.contact_email}\n"
+            if found.phone_number:
+                msg += f"- Phone: {found.phone_number}"
+            dispatcher.utter_message(text=msg.strip())
+            dispatcher.utter_message(
+                text="Would you like to know anything else about this product?"
             )
-            result = cursor.fetchone()
-
-            if result:
-                contact_email, phone_number = result
-                msg = "Contact info:\n"
-                if contact_email:
-                    msg += f"- Email: {contact_email}\n"
-                if phone_number:
-                    msg += f"- Phone: {phone_number}"
-                dispatcher.utter_message(text=msg.strip())
-                dispatcher.utter_message(
-                    text="Would you like to know anything else about this product?"
-                )
-                return [SlotSet("product_name", product_name)]
-            else:
-                dispatcher.utter_message("No contact information found.")
-                return [SlotSet("product_name", product_name)]
-
-        except Error as err:
-            dispatcher.utter_message(f"Database error: {err}")
-            return []
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
+        else:
+            dispatcher.utter_message("No contact information found.")
+        return [SlotSet("product_name", found.name)]
 
 
-class ActionStoreFeedback(Action):
+class ActionStoreFeedback(AsyncAction):
     def name(self) -> str:
         return "action_store_feedback"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def arun(self, dispatcher: CollectingDispatcher,
+                   tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         entities = tracker.latest_message.get("entities", [])
         new_product = next((e["value"] for e in entities if e["entity"] == "product_name"), None)
@@ -486,151 +259,101 @@ class ActionStoreFeedback(Action):
             product_name = tracker.get_slot("product_name")
 
         feedback_text = tracker.latest_message.get("text")
+        # Scored by the queue worker when the user gave no explicit sentiment
         sentiment = tracker.get_slot("sentiment")
 
-        if not sentiment and feedback_text:
-            blob = TextBlob(feedback_text)
-            polarity = blob.sentiment.polarity
-            if polarity >= 0.2:
-                sentiment = "positive"
-            elif polarity <= -0.2:
-                sentiment = "negative"
-            else:
-                sentiment = "neutral"
-
-        if not product_name or not feedback_text or not sentiment:
+        if not product_name or not feedback_text:
             dispatcher.utter_message(
                 text="Please provide the product name and your feedback."
             )
             return []
 
-        connection = None
-        cursor = None
-
         try:
-            connection = mysql.connector.connect(
-                host="localhost", port=3308, user="root",
-                password="", database="product_data"
-            )
-            cursor = connection.cursor()
-
-            cursor.execute("""
-                INSERT INTO feedback (product_name, feedback_text, sentiment)
-                VALUES (%s, %s, %s)
-            """, (product_name, feedback_text, sentiment))
-            connection.commit()
-
-            dispatcher.utter_message(
-                text=f"Thank you! Your feedback for '{product_name}' has been recorded."
-            )
+            # Appends to the spool file (and fsyncs it by default)
+            await self.blocking(lambda: get_feedback_queue().submit(product_name, feedback_text, sentiment))
+        except OSError as err:
+            ACTION_ERRORS.inc(action=self.name(), error=type(err).__name__)
+            dispatcher.utter_message(f"Sorry, your feedback could not be saved: {err}")
+            return []
 
-            return [
-                SlotSet("product_name", product_name),
-                SlotSet("sentiment", None)
-            ]
+        dispatcher.utter_message(
+            text=f"Thank you! Your feedback for '{product_name}' has been recorded."
+        )
 
-        except Error as err:
-            dispatcher.utter_message(f"Database error: {err}")
-            return []
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
+        return [
+            SlotSet("product_name", product_name),
+            SlotSet("sentiment", None)
+        ]
 
 
-class ActionQueryFeedbackSummary(Action):
+class ActionQueryFeedbackSummary(AsyncAction):
     def name(self) -> str:
         return "action_query_feedback_summary"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker, domain) -> List[Dict[Text, Any]]:
+    async def arun(self, dispatcher: CollectingDispatcher,
+                   tracker: Tracker, domain) -> List[Dict[Text, Any]]:
 
-        entities = tracker.latest_message.get("entities", [])
-        new_product = next((e["value"] for e in entities if e["entity"] == "product_name"), None)
-
-        if new_product:
-            product_name = new_product.strip().lower()
-        else:
-            product_name = tracker.get_slot("product_name")
-            if product_name:
-                product_name = product_name.strip().lower()
+        product_name = get_product_name(tracker)
 
         if not product_name:
             dispatcher.utter_message("Please provide the product name.")
             return []
 
-        connection = None
-        cursor = None
-
+        # Feedback is stored against the product its name resolved to
         try:
-            connection = mysql.connector.connect(
-                host="localhost", port=3308, user="root",
-                password="", database="product_data"
-            )
-            cursor = connection.cursor()
-
-            cursor.execute("""
-                SELECT sentiment, COUNT(*) FROM feedback
-                WHERE product_name = %s
-                GROUP BY sentiment
-            """, (product_name,))
-            rows = cursor.fetchall()
-
-            if not rows:
-                dispatcher.utter_message(
-                    text=f"Sorry, we don't have a product named '{product_name}'."
-                )
-                return [SlotSet("product_name", None)]
-
-            summary = {s: c for (s, c) in rows}
-            pos = summary.get("positive", 0)
-            neg = summary.get("negative", 0)
-            neu = summary.get("neutral", 0)
-
-            total = pos + neg + neu
-
-            if total == 0:
-                dispatcher.utter_message(
-                    text=f"No feedback data available for '{product_name}'."
-                )
-            elif pos > neg and pos > neu:
-                dispatcher.utter_message(
-                    text=f"Most customers are satisfied with '{product_name}'."
-                )
-            elif neg > pos and neg > neu:
-                dispatcher.utter_message(
-                    text=f"Many customers had concerns about '{product_name}'."
-                )
-            elif neu >= pos and neu >= neg:
-                dispatcher.utter_message(
-                    text=f"Feedback for '{product_name}' is mostly neutral."
-                )
-            else:
-                dispatcher.utter_message(
-                    text=f"Feedback for '{product_name}' is mixed."
-                )
+            product = await self.blocking(get_resolver().resolve_first, product_name)
+        except ProductLookupError as err:
+            ACTION_ERRORS.inc(action=self.name(), error=type(err).__name__)
+            dispatcher.utter_message(f"Database error: {err}")
+            return []
 
+        if product is None:
             dispatcher.utter_message(
-                text="Would you like to know anything else about this product?"
+                text=f"Sorry, we don't have a product named '{product_name}'."
             )
-            return [SlotSet("product_name", product_name)]
+            return [SlotSet("product_name", None)]
 
-        except Error as err:
+        try:
+            pos, neg, neu = await self.blocking(feedback_counts, product.id)
+        except mysql_connector.Error as err:
+            ACTION_ERRORS.inc(action=self.name(), error=type(err).__name__)
             dispatcher.utter_message(f"Database error: {err}")
             return []
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
 
-class ActionSearchByDescription(Action):
+        total = pos + neg + neu
+
+        if total == 0:
+            dispatcher.utter_message(
+                text=f"No feedback data available for '{product_name}'."
+            )
+        elif pos > neg and pos > neu:
+            dispatcher.utter_message(
+                text=f"Most customers are satisfied with '{product_name}'."
+            )
+        elif neg > pos and neg > neu:
+            dispatcher.utter_message(
+                text=f"Many customers had concerns about '{product_name}'."
+            )
+        elif neu >= pos and neu >= neg:
+            dispatcher.utter_message(
+                text=f"Feedback for '{product_name}' is mostly neutral."
+            )
+        else:
+            dispatcher.utter_message(
+                text=f"Feedback for '{product_name}' is mixed."
+            )
+
+        dispatcher.utter_message(
+            text="Would you like to know anything else about this product?"
+        )
+        return [SlotSet("product_name", product_name)]
+
+class ActionSearchByDescription(AsyncAction):
     def name(self) -> str:
         return "action_search_by_description"
 
-    def run(self, dispatcher: CollectingDispatcher,
-            tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
+    async def arun(self, dispatcher: CollectingDispatcher,
+                   tracker: Tracker, domain: Dict[Text, Any]) -> List[Dict[Text, Any]]:
 
         query_text = tracker.latest_message.get("text")
 
@@ -640,52 +363,28 @@ class ActionSearchByDescription(Action):
             )
             return []
 
-        connection = None
-        cursor = None
-
         try:
-            connection = mysql.connector.connect(
-                host="localhost", port=3308, user="root",
-                password="", database="product_data"
-            )
-            cursor = connection.cursor()
-
-            # Full-Text Search Query
-            sql = """
-                SELECT `Product Name`, Description,
-                       MATCH(Description) AGAINST(%s) AS score
-                FROM product_catalog
-                WHERE MATCH(Description) AGAINST(%s)
-                ORDER BY score DESC
-                LIMIT 5
-            """
-
-            cursor.execute(sql, (query_text, query_text))
-            rows = cursor.fetchall()
-
-            if not rows:
-                dispatcher.utter_message(
-                    "Sorry, I couldn't find any products matching your description."
-                )
-                return []
-
-            message = "Here are some products I found:\n"
-            for (name, description, score) in rows:
-                snippet = (description[:80] + "...") if description and len(description) > 80 else description
-                message += f"\n• {name}: {snippet}"
-
-            dispatcher.utter_message(message.strip())
+            results = await self.blocking(get_product_search().search, query_text, 5)
+        except ProductLookupError as err:
+            ACTION_ERRORS.inc(action=self.name(), error=type(err).__name__)
+            dispatcher.utter_message(f"Database error: {err}")
+            return []
+
+        if not results:
             dispatcher.utter_message(
-                "Would you like more details about any of these products?"
+                "Sorry, I couldn't find any products matching your description."
             )
-
             return []
 
-        except Error as err:
-            dispatcher.utter_message(f"Database error: {err}")
-            return []
-        finally:
-            if cursor:
-                cursor.close()
-            if connection:
-                connection.close()
+        message = "Here are some products I found:\n"
+        for (product, score) in results:
+            description = product.description
+            snippet = (description[:80] + "...") if description and len(description) > 80 else description
+            message += f"\n• {product.name}: {snippet}"
+
+        dispatcher.utter_message(message.strip())
+        dispatcher.utter_message(
+            "Would you like more details about any of these products?"
+        )
+
+        return []
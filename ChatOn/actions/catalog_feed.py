@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from typing import Callable, List, Optional
+
+# Touched by the Flask app after every product_catalog write
+CATALOG_STAMP = os.environ.get(
+    "CHATON_CATALOG_STAMP",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "catalog.stamp"),
+)
+
+# Also read the changelog every N seconds even if the stamp is unchanged
+# (needed when the web app runs on another host); 0 disables polling
+POLL_INTERVAL = float(os.environ.get("CHATON_CATALOG_POLL_INTERVAL", "0"))
+
+# Maximum changelog rows applied per poll
+POLL_BATCH = int(os.environ.get("CHATON_CATALOG_POLL_BATCH", "1000"))
+
+# One row of the catalog_changes table; `version` is its auto-increment id
+CatalogChange = namedtuple("CatalogChange", ["version", "product_id", "op"])
+
+
+def catalog_stamp() -> tuple:
+    try:
+        stat = os.stat(CATALOG_STAMP)
+    except OSError:
+        return ()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class CatalogFeed:
+    """Delivers catalog_changes rows to subscribers in version order.
+
+    `source` provides `latest_version()` and `changes_since(version, limit)`;
+    either may return None when the backend keeps no changelog, in which
+    case subscribers receive None and must reload from scratch. `poll()` is
+    cheap to call on every lookup: it only queries the changelog when the
+    stamp file changed or POLL_INTERVAL has elapsed.
+    """
+
+    def __init__(self, source, poll_interval: float = POLL_INTERVAL, batch: int = POLL_BATCH):
+        self.source = source
+        self.poll_interval = poll_interval
+        self.batch = batch
+        self.version: Optional[int] = None
+        self._subscribers: List[Callable[[Optional[List[CatalogChange]]], None]] = []
+        self._stamp = catalog_stamp()
+        self._polled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[Optional[List[CatalogChange]]], None]) -> None:
+        self._subscribers.append(callback)
+
+    def _notify(self, changes: Optional[List[CatalogChange]]) -> None:
+        for callback in self._subscribers:
+            callback(changes)
+
+    def start(self) -> None:
+        """Remember the current changelog head; call before loading any snapshot."""
+        with self._lock:
+            if self.version is None:
+                self.version = self.source.latest_version()
+
+    def rewind(self, version: Optional[int]) -> bool:
+        """Deliver the changes after `version` again on the next poll.
+
+        For a snapshot built at an older version than this feed has reached;
+        subscribers must treat repeated changes as no-ops. True if it moved back.
+        """
+        with self._lock:
+            if version is None or self.version is None or version >= self.version:
+                return False
+            self.version = version
+            return True
+
+    def poll(self, force: bool = False) -> None:
+        stamp = catalog_stamp()
+        due = self.poll_interval and time.monotonic() - self._polled_at >= self.poll_interval
+        if not force and not due and stamp == self._stamp:
+            return
+
+        with self._lock:
+            self._stamp = stamp
+            self._polled_at = time.monotonic()
+            if self.version is None:
+                self.version = self.source.latest_version()
+                if self.version is None:
+                    self._notify(None)
+                return
+            while True:
+                changes = self.source.changes_since(self.version, self.batch)
+                if changes is None:
+                    self._notify(None)
+                    return
+                if not changes:
+                    return
+                self.version = changes[-1].version
+                self._notify(changes)
+                if len(changes) < self.batch:
+                    return
@@ -0,0 +1,339 @@
+import math
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Text
+
+from .product_index import IndexedProduct
+from .section_file import SectionFile, string_table, write_sections
+
+MAGIC = b"CHATONCS"
+FORMAT_VERSION = 1
+
+# Missing user ids and prices in the integer columns
+NULL_ID = -1
+NULL_CENTS = -2 ** 63
+
+# ProductRecord's fields, in order (products.py builds its backend on this module)
+FIELDS = (
+    "id", "user_id", "name", "brand", "size", "price", "description",
+    "shop_address", "contact_email", "phone_number",
+)
+OWNER_FIELDS = ("shop_address", "contact_email", "phone_number")
+
+
+# ---------------------------------
+# Columns
+# ---------------------------------
+# Every column answers column[pos] with the value a ProductRecord would
+# hold; in memory the values sit in arrays and interned strings, in a
+# mapped snapshot they are decoded from the file on access.
+class IdColumn:
+    def __init__(self, values: Sequence[int]):
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, pos: int) -> Optional[int]:
+        value = self.values[pos]
+        return None if value == NULL_ID else value
+
+
+class PriceColumn:
+    """DECIMAL prices as scaled integers (cents), or floats with NaN for NULL.
+
+    MySQL hands back Decimal and gets Decimal back, so "12.50" still prints
+    as 12.50. SQLite stores integral prices as integers, and integral floats
+    come back as int for the same reason.
+    """
+
+    def __init__(self, values: Sequence, scale: Optional[int]):
+        self.values = values
+        self.scale = scale
+
+    @classmethod
+    def build(cls, prices: List) -> "PriceColumn":
+        decimals = [p for p in prices if isinstance(p, Decimal)]
+        if decimals:
+            scale = max(0, max(-p.as_tuple().exponent for p in decimals))
+            return cls(array("q", (
+                NULL_CENTS if p is None else int(Decimal(str(p)).scaleb(scale)) for p in prices
+            )), scale)
+        return cls(array("d", (math.nan if p is None else p for p in prices)), None)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, pos: int):
+        value = self.values[pos]
+        if self.scale is not None:
+            return None if value == NULL_CENTS else Decimal(value).scaleb(-self.scale)
+        if math.isnan(value):
+            return None
+        return int(value) if value.is_integer() else value
+
+
+class CodedColumn:
+    """Few distinct values (brand, size): a code per row into `values`; -1 is None."""
+
+    def __init__(self, codes: Sequence[int], values: List[Text]):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def build(cls, column: Iterable[Optional[Text]]) -> "CodedColumn":
+        codes, values, seen = array("i"), [], {}
+        for value in column:
+            if value is None:
+                codes.append(-1)
+                continue
+            code = seen.get(value)
+            if code is None:
+                code = seen[value] = len(values)
+                values.append(sys.intern(value))
+            codes.append(code)
+        return cls(codes, values)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, pos: int) -> Optional[Text]:
+        code = self.codes[pos]
+        return None if code == -1 else self.values[code]
+
+
+class StringColumn:
+    """Strings decoded from a mapped (end offsets, utf-8 blob, null flags) triple."""
+
+    def __init__(self, offsets: Sequence[int], blob: memoryview, nulls: Sequence[int]):
+        self.offsets = offsets
+        self.blob = blob
+        self.nulls = nulls
+
+    def __len__(self) -> int:
+        return len(self.nulls)
+
+    def __getitem__(self, pos: int) -> Optional[Text]:
+        if self.nulls[pos]:
+            return None
+        return str(self.blob[self.offsets[pos]:self.offsets[pos + 1]], "utf-8")
+
+
+# Utility: the same string object for equal values (names repeat across shops)
+def interned(values: Iterable[Optional[Text]]) -> List[Optional[Text]]:
+    return [None if value is None else sys.intern(value) for value in values]
+
+
+# Utility: approximate heap bytes of a column, counting each distinct object once
+def column_bytes(column, seen: set) -> int:
+    if isinstance(column, (array, memoryview)):
+        return sys.getsizeof(column) if isinstance(column, array) else 0
+    if isinstance(column, (IdColumn, PriceColumn)):
+        return column_bytes(column.values, seen)
+    if isinstance(column, CodedColumn):
+        return column_bytes(column.codes, seen) + column_bytes(column.values, seen)
+    if isinstance(column, StringColumn):
+        return 0
+    size = sys.getsizeof(column)
+    for value in column:
+        if value is not None and id(value) not in seen:
+            seen.add(id(value))
+            size += sys.getsizeof(value)
+    return size
+
+
+# ---------------------------------
+# Snapshot and record views
+# ---------------------------------
+class ProductView:
+    """A ProductRecord-shaped row of a CatalogSnapshot, read on attribute access."""
+
+    __slots__ = ("snapshot", "pos")
+
+    def __init__(self, snapshot: "CatalogSnapshot", pos: int):
+        self.snapshot = snapshot
+        self.pos = pos
+
+    def record(self) -> tuple:
+        """The row's values in ProductRecord field order."""
+        return self.snapshot.record(self.pos)
+
+    def __iter__(self):
+        return iter(self.record())
+
+    def __eq__(self, other) -> bool:
+        return tuple(self) == tuple(other)
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __repr__(self) -> Text:
+        return "ProductView(" + ", ".join(f"{f}={v!r}" for f, v in zip(FIELDS, self)) + ")"
+
+
+def _field(name: Text):
+    def get(self):
+        return self.snapshot.value(name, self.pos)
+    get.__name__ = name
+    return property(get)
+
+
+for _name in FIELDS:
+    setattr(ProductView, _name, _field(_name))
+
+
+class CatalogSnapshot:
+    """The joined catalog (ProductRecord rows) stored column by column.
+
+    Ids, user ids and prices are flat arrays, names and descriptions are
+    interned strings, brand and size are dictionary-coded, and shop details
+    are kept once per owner instead of once per product. Rows are sorted by
+    id; `get` finds one by binary search and returns a ProductView. `save`
+    writes the same columns to a file that `open` maps read-only, so every
+    process mapping it shares one copy.
+    """
+
+    def __init__(self, columns: Dict[Text, object], owners: Dict[Text, object],
+                 version: Optional[int] = None, created: Optional[float] = None,
+                 mapped: Optional[SectionFile] = None):
+        self.columns = columns
+        self.owners = owners
+        self.ids = columns["id"].values
+        self.owner_ids = owners["user_id"].values
+        self.version = version
+        self.created = created if created is not None else time.time()
+        self.mapped = mapped
+        self._usage: Optional["OrderedDict[Text, int]"] = None
+
+    @classmethod
+    def from_records(cls, records: Iterable[tuple], version: Optional[int] = None) -> "CatalogSnapshot":
+        rows = sorted(records, key=lambda r: r[0])
+        owners = {}
+        for row in rows:
+            if row[1] is not None:
+                owners.setdefault(row[1], row[7:])
+        owner_ids = sorted(owners)
+        columns = {
+            "id": IdColumn(array("q", (r[0] for r in rows))),
+            "user_id": IdColumn(array("q", (NULL_ID if r[1] is None else r[1] for r in rows))),
+            "name": interned(r[2] for r in rows),
+            "brand": CodedColumn.build(r[3] for r in rows),
+            "size": CodedColumn.build(r[4] for r in rows),
+            "price": PriceColumn.build([r[5] for r in rows]),
+            "description": interned(r[6] for r in rows),
+        }
+        owner_columns = {"user_id": IdColumn(array("q", owner_ids))}
+        for i, field in enumerate(OWNER_FIELDS):
+            owner_columns[field] = interned(owners[user_id][i] for user_id in owner_ids)
+        return cls(columns, owner_columns, version)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def position(self, product_id: int) -> Optional[int]:
+        pos = bisect_left(self.ids, product_id)
+        if pos < len(self.ids) and self.ids[pos] == product_id:
+            return pos
+        return None
+
+    def get(self, product_id: int) -> Optional[ProductView]:
+        pos = self.position(product_id)
+        return None if pos is None else ProductView(self, pos)
+
+    def _owner(self, user_id: Optional[int]) -> Optional[int]:
+        if user_id is None:
+            return None
+        pos = bisect_left(self.owner_ids, user_id)
+        if pos < len(self.owner_ids) and self.owner_ids[pos] == user_id:
+            return pos
+        return None
+
+    def value(self, field: Text, pos: int):
+        if field in self.columns:
+            return self.columns[field][pos]
+        owner = self._owner(self.columns["user_id"][pos])
+        return None if owner is None else self.owners[field][owner]
+
+    def record(self, pos: int) -> tuple:
+        owner = self._owner(self.columns["user_id"][pos])
+        row = tuple(self.columns[field][pos] for field in FIELDS[:7])
+        if owner is None:
+            return row + (None,) * len(OWNER_FIELDS)
+        return row + tuple(self.owners[field][owner] for field in OWNER_FIELDS)
+
+    def views(self) -> Iterable[ProductView]:
+        return (ProductView(self, pos) for pos in range(len(self)))
+
+    def names(self) -> Iterable[IndexedProduct]:
+        users, names = self.columns["user_id"], self.columns["name"]
+        return (IndexedProduct(self.ids[pos], users[pos], names[pos]) for pos in range(len(self)))
+
+    def memory_usage(self) -> "OrderedDict[Text, int]":
+        """Approximate bytes per column; a mapped snapshot reports its file as "mapped"."""
+        if self._usage is not None:
+            return self._usage
+        usage, seen = OrderedDict(), set()
+        for field, column in self.columns.items():
+            usage[field] = column_bytes(column, seen)
+        for field in OWNER_FIELDS:
+            usage[field] = column_bytes(self.owners[field], seen)
+        usage["owners"] = column_bytes(self.owners["user_id"], seen)
+        if self.mapped is not None:
+            usage["mapped"] = self.mapped.size
+        self._usage = usage
+        return usage
+
+    # -----------------------------
+    # On-disk format
+    # -----------------------------
+    def save(self, path: Text) -> int:
+        """Write the snapshot for `open`; returns the file size."""
+        sections = OrderedDict([
+            ("id", array("q", self.ids)),
+            ("user_id", array("q", self.columns["user_id"].values)),
+            ("owner_id", array("q", self.owner_ids)),
+        ])
+        price = self.columns["price"]
+        sections["price"] = array("d" if price.scale is None else "q", price.values)
+        for field in ("brand", "size"):
+            sections[f"{field}_codes"] = array("i", self.columns[field].codes)
+            sections[f"{field}_offsets"], sections[f"{field}_values"] = string_table(self.columns[field].values)
+        strings = [(field, self.columns[field]) for field in ("name", "description")]
+        strings += [(field, self.owners[field]) for field in OWNER_FIELDS]
+        for field, column in strings:
+            values = [column[pos] for pos in range(len(column))]
+            sections[f"{field}_offsets"], sections[f"{field}_blob"] = string_table(values)
+            sections[f"{field}_nulls"] = bytes(value is None for value in values)
+        meta = {"version": self.version, "created": self.created, "rows": len(self),
+                "price_scale": price.scale}
+        return write_sections(path, MAGIC, FORMAT_VERSION, meta, sections)
+
+    @classmethod
+    def open(cls, path: Text) -> "CatalogSnapshot":
+        mapped = SectionFile(path, MAGIC, FORMAT_VERSION)
+        view = mapped.view
+
+        def strings(field):
+            return StringColumn(view(f"{field}_offsets"), view(f"{field}_blob"), view(f"{field}_nulls"))
+
+        def coded(field):
+            offsets, blob = view(f"{field}_offsets"), view(f"{field}_values")
+            values = [sys.intern(str(blob[offsets[i]:offsets[i + 1]], "utf-8")) for i in range(len(offsets) - 1)]
+            return CodedColumn(view(f"{field}_codes"), values)
+
+        columns = {
+            "id": IdColumn(view("id")),
+            "user_id": IdColumn(view("user_id")),
+            "name": strings("name"),
+            "brand": coded("brand"),
+            "size": coded("size"),
+            "price": PriceColumn(view("price"), mapped.meta["price_scale"]),
+            "description": strings("description"),
+        }
+        owners = {"user_id": IdColumn(view("owner_id"))}
+        owners.update((field, strings(field)) for field in OWNER_FIELDS)
+        return cls(columns, owners, mapped.meta["version"], mapped.meta["created"], mapped)
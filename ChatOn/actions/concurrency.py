@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional, Text
+
+from .metrics import REGISTRY, histogram, stats_metrics
+
+# Threads per action server process for the blocking part of actions
+# (database queries, index builds, spool writes); keep it below
+# CHATON_DB_POOL_SIZE. 0 runs that work on the event loop, as before
+ACTION_THREADS = int(os.environ.get("CHATON_ACTION_THREADS", "8"))
+
+# Calls of one action running at once per process; further calls wait on
+# the event loop without holding a thread. 0 means no limit
+ACTION_CONCURRENCY = int(os.environ.get("CHATON_ACTION_CONCURRENCY", "16"))
+
+# Per-action overrides, e.g. "action_getting_brand=2,action_store_feedback=4"
+ACTION_LIMITS = os.environ.get("CHATON_ACTION_LIMITS", "")
+
+ACTION_WAIT_SECONDS = histogram(
+    "chaton_action_wait_seconds", "Time an action call waited for a concurrency slot", ["action"]
+)
+
+
+def parse_limits(spec: Text) -> Dict[Text, int]:
+    limits = {}
+    for part in spec.split(","):
+        action, _, limit = part.partition("=")
+        if action.strip():
+            limits[action.strip()] = int(limit or 0)
+    return limits
+
+
+class ActionExecutor:
+    """Runs the blocking work of async actions off the Sanic event loop.
+
+    `run` hands a call to a pool of `threads` threads and awaits it, so other
+    conversations keep being served meanwhile; the caller's tracing context
+    goes with it. `slot(action)` bounds how many calls of one action are in
+    progress (`limits`, else `concurrency`), so a burst of one slow action
+    cannot take every thread. The counters are only touched on the loop.
+    """
+
+    def __init__(self, threads: int = ACTION_THREADS, concurrency: int = ACTION_CONCURRENCY,
+                 limits: Optional[Dict[Text, int]] = None):
+        self.threads = threads
+        self.concurrency = concurrency
+        self.limits = parse_limits(ACTION_LIMITS) if limits is None else limits
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="action") if threads > 0 else None
+        # Semaphores belong to one event loop; a process normally has just one
+        self._slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Text, asyncio.Semaphore]]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.waiting = 0
+
+    def limit(self, action: Text) -> int:
+        return self.limits.get(action, self.concurrency)
+
+    def _semaphore(self, action: Text) -> Optional[asyncio.Semaphore]:
+        limit = self.limit(action)
+        if limit <= 0:
+            return None
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            slots = self._slots.setdefault(loop, {})
+            if action not in slots:
+                slots[action] = asyncio.Semaphore(limit)
+            return slots[action]
+
+    @asynccontextmanager
+    async def slot(self, action: Text):
+        semaphore = self._semaphore(action)
+        if semaphore is None:
+            yield
+            return
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        ACTION_WAIT_SECONDS.observe(time.perf_counter() - started, action=action)
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        self.calls += 1
+        if self._pool is None:
+            return func(*args)
+        call = functools.partial(contextvars.copy_context().run, func, *args)
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, call)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[Text, float]:
+        return {"threads": self.threads, "in_flight": self.in_flight, "waiting": self.waiting, "calls": self.calls}
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+
+_executor: Optional[ActionExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_action_executor() -> ActionExecutor:
+    """Process-wide executor sized by CHATON_ACTION_THREADS."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ActionExecutor()
+    return _executor
+
+
+def set_action_executor(executor: ActionExecutor) -> None:
+    """Swap the executor used by every action (benchmarks)."""
+    global _executor
+    with _executor_lock:
+        _executor = executor
+
+
+def executor_metrics():
+    if _executor is None:
+        return []
+    return stats_metrics("chaton_action_executor", "Action thread pool", _executor.stats(), counters=("calls",))
+
+
+REGISTRY.add_collector(executor_metrics)
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from . import tracing
+from .lazy import lazy_import
+from .metrics import DB_CONNECT_SECONDS, TimedCursor, counter, histogram
+
+# Imported by the first connection, not when the actions package loads
+mysql_connector = lazy_import("mysql.connector")
+
+# ---------------------------------
+# Connection settings (single source for every action)
+# ---------------------------------
+DB_CONFIG = {
+    "host": os.environ.get("CHATON_DB_HOST", "localhost"),
+    "port": int(os.environ.get("CHATON_DB_PORT", "3308")),
+    "user": os.environ.get("CHATON_DB_USER", "root"),
+    "password": os.environ.get("CHATON_DB_PASSWORD", ""),
+    "database": os.environ.get("CHATON_DB_NAME", "product_data"),
+    # Every action statement stands alone, so skip the extra COMMIT round trip
+    "autocommit": True,
+}
+
+# Maximum number of open connections held by the action server
+POOL_SIZE = int(os.environ.get("CHATON_DB_POOL_SIZE", "10"))
+
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = float(os.environ.get("CHATON_DB_POOL_TIMEOUT", "5"))
+
+# Connections opened by the startup warmup (at most POOL_SIZE)
+POOL_WARM = int(os.environ.get("CHATON_DB_POOL_WARM", "4"))
+
+# Every checkout pings its connection (reconnecting if the server dropped
+# it); set this to N > 0 to ping only connections idle for more than N
+# seconds, saving a round trip per checkout at the risk of handing out a
+# connection killed within the last N seconds
+POOL_PING_AFTER = float(os.environ.get("CHATON_DB_POOL_PING_AFTER", "0"))
+
+POOL_WAIT_SECONDS = histogram("chaton_db_pool_wait_seconds", "Time to check a connection out of the pool")
+POOL_TIMEOUTS = counter("chaton_db_pool_timeouts_total", "Checkouts that gave up waiting for a connection")
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections shared by all actions.
+
+    Connections are opened lazily up to `size`. Checkout waits at most
+    `timeout` seconds for a free slot and raises PoolError (a
+    mysql.connector Error) otherwise. Connections are health-checked with a
+    reconnecting ping when checked out (only after `ping_after` idle
+    seconds, if set), and a connection that fails while in use is
+    dropped instead of being returned.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 ping_after: float = POOL_PING_AFTER, **config):
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.config = config or DB_CONFIG
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _open(self):
+        with DB_CONNECT_SECONDS.time():
+            return mysql_connector.connect(**self.config)
+
+    def _checkout(self):
+        with self._lock:
+            idle = self._idle.pop() if self._idle else None
+        if idle is None:
+            return self._open()
+
+        connection, last_used = idle
+        if self.ping_after <= 0 or time.monotonic() - last_used > self.ping_after:
+            try:
+                connection.ping(reconnect=True, attempts=2, delay=0)
+            except mysql_connector.Error:
+                self._discard(connection)
+                return self._open()
+        return connection
+
+    def _wait_for_slot(self) -> bool:
+        return self._slots.acquire(timeout=self.timeout)
+
+    def acquire(self):
+        with tracing.span("db checkout"):
+            started = time.perf_counter()
+            if not self._wait_for_slot():
+                POOL_TIMEOUTS.inc()
+                raise mysql_connector.PoolError(msg=f"No database connection available after {self.timeout}s")
+            try:
+                connection = self._checkout()
+            except BaseException:
+                self._slots.release()
+                raise
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+            return connection
+
+    def release(self, connection, broken: bool = False) -> None:
+        try:
+            if broken:
+                self._discard(connection)
+            else:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def warm(self, count: Optional[int] = None) -> int:
+        """Open up to `count` connections now so early requests skip the handshake."""
+        count = self.size if count is None else min(count, self.size)
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(self.acquire())
+        finally:
+            for connection in connections:
+                self.release(connection)
+        return len(connections)
+
+    @staticmethod
+    def _discard(connection) -> None:
+        try:
+            connection.close()
+        except mysql_connector.Error:
+            pass
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        broken = False
+        try:
+            yield connection
+        except BaseException:
+            try:
+                connection.rollback()
+            except mysql_connector.Error:
+                broken = True
+            raise
+        finally:
+            self.release(connection, broken)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool, created on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+# ---------------------------------
+# Cursor helper used by the actions
+# ---------------------------------
+@contextmanager
+def db_cursor(dictionary=False):
+    with get_pool().connection() as connection:
+        # Buffered so an early return never leaves unread rows on a pooled connection
+        cursor = connection.cursor(buffered=True, dictionary=dictionary)
+        try:
+            yield TimedCursor(cursor)
+        finally:
+            cursor.close()
+
+
+@contextmanager
+def db_transaction():
+    """Cursor whose statements commit together, or are rolled back together."""
+    with get_pool().connection() as connection:
+        connection.start_transaction()
+        cursor = connection.cursor(buffered=True)
+        try:
+            yield TimedCursor(cursor)
+            connection.commit()
+        finally:
+            cursor.close()
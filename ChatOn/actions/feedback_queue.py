@@ -0,0 +1,402 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Text, Tuple
+
+from .db import db_transaction, mysql_connector
+from .metrics import REGISTRY, Gauge, counter
+from .products import ProductLookupError, get_resolver
+from .sentiment import get_scorer
+from .workers import WORKERS, worker_number
+
+logger = logging.getLogger(__name__)
+
+# Append-only file holding feedback that is not in the database yet; Sanic
+# worker n of the action server uses its own file, this path + ".n". The byte
+# offset of the first entry not yet in the database is kept next to it in
+# the spool path + ".offset"
+SPOOL_PATH = os.environ.get(
+    "CHATON_FEEDBACK_SPOOL",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "feedback.spool"),
+)
+
+# Failed writes of one batch before its entries are written one at a time;
+# an entry that still fails with anything but a connection error is moved
+# to the dead-letter file (the spool path + ".dead") instead of blocking the rest
+MAX_ATTEMPTS = int(os.environ.get("CHATON_FEEDBACK_MAX_ATTEMPTS", "5"))
+
+# Flush once this many entries are queued...
+FLUSH_SIZE = int(os.environ.get("CHATON_FEEDBACK_FLUSH_SIZE", "100"))
+# ...or at least this often (seconds)
+FLUSH_INTERVAL = float(os.environ.get("CHATON_FEEDBACK_FLUSH_INTERVAL", "2"))
+# Once this many bytes of the spool are written to the database, the rest is
+# moved to a fresh file (an empty queue truncates it right away)
+ROTATE_BYTES = int(os.environ.get("CHATON_FEEDBACK_ROTATE_BYTES", str(16 * 1024 * 1024)))
+# fsync every spooled entry so a host crash cannot lose acknowledged feedback
+FSYNC = os.environ.get("CHATON_FEEDBACK_FSYNC", "1").lower() in ("1", "true", "yes")
+
+FLUSH_ERRORS = counter("chaton_feedback_flush_errors_total", "Failed feedback batch writes")
+DEAD_LETTERS = counter("chaton_feedback_dead_letters_total", "Feedback entries moved to the dead-letter file")
+
+INSERT_SQL = """
+    INSERT INTO feedback (product_name, product_id, user_id, feedback_text, sentiment)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+PRODUCT_ROLLUP_SQL = """
+    INSERT INTO feedback_product_rollup (product_id, positive, negative, neutral, other)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        positive = positive + VALUES(positive),
+        negative = negative + VALUES(negative),
+        neutral = neutral + VALUES(neutral),
+        other = other + VALUES(other)
+"""
+
+DAILY_ROLLUP_SQL = """
+    INSERT INTO feedback_product_daily (product_id, day, positive, negative, neutral, other)
+    VALUES (%s, UTC_DATE(), %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        positive = positive + VALUES(positive),
+        negative = negative + VALUES(negative),
+        neutral = neutral + VALUES(neutral),
+        other = other + VALUES(other)
+"""
+
+SENTIMENT_COLUMNS = ("positive", "negative", "neutral")
+
+
+# Utility: sentiment counts per linked product for one batch, in rollup column order
+def rollup_rows(batch: List[Dict]) -> List[tuple]:
+    counts: Dict[int, List[int]] = {}
+    for entry in batch:
+        if entry.get("product_id") is None:
+            continue
+        row = counts.setdefault(entry["product_id"], [0, 0, 0, 0])
+        sentiment = entry["sentiment"]
+        row[SENTIMENT_COLUMNS.index(sentiment) if sentiment in SENTIMENT_COLUMNS else 3] += 1
+    return [(product_id, *row) for product_id, row in counts.items()]
+
+
+# Utility: this process's spool file and the spools it takes over at start
+def worker_spools(path: Text = SPOOL_PATH, workers: int = WORKERS) -> Tuple[Text, List[Text]]:
+    """(own spool, orphaned spools) for this Sanic worker; (path, []) outside one.
+
+    Worker 0 also takes the unsuffixed spool of a single-process run, and
+    worker n the spools of workers numbered n + workers, n + 2 * workers, ...
+    left behind when the server restarts with fewer workers.
+    """
+    number = worker_number()
+    if number is None:
+        return path, []
+    orphans = [path] if number == 0 and os.path.exists(path) else []
+    for other in sorted(glob.glob(glob.escape(path) + ".*")):
+        match = re.fullmatch(r"\.(\d+)", other[len(path):])
+        if match and int(match.group(1)) >= workers and int(match.group(1)) % workers == number:
+            orphans.append(other)
+    return f"{path}.{number}", orphans
+
+
+# Utility: connection trouble, as opposed to an entry the database rejects
+def is_transient(err: Exception) -> bool:
+    return isinstance(err, (mysql_connector.OperationalError, mysql_connector.InterfaceError,
+                            mysql_connector.PoolError))
+
+
+# Utility: fill in product_id / user_id from the product matcher, once per name
+def link_products(batch: List[Dict]) -> None:
+    resolver = get_resolver()
+    links: Dict[Text, tuple] = {}
+    for entry in batch:
+        if "product_id" in entry:
+            continue
+        name = entry["product_name"]
+        if name not in links:
+            try:
+                record = resolver.resolve_first(name)
+            except ProductLookupError as err:
+                # Stored unlinked; the link_feedback job can resolve it later
+                logger.warning("Feedback product lookup failed: %s", err)
+                record = None
+            links[name] = (record.id, record.user_id) if record else (None, None)
+        entry["product_id"], entry["user_id"] = links[name]
+
+
+class FeedbackQueue:
+    """Durable queue between ActionStoreFeedback and the feedback table.
+
+    `submit` appends the entry to the spool file and returns; a background
+    thread scores missing sentiments, links each entry to the catalog
+    product its name resolves to, and writes queued entries with one
+    multi-row INSERT per batch, together with the per-product sentiment
+    rollups in the same transaction, then moves the spool's committed offset
+    past them. The spool is only appended to, and is truncated or rotated once
+    its written part is large (`rotate_bytes`), so a flush never rewrites
+    the pending entries. Entries past the committed offset after a crash or
+    restart are loaded again on start, so delivery is at-least-once. Each process needs its own `spool_path`; the entries of
+    `adopt` (spools nobody else writes any more) are taken over at start. A
+    batch that keeps failing is written entry by entry after `max_attempts`
+    tries, and entries the database rejects go to the dead-letter file.
+    """
+
+    def __init__(self, spool_path: Text = SPOOL_PATH, flush_size: int = FLUSH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, fsync: bool = FSYNC,
+                 max_attempts: int = MAX_ATTEMPTS, adopt: List[Text] = (),
+                 rotate_bytes: int = ROTATE_BYTES):
+        self.spool_path = spool_path
+        self.offset_path = spool_path + ".offset"
+        self.dead_letter_path = spool_path + ".dead"
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+        self.rotate_bytes = rotate_bytes
+        self.attempts = 0
+        # (entry, byte offset where its spool line ends), oldest first
+        _, self._pending, self._size = self._load_spool(spool_path)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._spool = open(self.spool_path, "ab")
+        # Drop a torn last line from a crash mid-write so the next entry starts on its own line
+        self._spool.truncate(self._size)
+        self._worker: Optional[threading.Thread] = None
+        if adopt:
+            self._adopt(adopt)
+
+    @staticmethod
+    def _load_spool(path: Text) -> Tuple[int, List[Tuple[Dict, int]], int]:
+        """(committed offset, pending entries with their end offsets, bytes up to the last whole line)."""
+        try:
+            with open(path + ".offset", encoding="utf-8") as marker:
+                committed = int(marker.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            committed = 0
+        try:
+            with open(path, "rb") as spool:
+                data = spool.read()
+        except FileNotFoundError:
+            return 0, [], 0
+        if committed > len(data):
+            committed = 0
+        entries, end = [], committed
+        while True:
+            newline = data.find(b"\n", end)
+            if newline < 0:
+                return committed, entries, end
+            line, end = data[end:newline], newline + 1
+            try:
+                entries.append((json.loads(line), end))
+            except ValueError:
+                continue
+
+    def _adopt(self, paths: List[Text]) -> None:
+        # Into our own spool first, so a crash in between only duplicates entries
+        for path in paths:
+            for entry, _ in self._load_spool(path)[1]:
+                self._append(entry)
+        self._sync()
+        for path in paths:
+            os.remove(path)
+            if os.path.exists(path + ".offset"):
+                os.remove(path + ".offset")
+            logger.info("Feedback spool %s taken over by %s", path, self.spool_path)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _append(self, entry: Dict) -> None:
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        self._spool.write(line)
+        self._size += len(line)
+        self._pending.append((entry, self._size))
+
+    def _sync(self) -> None:
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
+
+    def submit(self, product_name: Text, feedback_text: Text, sentiment: Optional[Text] = None) -> None:
+        entry = {"product_name": product_name, "feedback_text": feedback_text, "sentiment": sentiment}
+        with self._lock:
+            self._append(entry)
+            self._sync()
+            full = len(self._pending) >= self.flush_size
+        if full:
+            self._wakeup.set()
+
+    def _mark_committed(self, offset: int) -> None:
+        tmp_path = self.offset_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as tmp:
+            tmp.write(str(offset))
+            tmp.flush()
+            if self.fsync:
+                os.fsync(tmp.fileno())
+        os.replace(tmp_path, self.offset_path)
+
+    def _commit(self, done: int) -> None:
+        """Drop the first `done` pending entries and record that the spool is written up to them."""
+        with self._lock:
+            offset = self._pending[done - 1][1]
+            del self._pending[:done]
+        self._mark_committed(offset)
+        if offset >= self.rotate_bytes:
+            with self._lock:
+                self._rotate(offset)
+
+    def _rotate(self, offset: int) -> None:
+        # Under _lock. Offset 0 is recorded first, so a crash before the swap
+        # only replays entries that are already written
+        tail_path = self.spool_path + ".tmp"
+        if self._size > offset:
+            with open(self.spool_path, "rb") as spool, open(tail_path, "wb") as tail:
+                spool.seek(offset)
+                tail.write(spool.read(self._size - offset))
+                tail.flush()
+                os.fsync(tail.fileno())
+        self._mark_committed(0)
+        if self._size > offset:
+            self._spool.close()
+            os.replace(tail_path, self.spool_path)
+            self._spool = open(self.spool_path, "ab")
+        else:
+            self._spool.truncate(0)
+        self._pending = [(entry, end - offset) for entry, end in self._pending]
+        self._size -= offset
+
+    def write_batch(self, batch: List[Dict]) -> None:
+        """Score and insert one batch; raises mysql Error if the insert fails."""
+        unscored = [entry for entry in batch if not entry["sentiment"]]
+        sentiments = get_scorer().score_batch([entry["feedback_text"] for entry in unscored])
+        for entry, sentiment in zip(unscored, sentiments):
+            entry["sentiment"] = sentiment
+        link_products(batch)
+        rollups = rollup_rows(batch)
+        with db_transaction() as cursor:
+            cursor.executemany(INSERT_SQL, [
+                (entry["product_name"], entry["product_id"], entry["user_id"],
+                 entry["feedback_text"], entry["sentiment"])
+                for entry in batch
+            ])
+            if rollups:
+                cursor.executemany(PRODUCT_ROLLUP_SQL, rollups)
+                cursor.executemany(DAILY_ROLLUP_SQL, rollups)
+
+    def _dead_letter(self, entry: Dict, err: Exception) -> None:
+        logger.error("Feedback entry moved to the dead-letter file: %s", err)
+        record = dict(entry, error=str(err), failed_at=time.time())
+        with open(self.dead_letter_path, "a", encoding="utf-8") as dead:
+            dead.write(json.dumps(record) + "\n")
+            dead.flush()
+            os.fsync(dead.fileno())
+        DEAD_LETTERS.inc()
+
+    def _write_singly(self, batch: List[Dict]) -> int:
+        """Write `batch` one entry at a time; returns how many entries were handled.
+
+        Rejected entries go to the dead-letter file. A connection error stops
+        early, leaving the rest for the next pass.
+        """
+        for done, entry in enumerate(batch):
+            try:
+                self.write_batch([entry])
+            except Exception as err:
+                if is_transient(err):
+                    if done:
+                        return done
+                    raise
+                self._dead_letter(entry, err)
+        return len(batch)
+
+    def flush(self) -> int:
+        """Write everything queued so far; returns the number of entries stored or set aside."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [entry for entry, _ in self._pending[:self.flush_size]]
+                if not batch:
+                    return written
+                if self.attempts < self.max_attempts:
+                    try:
+                        self.write_batch(batch)
+                    except Exception:
+                        self.attempts += 1
+                        raise
+                    done = len(batch)
+                else:
+                    done = self._write_singly(batch)
+                self.attempts = 0
+                if done:
+                    self._commit(done)
+                written += done
+
+    def _run(self) -> None:
+        # Load the sentiment lexicon here rather than on a user's turn
+        try:
+            get_scorer().load()
+        except Exception as err:
+            logger.warning("Sentiment lexicon failed to load: %s", err)
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as err:
+                # Entries stay spooled and are retried on the next pass
+                FLUSH_ERRORS.inc()
+                logger.warning("Feedback flush failed: %s", err)
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="feedback-queue", daemon=True)
+            self._worker.start()
+            atexit.register(self.stop)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        try:
+            self.flush()
+        except mysql_connector.Error as err:
+            logger.error("Feedback flush failed, entries kept in spool: %s", err)
+
+
+_queue: Optional[FeedbackQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_feedback_queue() -> FeedbackQueue:
+    """Process-wide queue; its worker starts on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                spool_path, orphans = worker_spools()
+                _queue = FeedbackQueue(spool_path, adopt=orphans)
+                _queue.start()
+    return _queue
+
+
+def set_feedback_queue(queue: FeedbackQueue) -> None:
+    """Swap the queue ActionStoreFeedback submits to (benchmarks); it is not started here."""
+    global _queue
+    with _queue_lock:
+        _queue = queue
+
+
+def queue_metrics():
+    if _queue is None:
+        return []
+    depth = Gauge("chaton_feedback_queue_depth", "Feedback entries spooled but not yet written")
+    depth.set(len(_queue))
+    return [depth]
+
+
+REGISTRY.add_collector(queue_metrics)
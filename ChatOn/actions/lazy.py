@@ -0,0 +1,48 @@
+import importlib
+import importlib.util
+from types import ModuleType
+from typing import Text
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    `mysql_connector = lazy_import("mysql.connector")` costs nothing at
+    startup; `mysql_connector.connect(...)` or an `except
+    mysql_connector.Error` clause that is reached imports the real module
+    once (the import system's own lock makes that thread safe).
+    """
+
+    def __init__(self, name: Text):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__["_module"]
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self._name)
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr: Text):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> Text:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name: Text) -> LazyModule:
+    return LazyModule(name)
+
+
+def module_available(name: Text) -> bool:
+    """Whether `name` could be imported, without importing it (parent packages aside)."""
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return False
+    return spec is not None
@@ -0,0 +1,349 @@
+import bisect
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Text, Tuple
+
+from . import tracing
+from .workers import worker_number
+
+# Port for the action server's /metrics endpoint and a per-worker /ready; 0 turns
+# both off (the action server's own port also serves /ready for all workers)
+ACTIONS_METRICS_PORT = int(os.environ.get("CHATON_ACTIONS_METRICS_PORT", "5056"))
+
+# Seconds; suits anything from a cached lookup to a slow Rasa turn
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Counts, e.g. names compared per fuzzy lookup
+SIZE_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Sample = Tuple[Text, Dict[Text, Text], float]
+
+
+def _escape(value) -> Text:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[Text, Text]) -> Text:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> Text:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """One named metric family with a fixed set of label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: Text, help_text: Text, labelnames: Sequence[Text] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[Text, Text]) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> Dict[Text, Text]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last)], sum
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield self.name + "_bucket", dict(labels, le=_format_value(bound)), cumulative
+            yield self.name + "_count", labels, cumulative
+            yield self.name + "_sum", labels, total
+
+
+class Registry:
+    """Metrics plus collectors that report current values when scraped."""
+
+    def __init__(self):
+        self._metrics: Dict[Text, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            # Re-importing a module hands back the metric it created first
+            return self._metrics.setdefault(metric.name, metric)
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> List[Metric]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collector in collectors:
+            try:
+                metrics.extend(collector())
+            except Exception as err:
+                print("Metrics collector failed:", err)
+        return metrics
+
+    def render(self) -> Text:
+        """Prometheus text exposition format."""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: Text, help_text: Text, labelnames: Sequence[Text] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help_text, labelnames))
+
+
+def gauge(name: Text, help_text: Text, labelnames: Sequence[Text] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help_text, labelnames))
+
+
+def histogram(name: Text, help_text: Text, labelnames: Sequence[Text] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help_text, labelnames, buckets))
+
+
+# Utility: metrics built from a stats() dict at scrape time, e.g. pool or cache stats
+def stats_metrics(prefix: Text, help_text: Text, stats: Dict[Text, float],
+                  counters: Sequence[Text] = ()) -> List[Metric]:
+    """Keys listed in `counters` only ever grow and become `<prefix>_<key>_total`."""
+    metrics = []
+    for key, value in stats.items():
+        if not isinstance(value, (int, float)):
+            continue
+        if key in counters:
+            metric = Counter(f"{prefix}_{key}_total", f"{help_text}: {key}")
+            metric.inc(value)
+        else:
+            metric = Gauge(f"{prefix}_{key}", f"{help_text}: {key}")
+            metric.set(value)
+        metrics.append(metric)
+    return metrics
+
+
+# ---------------------------------
+# Database timing (both processes)
+# ---------------------------------
+DB_CONNECT_SECONDS = histogram("chaton_db_connect_seconds", "Time to open a MySQL connection")
+DB_QUERY_SECONDS = histogram(
+    "chaton_db_query_seconds", "Time spent in cursor.execute/executemany", ["statement"]
+)
+DB_ERRORS = counter("chaton_db_errors_total", "MySQL errors raised by queries", ["statement"])
+
+
+class TimedCursor:
+    """Cursor proxy that times execute/executemany by SQL verb.
+
+    Inside a trace each statement also gets a span carrying its SQL.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, method, sql, *args):
+        statement = sql.split(None, 1)[0].upper() if sql.strip() else "?"
+        started = time.perf_counter()
+        db_span = tracing.start_span(f"db {statement}", tracing.CLIENT)
+        if db_span.sampled:
+            db_span.set_attribute("db.system", "mysql")
+            db_span.set_attribute("db.statement", " ".join(sql.split())[:2000])
+        try:
+            with tracing.activate(db_span):
+                return method(sql, *args)
+        except Exception:
+            DB_ERRORS.inc(statement=statement)
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, statement=statement)
+
+    def execute(self, sql, *args, **kwargs):
+        return self._timed(lambda s, *a: self._cursor.execute(s, *a, **kwargs), sql, *args)
+
+    def executemany(self, sql, *args):
+        return self._timed(self._cursor.executemany, sql, *args)
+
+
+# ---------------------------------
+# Action server
+# ---------------------------------
+ACTION_SECONDS = histogram("chaton_action_seconds", "Action.run latency", ["action"])
+ACTION_ERRORS = counter("chaton_action_errors_total", "Errors in Action.run, raised or reported to the user", ["action", "error"])
+
+
+def timed_action(run):
+    """Decorator for Action.run (plain or async) recording latency and errors per action name."""
+    @contextmanager
+    def timed(action):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as err:
+            ACTION_ERRORS.inc(action=action, error=type(err).__name__)
+            raise
+        finally:
+            ACTION_SECONDS.observe(time.perf_counter() - started, action=action)
+
+    if inspect.iscoroutinefunction(run):
+        @wraps(run)
+        async def async_wrapper(self, *args, **kwargs):
+            with timed(self.name()):
+                return await run(self, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(run)
+    def wrapper(self, *args, **kwargs):
+        with timed(self.name()):
+            return run(self, *args, **kwargs)
+    return wrapper
+
+
+# Extra GET endpoints on the metrics port: path -> () -> (status, content type, body)
+ROUTES: Dict[Text, Callable[[], Tuple[int, Text, Text]]] = {}
+
+
+def add_route(path: Text, handler: Callable[[], Tuple[int, Text, Text]]) -> None:
+    ROUTES[path] = handler
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            status, content_type, text = 200, CONTENT_TYPE, REGISTRY.render()
+        elif path in ROUTES:
+            status, content_type, text = ROUTES[path]()
+        else:
+            self.send_error(404)
+            return
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = ACTIONS_METRICS_PORT, host: Text = "0.0.0.0") -> None:
+    """Serve GET /metrics and ROUTES on a daemon thread; safe to call more than once.
+
+    Sanic worker n of a multi-process action server listens on `port` + n.
+    """
+    global _server
+    if not port:
+        return
+    port += worker_number() or 0
+    with _server_lock:
+        if _server is not None:
+            return
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as err:
+            print(f"Metrics endpoint not started on port {port}:", err)
+            return
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
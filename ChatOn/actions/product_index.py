@@ -0,0 +1,345 @@
+import heapq
+import math
+import os
+import threading
+import time
+from bisect import insort
+from collections import Counter, OrderedDict, namedtuple
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Text, Tuple
+
+from . import tracing
+from .lazy import lazy_import, module_available
+from .metrics import SIZE_BUCKETS, counter, histogram
+
+# Imported by the first lookup that counts with it; without NumPy candidates
+# are counted with a Counter instead
+np = lazy_import("numpy")
+
+# Same cut-off as the `is_similar` helper the actions used before the index
+SIMILARITY_THRESHOLD = 0.5
+
+# Seconds before the resolver rebuilds the index from product_catalog
+INDEX_TTL = float(os.environ.get("CHATON_INDEX_TTL", "300"))
+
+# Number of recent query results remembered per index
+MEMO_SIZE = int(os.environ.get("CHATON_INDEX_MEMO_SIZE", "1024"))
+
+# Bounds a top-k lookup tries before SIMILARITY_THRESHOLD: names whose
+# quick_ratio bound is above the first are scored first, and lower ones only
+# while fewer than k names beat the bound
+TOP_K_BOUNDS = (0.9, 0.8, 0.7, 0.6)
+
+# Compute candidate bounds with NumPy when it is installed
+USE_NUMPY = module_available("numpy") and os.environ.get("CHATON_INDEX_NUMPY", "1").lower() in ("1", "true", "yes")
+
+FUZZY_CANDIDATES = histogram(
+    "chaton_fuzzy_candidates", "Names found by the character postings per lookup", buckets=SIZE_BUCKETS
+)
+FUZZY_COMPARED = histogram(
+    "chaton_fuzzy_compared", "Names scored with SequenceMatcher per lookup", buckets=SIZE_BUCKETS
+)
+FUZZY_MEMO = counter("chaton_fuzzy_memo_total", "Name index lookups answered from the memo", ["result"])
+
+IndexedProduct = namedtuple("IndexedProduct", ["id", "user_id", "name"])
+
+# Character classes for the quick_ratio bound; anything else shares the last column
+ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789 "
+CHAR_COLUMNS = {char: column for column, char in enumerate(ALPHABET)}
+
+
+# Utility: character counts per class, the input of the quick_ratio bound
+def char_counts(text: Text) -> List[int]:
+    counts = [0] * (len(ALPHABET) + 1)
+    for char in text:
+        counts[CHAR_COLUMNS.get(char, len(ALPHABET))] += 1
+    return counts
+
+
+# Utility: posting keys of a name: its k-th "a" is "a" + chr(k) + chr(len(text))
+def char_tokens(text: Text) -> List[Text]:
+    seen = Counter()
+    length = chr(len(text))
+    tokens = []
+    for char in text:
+        seen[char] += 1
+        tokens.append(f"{char}{chr(seen[char])}{length}")
+    return tokens
+
+
+# Utility: fewest characters two names of `total` combined length must share
+# for their quick_ratio (2 * shared / total) to exceed `bound`
+def shared_needed(bound: float, total: int) -> int:
+    return math.floor(bound * total / 2) + 1
+
+
+class ProductNameIndex:
+    """Character postings over the distinct lowercased product names.
+
+    Each name is posted under its length and every (character, occurrence)
+    pair, so the names sharing at least m characters with the query (the
+    count SequenceMatcher.quick_ratio uses) are found per length without
+    looking at the others: a name sharing m of the query's q characters
+    must have one of any q - m + 1 of them, and the rarest are used. Only
+    names whose quick_ratio bound beats the threshold are scored with the
+    ratio the original `is_similar` helper used, so results are exact.
+    Candidates are scored highest bound first; a top-k query starts at the
+    bounds in TOP_K_BOUNDS and stops once no name left can beat the k-th
+    score. A full match() still scores every name whose bound is above 0.5,
+    so its cost grows with that share of the catalog (a third to a half of
+    300k synthetic names built from a few dozen words). Matches are ranked
+    best first; equal scores keep catalog order.
+    """
+
+    def __init__(self, rows: List[IndexedProduct]):
+        self.rows: List[Optional[IndexedProduct]] = list(rows)
+        self.built_at = time.monotonic()
+
+        self._keys: List[Text] = []
+        self._key_ids: Dict[Text, int] = {}
+        self._rows_by_key: List[List[int]] = []
+        self._postings: Dict[Text, List[int]] = {}
+        self._name_lengths: set = set()
+        self._positions: Dict[int, int] = {}
+        # NumPy copies of the postings and name lengths, rebuilt lazily
+        self._posting_arrays: Dict[Text, "np.ndarray"] = {}
+        self._key_lengths: Optional["np.ndarray"] = None
+        self._key_chars: Optional["np.ndarray"] = None
+        self._memo: "OrderedDict[tuple, List[Tuple[int, float]]]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+        for pos, row in enumerate(self.rows):
+            self._positions[row.id] = pos
+            self._add(row, pos)
+
+    def _add(self, row: IndexedProduct, pos: int) -> None:
+        key = (row.name or "").lower()
+        key_id = self._key_ids.get(key)
+        if key_id is None:
+            key_id = self._key_ids[key] = len(self._keys)
+            self._keys.append(key)
+            self._rows_by_key.append([])
+            for token in char_tokens(key):
+                self._postings.setdefault(token, []).append(key_id)
+                self._posting_arrays.pop(token, None)
+            self._name_lengths.add(len(key))
+            self._key_lengths = None
+        insort(self._rows_by_key[key_id], pos)
+
+    def _drop(self, row: IndexedProduct, pos: int) -> None:
+        # The name stays in the postings; with no rows left it just never matches
+        self._rows_by_key[self._key_ids[(row.name or "").lower()]].remove(pos)
+
+    def _clear_memo(self) -> None:
+        with self._memo_lock:
+            self._memo.clear()
+
+    def upsert(self, row: IndexedProduct) -> bool:
+        """Add or replace one product; True when a name was added or changed.
+
+        New ids are appended, which keeps catalog order for auto-increment ids.
+        """
+        pos = self._positions.get(row.id)
+        if pos is None:
+            pos = self._positions[row.id] = len(self.rows)
+            self.rows.append(row)
+        else:
+            old = self.rows[pos]
+            self.rows[pos] = row
+            if (old.name or "").lower() == (row.name or "").lower():
+                return False
+            self._drop(old, pos)
+        self._add(row, pos)
+        self._clear_memo()
+        return True
+
+    def remove(self, product_id: int) -> bool:
+        pos = self._positions.pop(product_id, None)
+        if pos is None:
+            return False
+        self._drop(self.rows[pos], pos)
+        self.rows[pos] = None
+        self._clear_memo()
+        return True
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def age(self) -> float:
+        return time.monotonic() - self.built_at
+
+    def _key_arrays(self) -> Tuple["np.ndarray", "np.ndarray"]:
+        # Names are only ever appended, so just the new ones need converting
+        lengths, chars = self._key_lengths, self._key_chars
+        if lengths is None or len(lengths) != len(self._keys):
+            keys = self._keys
+            done = 0 if chars is None else len(chars)
+            new = np.array([char_counts(key) for key in keys[done:]], np.int16)
+            new = new.reshape(len(keys) - done, len(ALPHABET) + 1)
+            chars = self._key_chars = new if chars is None else np.vstack([chars, new])
+            lengths = self._key_lengths = np.fromiter(map(len, keys), np.int32, len(keys))
+        return lengths, chars
+
+    def _posting_array(self, token: Text) -> Optional["np.ndarray"]:
+        array = self._posting_arrays.get(token)
+        if array is None:
+            posting = self._postings.get(token)
+            if posting is None:
+                return None
+            array = self._posting_arrays[token] = np.array(posting, np.int32)
+        return array
+
+    def _probes(self, query: Text, bound: float) -> List[Tuple[List[Text], int]]:
+        """(posting keys, hits needed) per name length, covering every name whose
+        quick_ratio with `query` can exceed `bound`.
+
+        A name of length n shares at least m = shared_needed(bound, len(query) + n)
+        characters with the query, so of any p + e of the query's characters
+        (p = len(query) - m + 1) it holds at least e + 1. The rarest 2p are
+        taken: a few more postings to read, far fewer names to bound.
+        """
+        q_len = len(query)
+        occurrences = [token[:2] for token in char_tokens(query)]
+        probes = []
+        for length in tuple(self._name_lengths):
+            needed = shared_needed(bound, q_len + length)
+            if needed > min(q_len, length):
+                continue
+            sizes = []
+            for occurrence in occurrences:
+                token = occurrence + chr(length)
+                sizes.append((len(self._postings.get(token) or ()), token))
+            prefix = q_len - needed + 1
+            taken = min(q_len, 2 * prefix)
+            tokens = [token for size, token in heapq.nsmallest(taken, sizes) if size]
+            probes.append((tokens, taken - prefix + 1))
+        return probes
+
+    def _candidates_numpy(self, query: Text, bound: float) -> Tuple[List[int], List[float]]:
+        found = []
+        for tokens, hits_needed in self._probes(query, bound):
+            if tokens:
+                key_ids, hits = np.unique(np.concatenate(list(map(self._posting_array, tokens))), return_counts=True)
+                found.append(key_ids[hits >= hits_needed])
+        if not found:
+            return [], []
+        lengths, chars = self._key_arrays()
+        key_ids = np.sort(np.concatenate(found))
+        shared = np.minimum(chars[key_ids], np.array(char_counts(query), np.int16)).sum(axis=1)
+        bounds = 2.0 * shared / (lengths[key_ids] + len(query))
+        keep = bounds > bound
+        key_ids, bounds = key_ids[keep], bounds[keep]
+        order = np.argsort(-bounds, kind="stable")
+        return key_ids[order].tolist(), bounds[order].tolist()
+
+    def _candidates(self, query: Text, bound: float) -> Tuple[List[int], List[float]]:
+        """Names whose quick_ratio with `query` exceeds `bound`, highest bound first."""
+        if USE_NUMPY:
+            return self._candidates_numpy(query, bound)
+        key_ids = []
+        for tokens, hits_needed in self._probes(query, bound):
+            hits = Counter()
+            for token in tokens:
+                hits.update(self._postings.get(token))
+            key_ids.extend(key_id for key_id, count in hits.items() if count >= hits_needed)
+        # quick_ratio, with the shared characters counted by str.count
+        counts = Counter(query).items()
+        bounded = []
+        for key_id in sorted(key_ids):
+            key = self._keys[key_id]
+            upper = 2.0 * sum(min(count, key.count(char)) for char, count in counts) / (len(key) + len(query))
+            if upper > bound:
+                bounded.append((upper, key_id))
+        bounded.sort(key=lambda item: -item[0])
+        return [key_id for _, key_id in bounded], [upper for upper, _ in bounded]
+
+    def _scored_keys(self, query: Text, k: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(key id, ratio) for names above the threshold.
+
+        With `k`, only names that can still reach the k-th best score are
+        scored; that always covers the top k names, ties included.
+        """
+        with tracing.span("fuzzy match", **{"match.k": k or 0}) as span:
+            with self._memo_lock:
+                cached = self._memo.get((query, k))
+                if cached is None and k is not None:
+                    cached = self._memo.get((query, None))
+                if cached is not None:
+                    FUZZY_MEMO.inc(result="hit")
+                    span.set_attribute("match.memo_hit", True)
+                    return cached
+            FUZZY_MEMO.inc(result="miss")
+
+            steps = [bound for bound in TOP_K_BOUNDS if bound > SIMILARITY_THRESHOLD] if k is not None else []
+            bound = steps[0] if steps else SIMILARITY_THRESHOLD
+            matcher = SequenceMatcher(None, query, "")
+            scored = []
+            best: List[float] = []
+            done = set()
+            candidates = compared = 0
+            while True:
+                key_ids, uppers = self._candidates(query, bound)
+                candidates = len(key_ids)
+                for key_id, upper in zip(key_ids, uppers):
+                    if k is not None and len(best) >= k and upper < best[0]:
+                        break
+                    if key_id in done or not self._rows_by_key[key_id]:
+                        continue
+                    done.add(key_id)
+                    compared += 1
+                    matcher.set_seq2(self._keys[key_id])
+                    score = matcher.ratio()
+                    if score > SIMILARITY_THRESHOLD:
+                        scored.append((key_id, score))
+                        if k is not None:
+                            if len(best) < k:
+                                heapq.heappush(best, score)
+                            elif score > best[0]:
+                                heapq.heapreplace(best, score)
+                # Names not looked at yet have a bound of at most `bound`
+                if bound <= SIMILARITY_THRESHOLD or (len(best) >= k and best[0] > bound):
+                    break
+                bound = next((step for step in steps if step < bound), SIMILARITY_THRESHOLD)
+                if len(best) >= k:
+                    # No lower than names that could still tie the k-th score
+                    bound = max(bound, best[0] - 1e-9)
+            FUZZY_CANDIDATES.observe(candidates)
+            FUZZY_COMPARED.observe(compared)
+            span.set_attribute("match.candidates", candidates)
+            span.set_attribute("match.compared", compared)
+
+            with self._memo_lock:
+                self._memo[(query, k)] = scored
+                if len(self._memo) > MEMO_SIZE:
+                    self._memo.popitem(last=False)
+            return scored
+
+    def rank(self, product_name: Text, k: Optional[int] = None) -> List[Tuple[IndexedProduct, float]]:
+        """Rows similar to `product_name` with their ratio, best first.
+
+        Rows sharing a name share its score and keep catalog order; `k`
+        limits the number of rows returned.
+        """
+        query = product_name.strip().lower()
+        if not query:
+            return []
+        ranked = sorted(
+            ((score, self._rows_by_key[key_id]) for key_id, score in self._scored_keys(query, k)
+             if self._rows_by_key[key_id]),
+            key=lambda item: (-item[0], item[1][0]),
+        )
+        result = []
+        for score, positions in ranked:
+            for pos in positions:
+                result.append((self.rows[pos], score))
+                if k is not None and len(result) >= k:
+                    return result
+        return result
+
+    def match(self, product_name: Text) -> List[IndexedProduct]:
+        """All catalog rows whose name is similar to `product_name`, best match first."""
+        return [row for row, _ in self.rank(product_name)]
+
+    def first_match(self, product_name: Text) -> Optional[IndexedProduct]:
+        best = self.rank(product_name, k=1)
+        return best[0][0] if best else None
@@ -0,0 +1,547 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Text, Tuple
+
+from .cache import TTLCache
+from .catalog_feed import CatalogChange, CatalogFeed
+from .catalog_snapshot import FIELDS, CatalogSnapshot
+from .db import db_cursor, mysql_connector
+from . import tracing
+from .metrics import REGISTRY, Gauge, stats_metrics
+from .product_index import INDEX_TTL, IndexedProduct, ProductNameIndex
+from .shared_index import SHARED_INDEX_WAIT, SnapshotLoader, shared_catalog_path, shared_loader, wait_for_file
+
+logger = logging.getLogger(__name__)
+
+# Which backend the action server resolves products against: mysql or sqlite
+PRODUCT_BACKEND = os.environ.get("CHATON_PRODUCT_BACKEND", "mysql")
+SQLITE_PATH = os.environ.get("CHATON_SQLITE_PATH", "product_data.sqlite3")
+
+# Resolved lookups kept per normalised product name
+PRODUCT_CACHE_SIZE = int(os.environ.get("CHATON_PRODUCT_CACHE_SIZE", "1024"))
+PRODUCT_CACHE_TTL = float(os.environ.get("CHATON_PRODUCT_CACHE_TTL", "60"))
+
+# Answer record lookups from a columnar snapshot of the whole catalog, kept
+# current through the changelog, instead of querying per lookup
+CATALOG_SNAPSHOT = os.environ.get("CHATON_CATALOG_SNAPSHOT", "1").lower() in ("1", "true", "yes")
+
+# Changed products kept beside the snapshot before it is loaded again
+CATALOG_OVERLAY_MAX = int(os.environ.get("CHATON_CATALOG_OVERLAY_MAX", "10000"))
+
+# A catalog row joined with its owner's shop and contact details
+ProductRecord = namedtuple("ProductRecord", FIELDS)
+
+NAMES_SQL = """
+    SELECT id, user_id, `Product Name`
+    FROM product_catalog
+    ORDER BY id
+"""
+
+ALL_RECORDS_SQL = """
+    SELECT pc.id, pc.user_id, pc.`Product Name`, pc.Brand, pc.Size,
+           pc.SellPrice, pc.Description,
+           u.shop_address, u.contact_email, u.phone_number
+    FROM product_catalog pc
+    LEFT JOIN users u ON u.id = pc.user_id
+"""
+
+RECORDS_SQL = ALL_RECORDS_SQL + """
+    WHERE pc.id IN ({placeholders})
+"""
+
+LATEST_CHANGE_SQL = "SELECT COALESCE(MAX(id), 0) FROM catalog_changes"
+
+CHANGES_SQL = """
+    SELECT id, product_id, op
+    FROM catalog_changes
+    WHERE id > {placeholder}
+    ORDER BY id
+    LIMIT {limit}
+"""
+
+# MySQL "table doesn't exist": the changelog has not been created yet
+ER_NO_SUCH_TABLE = 1146
+
+
+class ProductLookupError(Exception):
+    """Backend failure while resolving a product; str() is the driver's message."""
+
+
+# ---------------------------------
+# Backends
+# ---------------------------------
+class ProductBackend:
+    """Where product names, joined product records and catalog changes come from.
+
+    A backend without a changelog returns None from `latest_version` and
+    `changes_since`, and consumers fall back to full reloads.
+    """
+
+    def load_names(self) -> List[IndexedProduct]:
+        raise NotImplementedError
+
+    def fetch(self, ids: List[int]) -> Dict[int, ProductRecord]:
+        raise NotImplementedError
+
+    def load_records(self) -> List[ProductRecord]:
+        raise NotImplementedError
+
+    def latest_version(self) -> Optional[int]:
+        return None
+
+    def changes_since(self, version: int, limit: int) -> Optional[List[CatalogChange]]:
+        return None
+
+
+class MySQLProductBackend(ProductBackend):
+    def load_names(self) -> List[IndexedProduct]:
+        try:
+            with db_cursor() as cursor:
+                cursor.execute(NAMES_SQL)
+                return [IndexedProduct(*row) for row in cursor.fetchall()]
+        except mysql_connector.Error as err:
+            raise ProductLookupError(err) from err
+
+    def fetch(self, ids: List[int]) -> Dict[int, ProductRecord]:
+        if not ids:
+            return {}
+        try:
+            with db_cursor() as cursor:
+                cursor.execute(RECORDS_SQL.format(placeholders=", ".join(["%s"] * len(ids))), ids)
+                return {row[0]: ProductRecord(*row) for row in cursor.fetchall()}
+        except mysql_connector.Error as err:
+            raise ProductLookupError(err) from err
+
+    def load_records(self) -> List[ProductRecord]:
+        try:
+            with db_cursor() as cursor:
+                cursor.execute(ALL_RECORDS_SQL + " ORDER BY pc.id")
+                return [ProductRecord(*row) for row in cursor.fetchall()]
+        except mysql_connector.Error as err:
+            raise ProductLookupError(err) from err
+
+    def _changelog(self, sql: Text, params: tuple = ()) -> Optional[list]:
+        try:
+            with db_cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+        except mysql_connector.Error as err:
+            if err.errno == ER_NO_SUCH_TABLE:
+                return None
+            raise ProductLookupError(err) from err
+
+    def latest_version(self) -> Optional[int]:
+        rows = self._changelog(LATEST_CHANGE_SQL)
+        return None if rows is None else rows[0][0]
+
+    def changes_since(self, version: int, limit: int) -> Optional[List[CatalogChange]]:
+        rows = self._changelog(CHANGES_SQL.format(placeholder="%s", limit=int(limit)), (version,))
+        return None if rows is None else [CatalogChange(*row) for row in rows]
+
+
+class SQLiteProductBackend(ProductBackend):
+    """Same schema in a SQLite file; SQLite accepts the backtick-quoted columns."""
+
+    def __init__(self, path: Text = SQLITE_PATH):
+        self.path = path
+
+    def _query(self, sql: Text, params: Iterable = ()) -> list:
+        try:
+            with sqlite3.connect(self.path) as connection:
+                return connection.execute(sql, list(params)).fetchall()
+        except sqlite3.Error as err:
+            raise ProductLookupError(err) from err
+
+    def load_names(self) -> List[IndexedProduct]:
+        return [IndexedProduct(*row) for row in self._query(NAMES_SQL)]
+
+    def fetch(self, ids: List[int]) -> Dict[int, ProductRecord]:
+        if not ids:
+            return {}
+        rows = self._query(RECORDS_SQL.format(placeholders=", ".join(["?"] * len(ids))), ids)
+        return {row[0]: ProductRecord(*row) for row in rows}
+
+    def load_records(self) -> List[ProductRecord]:
+        return [ProductRecord(*row) for row in self._query(ALL_RECORDS_SQL + " ORDER BY pc.id")]
+
+    def latest_version(self) -> Optional[int]:
+        try:
+            return self._query(LATEST_CHANGE_SQL)[0][0]
+        except ProductLookupError:
+            return None
+
+    def changes_since(self, version: int, limit: int) -> Optional[List[CatalogChange]]:
+        try:
+            rows = self._query(CHANGES_SQL.format(placeholder="?", limit=int(limit)), (version,))
+        except ProductLookupError:
+            return None
+        return [CatalogChange(*row) for row in rows]
+
+
+class InMemoryProductBackend(ProductBackend):
+    """Dict-backed catalog; `save` and `delete` append to an in-memory changelog."""
+
+    def __init__(self, records: Iterable[ProductRecord] = ()):
+        self.records = {record.id: record for record in records}
+        self.changes: List[CatalogChange] = []
+
+    def save(self, record: ProductRecord) -> None:
+        op = "update" if record.id in self.records else "insert"
+        self.records[record.id] = record
+        self.changes.append(CatalogChange(len(self.changes) + 1, record.id, op))
+
+    def delete(self, product_id: int) -> None:
+        self.records.pop(product_id, None)
+        self.changes.append(CatalogChange(len(self.changes) + 1, product_id, "delete"))
+
+    def latest_version(self) -> Optional[int]:
+        return len(self.changes)
+
+    def changes_since(self, version: int, limit: int) -> Optional[List[CatalogChange]]:
+        return self.changes[version:version + limit]
+
+    def load_names(self) -> List[IndexedProduct]:
+        return [
+            IndexedProduct(record.id, record.user_id, record.name)
+            for _, record in sorted(self.records.items())
+        ]
+
+    def fetch(self, ids: List[int]) -> Dict[int, ProductRecord]:
+        return {i: self.records[i] for i in ids if i in self.records}
+
+    def load_records(self) -> List[ProductRecord]:
+        return [record for _, record in sorted(self.records.items())]
+
+
+class SnapshotProductBackend(ProductBackend):
+    """Serves names and records from a CatalogSnapshot of `source`.
+
+    The snapshot is read once from `source`, or mapped from `path` (the file
+    the action server manager publishes for its workers). Changed products
+    are then fetched from `source` into a small overlay as the changelog
+    reports them, so `fetch` is a lookup in memory. Without a changelog, or
+    once the overlay holds `overlay_max` products, the snapshot is loaded
+    again. Records are ProductViews, and ProductRecords for changed products.
+    """
+
+    def __init__(self, source: ProductBackend, path: Optional[Text] = None,
+                 overlay_max: int = CATALOG_OVERLAY_MAX, wait: float = SHARED_INDEX_WAIT):
+        self.source = source
+        self.path = path
+        self.overlay_max = overlay_max
+        self.wait = wait
+        self.snapshot: Optional[CatalogSnapshot] = None
+        # Product id -> current record, or None once deleted; replaced, never mutated
+        self.overlay: Dict[int, Optional[ProductRecord]] = {}
+        self.loads = 0
+        self._feed: Optional[CatalogFeed] = None
+        self._stale = False
+        self._checked = 0.0
+        self._seen: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> Optional[CatalogSnapshot]:
+        """The file at `path` if it was published since the last load, else None."""
+        if not self.path or not wait_for_file(self.path, self.wait if self.snapshot is None else 0):
+            return None
+        try:
+            snapshot = CatalogSnapshot.open(self.path)
+        except (OSError, ValueError) as err:
+            logger.warning("Shared catalog %s unusable: %s", self.path, err)
+            return None
+        if snapshot.mapped.identity == self._seen:
+            # Already loaded once; reading the source is fresher
+            return None
+        self._seen = snapshot.mapped.identity
+        return snapshot
+
+    def _load(self) -> None:
+        feed = CatalogFeed(self.source)
+        feed.subscribe(lambda changes: self._apply(feed, changes))
+        # Pin the changelog head before reading, as ProductResolver does
+        feed.start()
+        snapshot = self._open()
+        if snapshot is not None:
+            feed.rewind(snapshot.version)
+        else:
+            snapshot = CatalogSnapshot.from_records(self.source.load_records(), feed.version)
+        self.snapshot, self.overlay, self._feed = snapshot, {}, feed
+        self._stale = False
+        self._checked = time.monotonic()
+        self.loads += 1
+        if logger.isEnabledFor(logging.DEBUG):
+            usage = snapshot.memory_usage()
+            logger.debug("Catalog snapshot: %d rows, %.1f MB%s", len(snapshot), sum(usage.values()) / 1e6,
+                         f" mapped from {self.path}" if snapshot.mapped is not None else "")
+
+    def _replaced(self) -> bool:
+        # A stat at most once a second for the manager's next publish
+        if not self.path or time.monotonic() - self._checked < 1:
+            return False
+        self._checked = time.monotonic()
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != self._seen
+
+    def _apply(self, feed: CatalogFeed, changes: Optional[List[CatalogChange]]) -> None:
+        if feed is not self._feed:
+            return
+        if changes is None:
+            self._stale = True
+            return
+        ids = sorted({change.product_id for change in changes})
+        records = self.source.fetch(ids)
+        with self._lock:
+            if feed is not self._feed:
+                return
+            overlay = dict(self.overlay)
+            for product_id in ids:
+                overlay[product_id] = records.get(product_id)
+            self.overlay = overlay
+            if len(overlay) >= self.overlay_max:
+                self._stale = True
+
+    def _current(self, force: bool = False) -> Tuple[CatalogSnapshot, Dict[int, Optional[ProductRecord]]]:
+        with self._lock:
+            if self.snapshot is None or self._stale or self._replaced():
+                self._load()
+            feed = self._feed
+        # Outside the lock: the feed calls back into _apply. Full loads force a
+        # changelog read so they cover everything up to the caller's pinned version
+        feed.poll(force=force and feed.version is not None)
+        with self._lock:
+            return self.snapshot, self.overlay
+
+    def load_names(self) -> List[IndexedProduct]:
+        snapshot, overlay = self._current(force=True)
+        rows = [row for row in snapshot.names() if row.id not in overlay]
+        if overlay:
+            rows += [IndexedProduct(r.id, r.user_id, r.name) for r in overlay.values() if r is not None]
+            rows.sort(key=lambda row: row.id)
+        return rows
+
+    def fetch(self, ids: List[int]) -> Dict[int, ProductRecord]:
+        snapshot, overlay = self._current()
+        found = {}
+        for product_id in ids:
+            record = overlay[product_id] if product_id in overlay else snapshot.get(product_id)
+            if record is not None:
+                found[product_id] = record
+        return found
+
+    def load_records(self) -> List[ProductRecord]:
+        snapshot, overlay = self._current(force=True)
+        records = [view for view in snapshot.views() if view.id not in overlay]
+        if overlay:
+            records += [record for record in overlay.values() if record is not None]
+            records.sort(key=lambda record: record.id)
+        return records
+
+    def latest_version(self) -> Optional[int]:
+        return self.source.latest_version()
+
+    def changes_since(self, version: int, limit: int) -> Optional[List[CatalogChange]]:
+        return self.source.changes_since(version, limit)
+
+    def stats(self) -> Dict[Text, float]:
+        return {
+            "rows": len(self.snapshot) if self.snapshot is not None else 0,
+            "overlay": len(self.overlay),
+            "loads": self.loads,
+        }
+
+
+BACKENDS = {
+    "mysql": MySQLProductBackend,
+    "sqlite": SQLiteProductBackend,
+    "memory": InMemoryProductBackend,
+}
+
+
+# ---------------------------------
+# Resolution service
+# ---------------------------------
+class ProductResolver:
+    """Fuzzy-matches a product name and returns the joined records.
+
+    The name index is built from `backend.load_names()` and rebuilt after
+    `ttl` seconds. Results are cached per normalised name, so follow-up
+    questions about the same product slot skip the backend entirely.
+    Catalog changes arrive through `feed`: edited products are patched into
+    the index and evicted from the cache instead of reloading everything.
+    With a `loader` (action server workers) the index is mapped from the
+    shared snapshot instead, and changes made after it are replayed.
+    Matching and index edits both hold `_lock`, so lookups from the action
+    thread pool never see a change half applied.
+    """
+
+    def __init__(self, backend: ProductBackend, ttl: float = INDEX_TTL,
+                 cache: Optional[TTLCache] = None, feed: Optional[CatalogFeed] = None,
+                 loader: Optional[SnapshotLoader] = None):
+        self.backend = backend
+        self.loader = loader
+        self.ttl = ttl
+        self.cache = cache if cache is not None else TTLCache(PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL)
+        self.feed = feed if feed is not None else CatalogFeed(backend)
+        self.feed.subscribe(self.apply_changes)
+        self._index: Optional[ProductNameIndex] = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> ProductNameIndex:
+        # Pin the changelog head before loading so later edits are replayed on top
+        self.feed.start()
+        mapped = None
+        with self._lock:
+            if self._index is None or self._index.age() > self.ttl:
+                with tracing.span("product index build") as span:
+                    if self.loader is None:
+                        self._index = self._build_index()
+                    else:
+                        self._index = mapped = self.loader.load(self._build_index)
+                    span.set_attribute("index.rows", len(self._index.rows))
+            index = self._index
+        # Outside the lock: a poll holds the feed's lock while it calls back
+        # into apply_changes, which takes ours. Changes another poll applies
+        # in between are simply replayed again
+        if mapped is not None and self.feed.rewind(getattr(mapped, "version", None)):
+            self.feed.poll(force=True)
+        return index
+
+    @contextmanager
+    def _matching(self):
+        index = self.index
+        with self._lock:
+            yield index
+
+    def _build_index(self) -> ProductNameIndex:
+        return ProductNameIndex(self.backend.load_names())
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._index = None
+        self.cache.clear()
+
+    def apply_changes(self, changes: Optional[List[CatalogChange]]) -> None:
+        if changes is None:
+            self.invalidate()
+            return
+
+        ids = sorted({change.product_id for change in changes})
+        records = self.backend.fetch(ids)
+        names_changed = False
+        with self._lock:
+            for product_id in ids:
+                record = records.get(product_id)
+                if self._index is None:
+                    names_changed = True
+                elif record is None:
+                    self._index.remove(product_id)
+                elif self._index.upsert(IndexedProduct(record.id, record.user_id, record.name)):
+                    names_changed = True
+
+        if names_changed:
+            # A new or renamed product can change what any cached name resolves to
+            self.cache.clear()
+        else:
+            changed = set(ids)
+            self.cache.discard_where(lambda value: any(r.id in changed for r in value))
+
+    def resolve(self, product_name: Text) -> List[ProductRecord]:
+        """Every matching product with owner details, best match first."""
+        with tracing.span("product resolve", **{"product.query": product_name}) as span:
+            self.feed.poll()
+            key = ("all", product_name.strip().lower())
+            cached = self.cache.get(key)
+            span.set_attribute("cache.hit", cached is not None)
+            if cached is not None:
+                return list(cached)
+
+            with self._matching() as index:
+                ids = [row.id for row in index.match(product_name)]
+            records = self.backend.fetch(ids)
+            result = [records[i] for i in ids if i in records]
+            self.cache.put(key, tuple(result))
+            span.set_attribute("product.matches", len(result))
+            return result
+
+    def rank(self, product_name: Text, k: int = 5) -> List[Tuple[ProductRecord, float]]:
+        """Top `k` matches with their similarity, e.g. to offer a choice."""
+        with tracing.span("product rank", **{"product.query": product_name, "product.k": k}):
+            self.feed.poll()
+            with self._matching() as index:
+                ranked = index.rank(product_name, k)
+            records = self.backend.fetch([row.id for row, _ in ranked])
+            return [(records[row.id], score) for row, score in ranked if row.id in records]
+
+    def resolve_first(self, product_name: Text) -> Optional[ProductRecord]:
+        """The best match; ties go to the earliest product in the catalog."""
+        with tracing.span("product resolve_first", **{"product.query": product_name}) as span:
+            self.feed.poll()
+            query = product_name.strip().lower()
+            cached = self.cache.get(("all", query))
+            if cached is None:
+                cached = self.cache.get(("first", query))
+            span.set_attribute("cache.hit", cached is not None)
+            if cached is not None:
+                return cached[0] if cached else None
+
+            with self._matching() as index:
+                match = index.first_match(product_name)
+            record = self.backend.fetch([match.id]).get(match.id) if match else None
+            self.cache.put(("first", query), (record,) if record else ())
+            return record
+
+
+_resolver: Optional[ProductResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver() -> ProductResolver:
+    """Process-wide resolver over the backend named by CHATON_PRODUCT_BACKEND."""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                backend = BACKENDS[PRODUCT_BACKEND]()
+                if CATALOG_SNAPSHOT:
+                    backend = SnapshotProductBackend(backend, shared_catalog_path())
+                _resolver = ProductResolver(backend, loader=shared_loader())
+    return _resolver
+
+
+def set_resolver(resolver: ProductResolver) -> None:
+    """Swap the backend used by every action (benchmarks, alternate stores)."""
+    global _resolver
+    with _resolver_lock:
+        _resolver = resolver
+
+
+def resolver_metrics():
+    # Only reports once an action has created the resolver
+    if _resolver is None:
+        return []
+    return stats_metrics("chaton_product_cache", "Product resolver cache", _resolver.cache.stats(),
+                         counters=("hits", "misses"))
+
+
+def catalog_metrics():
+    backend = _resolver.backend if _resolver is not None else None
+    if not isinstance(backend, SnapshotProductBackend) or backend.snapshot is None:
+        return []
+    footprint = Gauge("chaton_catalog_snapshot_bytes", "Approximate size of the catalog snapshot", ["column"])
+    for column, size in backend.snapshot.memory_usage().items():
+        footprint.set(size, column=column)
+    return [footprint] + stats_metrics("chaton_catalog_snapshot", "Catalog snapshot", backend.stats(),
+                                       counters=("loads",))
+
+
+REGISTRY.add_collector(resolver_metrics)
+REGISTRY.add_collector(catalog_metrics)
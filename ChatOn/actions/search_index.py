@@ -0,0 +1,189 @@
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Text, Tuple
+
+from . import tracing
+from .catalog_feed import CatalogChange
+from .products import ProductBackend, ProductRecord, get_resolver
+
+# Relative weight of each catalog field, e.g. "name=3,brand=2,size=1,description=1"
+SEARCH_WEIGHTS = os.environ.get("CHATON_SEARCH_WEIGHTS", "name=3,brand=2,size=1,description=1")
+
+# BM25 term-frequency saturation and length normalisation
+BM25_K1 = float(os.environ.get("CHATON_SEARCH_K1", "1.2"))
+BM25_B = float(os.environ.get("CHATON_SEARCH_B", "0.75"))
+
+STOPWORDS = frozenset(
+    "a an and any are for from have i in is it looking me of on or some something "
+    "that the this to want with you".split()
+)
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+# Utility: lowercase word tokens without stopwords; short tokens like "m8" are kept
+def tokenize(text: Optional[Text]) -> List[Text]:
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def parse_weights(spec: Text) -> Dict[Text, float]:
+    weights = {}
+    for part in spec.split(","):
+        field, _, weight = part.partition("=")
+        if field.strip():
+            weights[field.strip()] = float(weight or 1)
+    return weights
+
+
+class ProductSearchIndex:
+    """BM25 over a weighted mix of catalog fields (BM25F-style).
+
+    Each product becomes one pseudo-document whose term frequencies and
+    length are the field-weighted sums over `weights`. Products can be added,
+    replaced and removed one at a time.
+    """
+
+    def __init__(self, weights: Optional[Dict[Text, float]] = None,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.weights = weights or parse_weights(SEARCH_WEIGHTS)
+        self.k1 = k1
+        self.b = b
+        self.records: Dict[int, ProductRecord] = {}
+        self._postings: Dict[Text, Dict[int, float]] = {}
+        self._terms: Dict[int, Counter] = {}
+        self._lengths: Dict[int, float] = {}
+        self._total_length = 0.0
+        self._norms: Optional[Dict[int, float]] = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _weighted_terms(self, record: ProductRecord) -> Counter:
+        terms = Counter()
+        for field, weight in self.weights.items():
+            for token in tokenize(str(getattr(record, field) or "")):
+                terms[token] += weight
+        return terms
+
+    def add(self, record: ProductRecord) -> None:
+        # One id object for every dict below; a snapshot view makes a new int per access
+        product_id = record.id
+        if product_id in self.records:
+            self.remove(product_id)
+        terms = self._weighted_terms(record)
+        self.records[product_id] = record
+        self._terms[product_id] = terms
+        length = sum(terms.values())
+        self._lengths[product_id] = length
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[product_id] = tf
+        self._norms = None
+
+    def remove(self, product_id: int) -> None:
+        if self.records.pop(product_id, None) is None:
+            return
+        for term in self._terms.pop(product_id):
+            posting = self._postings[term]
+            del posting[product_id]
+            if not posting:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(product_id)
+        self._norms = None
+
+    def _length_norms(self) -> Dict[int, float]:
+        # BM25 length normalisation per product; recomputed after edits
+        if self._norms is None:
+            avg_length = self._total_length / len(self.records) or 1.0
+            k1, b = self.k1, self.b
+            self._norms = {
+                product_id: k1 * (1 - b + b * length / avg_length)
+                for product_id, length in self._lengths.items()
+            }
+        return self._norms
+
+    def search(self, query: Text, k: int = 5) -> List[Tuple[ProductRecord, float]]:
+        """Top `k` products for `query`, best first, with their BM25 scores."""
+        count = len(self.records)
+        if not count:
+            return []
+        norms = self._length_norms()
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            weight = idf * (self.k1 + 1)
+            for product_id, tf in posting.items():
+                scores[product_id] = scores.get(product_id, 0.0) + weight * tf / (tf + norms[product_id])
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self.records[product_id], score) for product_id, score in best]
+
+
+class ProductSearch:
+    """Keeps a ProductSearchIndex in step with the catalog through `feed`."""
+
+    def __init__(self, backend: ProductBackend, feed, weights: Optional[Dict[Text, float]] = None):
+        self.backend = backend
+        self.feed = feed
+        self.weights = weights
+        self.feed.subscribe(self.apply_changes)
+        self._index: Optional[ProductSearchIndex] = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> ProductSearchIndex:
+        self.feed.start()
+        with self._lock:
+            if self._index is None:
+                with tracing.span("search index build") as span:
+                    index = ProductSearchIndex(self.weights)
+                    for record in self.backend.load_records():
+                        index.add(record)
+                    span.set_attribute("index.rows", len(index))
+                self._index = index
+            return self._index
+
+    def apply_changes(self, changes: Optional[List[CatalogChange]]) -> None:
+        with self._lock:
+            if changes is None or self._index is None:
+                self._index = None
+                return
+        ids = sorted({change.product_id for change in changes})
+        records = self.backend.fetch(ids)
+        with self._lock:
+            if self._index is None:
+                return
+            for product_id in ids:
+                if product_id in records:
+                    self._index.add(records[product_id])
+                else:
+                    self._index.remove(product_id)
+
+    def search(self, query: Text, k: int = 5) -> List[Tuple[ProductRecord, float]]:
+        with tracing.span("product search", **{"search.query": query, "search.k": k}):
+            self.feed.poll()
+            index = self.index
+            # Not while apply_changes edits it from another action thread
+            with self._lock:
+                return index.search(query, k)
+
+
+_search: Optional[ProductSearch] = None
+_search_lock = threading.Lock()
+
+
+def get_product_search() -> ProductSearch:
+    """Process-wide search over the resolver's backend and change feed."""
+    global _search
+    if _search is None:
+        with _search_lock:
+            if _search is None:
+                resolver = get_resolver()
+                _search = ProductSearch(resolver.backend, resolver.feed)
+    return _search
@@ -0,0 +1,101 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+from typing import Any, Dict, Iterable, Optional, Text, Tuple, Union
+
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# magic, format version, header length; the JSON header follows
+HEADER = struct.Struct("<8sII")
+
+Section = Union[array, bytes]
+
+
+# Utility: a string column as (end offsets, utf-8 blob); None is stored as ""
+def string_table(values: Iterable[Optional[Text]]) -> Tuple[array, bytes]:
+    offsets, chunks, end = array("q", [0]), [], 0
+    for value in values:
+        encoded = b"" if value is None else value.encode("utf-8")
+        chunks.append(encoded)
+        end += len(encoded)
+        offsets.append(end)
+    return offsets, b"".join(chunks)
+
+
+def write_sections(path: Text, magic: bytes, format_version: int,
+                   meta: Dict[Text, Any], sections: Dict[Text, Section]) -> int:
+    """Write named flat arrays to `path` atomically (temp file + rename); returns the file size.
+
+    Each section starts 8-byte aligned, so a reader can map the file and
+    use every section in place as a memoryview or NumPy array.
+    """
+    layout, offset = {}, 0
+    for name, data in sections.items():
+        typecode = data.typecode if isinstance(data, array) else "B"
+        size = len(data) * (data.itemsize if isinstance(data, array) else 1)
+        layout[name] = [offset, size, typecode]
+        offset += size + (-size % 8)
+    # Section offsets are relative to the 8-byte aligned end of the header
+    header = json.dumps(dict(meta, sections=layout)).encode("utf-8")
+    start = HEADER.size + len(header)
+    start += -start % 8
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(magic, format_version, len(header)))
+        f.write(header)
+        f.write(b"\0" * (start - f.tell()))
+        for name, data in sections.items():
+            f.write(data.tobytes() if isinstance(data, array) else data)
+            f.write(b"\0" * (-layout[name][1] % 8))
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+class SectionFile:
+    """A file from `write_sections` mapped read-only.
+
+    Sections are memoryviews into the mapping: pages are shared by every
+    process that maps the same file and only read in when touched.
+    """
+
+    def __init__(self, path: Text, magic: bytes, format_version: int):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns)
+            self.size = stat.st_size
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        found_magic, found_version, header_size = HEADER.unpack_from(self.buffer)
+        if found_magic != magic or found_version != format_version:
+            raise ValueError(f"{path} is not a {magic.decode()} file (format {format_version})")
+        self.meta: Dict[Text, Any] = json.loads(self.buffer[HEADER.size:HEADER.size + header_size])
+        start = HEADER.size + header_size
+        self.data_start = start + (-start % 8)
+        self.sections = {name: tuple(section) for name, section in self.meta.pop("sections").items()}
+        self._view = memoryview(self.buffer)
+
+    def view(self, name: Text) -> memoryview:
+        offset, size, typecode = self.sections[name]
+        offset += self.data_start
+        return self._view[offset:offset + size].cast(typecode)
+
+    def numpy(self, name: Text, dtype, start: int = 0, count: Optional[int] = None) -> "np.ndarray":
+        """Zero-copy array over a section, optionally items [start, start + count)."""
+        offset, size, _ = self.sections[name]
+        itemsize = np.dtype(dtype).itemsize
+        if count is None:
+            count = size // itemsize - start
+        return np.frombuffer(self.buffer, dtype, count, self.data_start + offset + start * itemsize)
+
+    def changed(self) -> bool:
+        """True once `path` has been replaced by a newer file."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != self.identity
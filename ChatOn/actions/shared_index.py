@@ -0,0 +1,482 @@
+import atexit
+import os
+import tempfile
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, List, Optional, Text, Tuple
+
+from .catalog_snapshot import CatalogSnapshot
+from .product_index import ALPHABET, INDEX_TTL, IndexedProduct, ProductNameIndex, char_counts, char_tokens, np
+from .section_file import SectionFile, string_table, write_sections
+from .workers import worker_number
+
+# Where the manager writes the shared snapshot; one file per manager process
+SHARED_INDEX_DIR = os.environ.get("CHATON_SHARED_INDEX_DIR", tempfile.gettempdir())
+
+# Seconds a worker waits for the first snapshot before building its own index
+SHARED_INDEX_WAIT = float(os.environ.get("CHATON_SHARED_INDEX_WAIT", "120"))
+
+# Seconds before the manager retries a snapshot build that failed
+SHARED_INDEX_RETRY = float(os.environ.get("CHATON_SHARED_INDEX_RETRY", "5"))
+
+# Set by the manager before it spawns workers: the snapshot files they map
+SNAPSHOT_ENV = "CHATON_SHARED_INDEX_FILE"
+CATALOG_ENV = "CHATON_SHARED_CATALOG_FILE"
+
+MAGIC = b"CHATONIX"
+FORMAT_VERSION = 2
+COLUMNS = len(ALPHABET) + 1
+
+
+# Utility: a posting key (three code points) as one sortable integer (code points fit in 21 bits)
+def token_code(token: Text) -> int:
+    return (ord(token[0]) << 42) | (ord(token[1]) << 21) | ord(token[2])
+
+
+def write_snapshot(path: Text, rows: List[IndexedProduct], version: Optional[int]) -> int:
+    """Build the name index over `rows` and write it to `path` atomically; returns its size.
+
+    Every section is a flat array, so readers map the file and use it in
+    place: the kernel keeps one copy of the pages for all processes.
+    """
+    index = ProductNameIndex(rows)
+    keys = index._keys
+    tokens = sorted(index._postings, key=token_code)
+    key_row_starts, key_rows = array("q", [0]), array("i")
+    for positions in index._rows_by_key:
+        key_rows.extend(positions)
+        key_row_starts.append(len(key_rows))
+    posting_starts, postings = array("q", [0]), array("i")
+    for token in tokens:
+        postings.extend(index._postings[token])
+        posting_starts.append(len(postings))
+    key_chars = array("h")
+    for key in keys:
+        key_chars.extend(char_counts(key))
+    row_name_offsets, row_names = string_table(row.name or "" for row in index.rows)
+    key_offsets, key_blob = string_table(keys)
+    encoded_keys = [key.encode("utf-8") for key in keys]
+
+    sections = OrderedDict([
+        ("row_ids", array("q", (row.id for row in index.rows))),
+        ("row_users", array("q", (-1 if row.user_id is None else row.user_id for row in index.rows))),
+        ("id_order", array("i", sorted(range(len(index.rows)), key=lambda pos: index.rows[pos].id))),
+        ("row_name_offsets", row_name_offsets),
+        ("row_names", row_names),
+        ("key_offsets", key_offsets),
+        ("keys", key_blob),
+        ("key_order", array("i", sorted(range(len(keys)), key=encoded_keys.__getitem__))),
+        ("key_lengths", array("i", map(len, keys))),
+        ("key_chars", key_chars),
+        ("key_row_starts", key_row_starts),
+        ("key_rows", key_rows),
+        ("token_codes", array("q", map(token_code, tokens))),
+        ("posting_starts", posting_starts),
+        ("postings", postings),
+    ])
+    meta = {"version": version, "created": time.time(), "rows": len(index.rows), "keys": len(keys)}
+    return write_sections(path, MAGIC, FORMAT_VERSION, meta, sections)
+
+
+class IndexSnapshot(SectionFile):
+    """A snapshot file mapped read-only; sections are memoryview attributes."""
+
+    def __init__(self, path: Text):
+        super().__init__(path, MAGIC, FORMAT_VERSION)
+        self.version: Optional[int] = self.meta["version"]
+        self.created: float = self.meta["created"]
+        self.row_count: int = self.meta["rows"]
+        self.key_count: int = self.meta["keys"]
+        for name in self.sections:
+            setattr(self, name, self.view(name))
+
+
+# ---------------------------------
+# Snapshot-backed stand-ins for ProductNameIndex's containers
+# ---------------------------------
+# Each keeps the snapshot as its base and holds this worker's catalog
+# changes (from the changelog feed) privately, so ProductNameIndex's
+# matching code runs on them unchanged.
+class _Rows:
+    def __init__(self, snapshot: IndexSnapshot):
+        self.snapshot = snapshot
+        self.base = snapshot.row_count
+        self.changed: Dict[int, Optional[IndexedProduct]] = {}
+        self.added: List[Optional[IndexedProduct]] = []
+
+    def _base_row(self, pos: int) -> IndexedProduct:
+        s = self.snapshot
+        user_id = s.row_users[pos]
+        name = str(s.row_names[s.row_name_offsets[pos]:s.row_name_offsets[pos + 1]], "utf-8")
+        return IndexedProduct(s.row_ids[pos], None if user_id == -1 else user_id, name)
+
+    def __len__(self) -> int:
+        return self.base + len(self.added)
+
+    def __getitem__(self, pos: int) -> Optional[IndexedProduct]:
+        if pos >= self.base:
+            return self.added[pos - self.base]
+        if pos in self.changed:
+            return self.changed[pos]
+        return self._base_row(pos)
+
+    def __setitem__(self, pos: int, row: Optional[IndexedProduct]) -> None:
+        if pos >= self.base:
+            self.added[pos - self.base] = row
+        else:
+            self.changed[pos] = row
+
+    def append(self, row: IndexedProduct) -> None:
+        self.added.append(row)
+
+
+class _Positions:
+    """Product id -> row position."""
+
+    def __init__(self, snapshot: IndexSnapshot):
+        self.snapshot = snapshot
+        self.removed: set = set()
+        self.added: Dict[int, int] = {}
+
+    def _base_position(self, product_id: int) -> Optional[int]:
+        ids, order = self.snapshot.row_ids, self.snapshot.id_order
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ids[order[mid]] < product_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and ids[order[lo]] == product_id:
+            return order[lo]
+        return None
+
+    def get(self, product_id: int, default=None):
+        if product_id in self.added:
+            return self.added[product_id]
+        if product_id in self.removed:
+            return default
+        pos = self._base_position(product_id)
+        return default if pos is None else pos
+
+    def __setitem__(self, product_id: int, pos: int) -> None:
+        self.added[product_id] = pos
+
+    def pop(self, product_id: int, default=None):
+        if product_id in self.added:
+            return self.added.pop(product_id)
+        pos = self.get(product_id)
+        if pos is None:
+            return default
+        self.removed.add(product_id)
+        return pos
+
+    def __len__(self) -> int:
+        return self.snapshot.row_count - len(self.removed) + len(self.added)
+
+
+class _Keys:
+    """Distinct lowercased names by key id."""
+
+    def __init__(self, snapshot: IndexSnapshot):
+        self.snapshot = snapshot
+        self.added: List[Text] = []
+        self.added_ids: Dict[Text, int] = {}
+
+    def _encoded(self, key_id: int) -> memoryview:
+        s = self.snapshot
+        return s.keys[s.key_offsets[key_id]:s.key_offsets[key_id + 1]]
+
+    def __len__(self) -> int:
+        return self.snapshot.key_count + len(self.added)
+
+    def __getitem__(self, key_id: int) -> Text:
+        if key_id >= self.snapshot.key_count:
+            return self.added[key_id - self.snapshot.key_count]
+        return str(self._encoded(key_id), "utf-8")
+
+    def find(self, key: Text) -> Optional[int]:
+        if key in self.added_ids:
+            return self.added_ids[key]
+        target, order = key.encode("utf-8"), self.snapshot.key_order
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._encoded(order[mid]).tobytes() < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and self._encoded(order[lo]).tobytes() == target:
+            return order[lo]
+        return None
+
+    def append(self, key: Text) -> int:
+        key_id = self.added_ids[key] = len(self)
+        self.added.append(key)
+        return key_id
+
+
+class _RowsByKey:
+    """Sorted row positions per key id; a key's list is copied out when it changes."""
+
+    def __init__(self, snapshot: IndexSnapshot):
+        self.snapshot = snapshot
+        self.changed: Dict[int, List[int]] = {}
+        self.added: List[List[int]] = []
+
+    def __len__(self) -> int:
+        return self.snapshot.key_count + len(self.added)
+
+    def __getitem__(self, key_id: int):
+        if key_id >= self.snapshot.key_count:
+            return self.added[key_id - self.snapshot.key_count]
+        if key_id in self.changed:
+            return self.changed[key_id]
+        starts = self.snapshot.key_row_starts
+        return self.snapshot.key_rows[starts[key_id]:starts[key_id + 1]]
+
+    def mutable(self, key_id: int) -> List[int]:
+        if key_id >= self.snapshot.key_count:
+            return self.added[key_id - self.snapshot.key_count]
+        if key_id not in self.changed:
+            self.changed[key_id] = list(self[key_id])
+        return self.changed[key_id]
+
+    def append(self, positions: List[int]) -> None:
+        self.added.append(positions)
+
+
+class _Postings:
+    """Key ids per posting key; names added after the snapshot are kept aside."""
+
+    def __init__(self, snapshot: IndexSnapshot):
+        self.snapshot = snapshot
+        self.added: Dict[Text, List[int]] = {}
+
+    def span(self, token: Text) -> Optional[Tuple[int, int]]:
+        codes = self.snapshot.token_codes
+        code = token_code(token)
+        i = bisect_left(codes, code)
+        if i == len(codes) or codes[i] != code:
+            return None
+        starts = self.snapshot.posting_starts
+        return starts[i], starts[i + 1]
+
+    def get(self, token: Text, default=None):
+        found = self.span(token)
+        base = None if found is None else self.snapshot.postings[found[0]:found[1]]
+        added = self.added.get(token)
+        if added is None:
+            return default if base is None else base
+        return added if base is None else list(base) + added
+
+    def add(self, token: Text, key_id: int) -> None:
+        self.added.setdefault(token, []).append(key_id)
+
+
+class MappedNameIndex(ProductNameIndex):
+    """ProductNameIndex over a mapped snapshot; lookups read the shared pages.
+
+    Catalog changes applied with `upsert` and `remove` stay in this process
+    until the next snapshot. `version` is the changelog version the snapshot
+    was built at, so the owner can replay what came after.
+    """
+
+    def __init__(self, snapshot: IndexSnapshot):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        self.built_at = time.monotonic()
+        self.rows = _Rows(snapshot)
+        self._keys = _Keys(snapshot)
+        self._rows_by_key = _RowsByKey(snapshot)
+        self._postings = _Postings(snapshot)
+        self._name_lengths = set(snapshot.key_lengths)
+        self._positions = _Positions(snapshot)
+        self._posting_arrays: Dict[Text, "np.ndarray"] = {}
+        self._key_lengths: Optional["np.ndarray"] = None
+        self._key_chars: Optional["np.ndarray"] = None
+        self._memo: "OrderedDict[tuple, List[Tuple[int, float]]]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    def _add(self, row: IndexedProduct, pos: int) -> None:
+        key = (row.name or "").lower()
+        key_id = self._keys.find(key)
+        if key_id is None:
+            key_id = self._keys.append(key)
+            self._rows_by_key.append([])
+            for token in char_tokens(key):
+                self._postings.add(token, key_id)
+                self._posting_arrays.pop(token, None)
+            self._name_lengths.add(len(key))
+            self._key_lengths = None
+        insort(self._rows_by_key.mutable(key_id), pos)
+
+    def _drop(self, row: IndexedProduct, pos: int) -> None:
+        self._rows_by_key.mutable(self._keys.find((row.name or "").lower())).remove(pos)
+
+    def _posting_array(self, token: Text) -> Optional["np.ndarray"]:
+        added = self._postings.added.get(token)
+        if added is not None:
+            return super()._posting_array(token)
+        found = self._postings.span(token)
+        if found is None:
+            return None
+        # A view of the mapped postings: nothing is copied per process
+        return self.snapshot.numpy("postings", np.int32, found[0], found[1] - found[0])
+
+    def _key_arrays(self) -> Tuple["np.ndarray", "np.ndarray"]:
+        if self._key_lengths is None:
+            lengths = self.snapshot.numpy("key_lengths", np.int32)
+            chars = self.snapshot.numpy("key_chars", np.int16).reshape(self.snapshot.key_count, COLUMNS)
+            added = self._keys.added
+            if added:
+                # Only workers that saw new names pay for a private copy, until the next snapshot
+                lengths = np.concatenate([lengths, np.fromiter(map(len, added), np.int32, len(added))])
+                chars = np.vstack([chars, np.array([char_counts(key) for key in added], np.int16)])
+            self._key_lengths, self._key_chars = lengths, chars
+        return self._key_lengths, self._key_chars
+
+
+# ---------------------------------
+# Publishing (manager) and mapping (workers)
+# ---------------------------------
+class SnapshotLoader:
+    """Index source for a worker's ProductResolver: maps the manager's snapshot.
+
+    The mapping is reused until the manager replaces the file. A worker that
+    finds no snapshot within `wait` seconds builds its own index with
+    `fallback`, as a single process would.
+    """
+
+    def __init__(self, path: Text, wait: float = SHARED_INDEX_WAIT):
+        self.path = path
+        self.wait = wait
+        self.snapshot: Optional[IndexSnapshot] = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> Optional[IndexSnapshot]:
+        if not wait_for_file(self.path, self.wait):
+            return None
+        return IndexSnapshot(self.path)
+
+    def load(self, fallback) -> ProductNameIndex:
+        with self._lock:
+            if self.snapshot is None or self.snapshot.changed():
+                try:
+                    snapshot = self._open()
+                except (OSError, ValueError) as err:
+                    print(f"Shared product index {self.path} unusable:", err)
+                    snapshot = None
+                if snapshot is not None:
+                    self.snapshot = snapshot
+            if self.snapshot is None:
+                print(f"No shared product index at {self.path}; building a private one")
+                return fallback()
+            return MappedNameIndex(self.snapshot)
+
+
+class SnapshotPublisher:
+    """Rebuilds the snapshot from `backend` every `interval` seconds (manager only).
+
+    With `catalog_path` it also writes the whole catalog as a CatalogSnapshot
+    for the workers' record lookups, from the same single read.
+    """
+
+    def __init__(self, backend, path: Text, interval: float = INDEX_TTL,
+                 catalog_path: Optional[Text] = None):
+        self.backend = backend
+        self.path = path
+        self.catalog_path = catalog_path
+        self.interval = interval
+        self.size = 0
+        self.published: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self) -> None:
+        started = time.perf_counter()
+        # Pin the changelog head first: workers replay everything after it
+        version = self.backend.latest_version()
+        if self.catalog_path:
+            catalog = CatalogSnapshot.from_records(self.backend.load_records(), version)
+            catalog_size = catalog.save(self.catalog_path)
+            print(f"Shared catalog: {len(catalog)} rows, {catalog_size / 1e6:.1f} MB -> {self.catalog_path}")
+            rows = list(catalog.names())
+        else:
+            rows = self.backend.load_names()
+        self.size = write_snapshot(self.path, rows, version)
+        self.published = time.time()
+        print(f"Shared product index: {len(rows)} rows, {self.size / 1e6:.1f} MB "
+              f"in {time.perf_counter() - started:.2f}s -> {self.path}")
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.publish()
+            except Exception as err:
+                print(f"Shared product index build failed, retrying in {SHARED_INDEX_RETRY}s:", err)
+                time.sleep(SHARED_INDEX_RETRY)
+                continue
+            time.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-publisher", daemon=True)
+            self._thread.start()
+            atexit.register(self.remove)
+
+    def remove(self) -> None:
+        for path in (self.path, self.catalog_path):
+            try:
+                if path:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+_publisher: Optional[SnapshotPublisher] = None
+
+
+def start_publisher(backend, catalog: bool = False) -> SnapshotPublisher:
+    """Publish the shared index (and with `catalog` the catalog) from this process.
+
+    Workers spawned later find the files through the environment.
+    """
+    global _publisher
+    if _publisher is None:
+        path = os.path.join(SHARED_INDEX_DIR, f"chaton-product-index-{os.getpid()}.bin")
+        catalog_path = os.path.join(SHARED_INDEX_DIR, f"chaton-catalog-{os.getpid()}.bin") if catalog else None
+        # Spawned workers inherit the environment as it is when they start
+        os.environ[SNAPSHOT_ENV] = path
+        if catalog_path:
+            os.environ[CATALOG_ENV] = catalog_path
+        _publisher = SnapshotPublisher(backend, path, catalog_path=catalog_path)
+        _publisher.start()
+    return _publisher
+
+
+def shared_loader() -> Optional[SnapshotLoader]:
+    """The snapshot source for this worker, or None when it builds its own index."""
+    path = os.environ.get(SNAPSHOT_ENV)
+    if not path or worker_number() is None:
+        return None
+    return SnapshotLoader(path)
+
+
+def shared_catalog_path() -> Optional[Text]:
+    """The catalog file the manager publishes for this worker, if any."""
+    if worker_number() is None:
+        return None
+    return os.environ.get(CATALOG_ENV) or None
+
+
+# Utility: wait up to `wait` seconds for `path` to appear
+def wait_for_file(path: Text, wait: float = SHARED_INDEX_WAIT) -> bool:
+    deadline = time.monotonic() + wait
+    while not os.path.exists(path):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.1)
+    return True
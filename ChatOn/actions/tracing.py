@@ -0,0 +1,296 @@
+import atexit
+import inspect
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, List, Optional, Text
+
+# Where finished spans go, one OTLP/JSON export request per line (the format
+# of the OpenTelemetry Collector's otlpjsonfile receiver). {service} and
+# {pid} are filled in so every process writes its own file. Empty: off.
+TRACE_FILE = os.environ.get("CHATON_TRACE_FILE", "")
+
+# Share of new traces that are recorded; the decision travels with the trace
+TRACE_SAMPLE = float(os.environ.get("CHATON_TRACE_SAMPLE", "1"))
+
+# Seconds between writes of buffered spans
+TRACE_FLUSH_INTERVAL = float(os.environ.get("CHATON_TRACE_FLUSH_INTERVAL", "1"))
+
+# Spans buffered before new ones are dropped
+TRACE_QUEUE_SIZE = int(os.environ.get("CHATON_TRACE_QUEUE_SIZE", "10000"))
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+# W3C trace context: what a traceparent header carries
+SpanContext = namedtuple("SpanContext", ["trace_id", "span_id", "sampled"])
+
+
+def parse_traceparent(value: Optional[Text]) -> Optional[SpanContext]:
+    """SpanContext from "00-<trace id>-<parent id>-<flags>", None if malformed."""
+    try:
+        version, trace_id, span_id, flags = value.strip().lower().split("-")
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except (AttributeError, ValueError):
+        return None
+    if len(trace_id) != 32 or len(span_id) != 16 or version == "ff" or not int(trace_id, 16):
+        return None
+    return SpanContext(trace_id, span_id, sampled)
+
+
+def format_traceparent(context: SpanContext) -> Text:
+    return f"00-{context.trace_id}-{context.span_id}-{'01' if context.sampled else '00'}"
+
+
+def _attribute(key: Text, value: Any) -> Dict[Text, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    """One timed operation; exported when it ends if its trace is sampled."""
+
+    def __init__(self, name: Text, trace_id: Text, parent_id: Optional[Text],
+                 kind: int, sampled: bool, attributes: Dict[Text, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64) or 1:016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.sampled = sampled
+        self.attributes = attributes
+        self.error: Optional[Text] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id, self.sampled)
+
+    @property
+    def traceparent(self) -> Text:
+        return format_traceparent(self.context)
+
+    def set_attribute(self, key: Text, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, err: BaseException) -> None:
+        self.error = f"{type(err).__name__}: {err}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.sampled and _exporter is not None:
+                _exporter.export(self)
+
+    def to_otlp(self) -> Dict[Text, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": 2, "message": self.error}
+        return span
+
+
+class NoopSpan:
+    """Stands in when nothing is traced, so callers never check for None."""
+
+    context = None
+    traceparent = None
+    trace_id = None
+    sampled = False
+
+    def set_attribute(self, key: Text, value: Any) -> None:
+        pass
+
+    def record_error(self, err: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+_current: ContextVar[Optional[Span]] = ContextVar("chaton_span", default=None)
+
+
+class SpanExporter:
+    """Buffers finished spans and appends them to `path` from a daemon thread."""
+
+    def __init__(self, path: Text, service_name: Text,
+                 flush_interval: float = TRACE_FLUSH_INTERVAL, queue_size: int = TRACE_QUEUE_SIZE):
+        self.path = path
+        self.service_name = service_name
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Span]" = queue.Queue(queue_size)
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._run, name="span-exporter", daemon=True).start()
+        atexit.register(self.flush)
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> List[Span]:
+        spans = []
+        while True:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                return spans
+
+    def flush(self) -> None:
+        spans = self._drain()
+        if not spans:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [
+                _attribute("service.name", self.service_name),
+                _attribute("process.pid", os.getpid()),
+            ]},
+            "scopeSpans": [{"scope": {"name": "chaton"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+        line = json.dumps(request, separators=(",", ":")) + "\n"
+        with self._write_lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as err:
+                print("Could not write spans:", err)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+_exporter: Optional[SpanExporter] = None
+_configure_lock = threading.Lock()
+
+
+def configure(service_name: Text, path: Text = TRACE_FILE) -> None:
+    """Turn tracing on for this process when `path` (CHATON_TRACE_FILE) is set."""
+    global _exporter
+    if not path:
+        return
+    with _configure_lock:
+        if _exporter is None:
+            _exporter = SpanExporter(path.format(service=service_name, pid=os.getpid()), service_name)
+
+
+def enabled() -> bool:
+    return _exporter is not None
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(name: Text, kind: int = INTERNAL, parent: Optional[SpanContext] = None,
+               root: bool = False, **attributes):
+    """A span that is not active yet; see `activate`.
+
+    Its parent is `parent`, else the active span. Without either it starts a
+    new trace when `root` is set, and is a no-op otherwise, so helpers such
+    as DB queries only add spans to traces that already exist.
+    """
+    if _exporter is None:
+        return NOOP_SPAN
+    if parent is None:
+        active = _current.get()
+        parent = active.context if active is not None else None
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, kind, parent.sampled, attributes)
+    if not root:
+        return NOOP_SPAN
+    trace_id = f"{random.getrandbits(128) or 1:032x}"
+    return Span(name, trace_id, None, kind, random.random() < TRACE_SAMPLE, attributes)
+
+
+@contextmanager
+def activate(span):
+    """Make `span` the parent of spans started inside the block, then end it."""
+    if span is NOOP_SPAN:
+        yield span
+        return
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as err:
+        span.record_error(err)
+        raise
+    finally:
+        span.end()
+        _current.reset(token)
+
+
+def span(name: Text, kind: int = INTERNAL, **attributes):
+    """Child span of the active span for the duration of a with block."""
+    return activate(start_span(name, kind, **attributes))
+
+
+def start_trace(name: Text, kind: int = SERVER, parent: Optional[SpanContext] = None, **attributes):
+    """Entry span of a request: continues `parent` or starts a new trace."""
+    return activate(start_span(name, kind, parent, root=True, **attributes))
+
+
+def traced_action(run):
+    """Decorator for Action.run: a span continuing the trace in the message metadata.
+
+    The Flask proxy puts a `traceparent` in the metadata of the message it
+    sends to Rasa; turns without one start their own trace.
+    """
+    def action_trace(self, tracker):
+        message = tracker.latest_message or {}
+        parent = parse_traceparent((message.get("metadata") or {}).get("traceparent"))
+        attributes = {
+            "rasa.action": self.name(),
+            "rasa.intent": (message.get("intent") or {}).get("name") or "",
+            "rasa.sender_id": tracker.sender_id,
+        }
+        return start_trace(f"action {self.name()}", SERVER, parent, **attributes)
+
+    if inspect.iscoroutinefunction(run):
+        @wraps(run)
+        async def async_wrapper(self, dispatcher, tracker, domain):
+            with action_trace(self, tracker) as span:
+                events = await run(self, dispatcher, tracker, domain)
+                span.set_attribute("rasa.events", len(events or []))
+                return events
+        return async_wrapper
+
+    @wraps(run)
+    def wrapper(self, dispatcher, tracker, domain):
+        with action_trace(self, tracker) as span:
+            events = run(self, dispatcher, tracker, domain)
+            span.set_attribute("rasa.events", len(events or []))
+            return events
+    return wrapper
@@ -0,0 +1,208 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Text, Tuple
+
+import pluggy
+
+from .db import POOL_WARM, get_pool
+from .feedback_queue import get_feedback_queue
+from .metrics import REGISTRY, Gauge, add_route
+from .products import get_resolver
+from .search_index import get_product_search
+from .sentiment import get_scorer
+from .workers import worker_number
+
+# Warm everything before reporting ready; off: ready at once, built on first use
+WARMUP = os.environ.get("CHATON_WARMUP", "1").lower() in ("1", "true", "yes")
+
+# Seconds between attempts of a step that failed (e.g. database still starting)
+WARMUP_RETRY = float(os.environ.get("CHATON_WARMUP_RETRY", "5"))
+
+
+def default_steps() -> List[Tuple[Text, Callable[[], Any]]]:
+    steps = []
+    if POOL_WARM:
+        # Feedback and summaries use the pool whatever CHATON_PRODUCT_BACKEND is
+        steps.append(("database pool", lambda: get_pool().warm(POOL_WARM)))
+    steps += [
+        ("product index", lambda: get_resolver().index),
+        ("search index", lambda: get_product_search().index),
+        ("sentiment model", lambda: get_scorer().load()),
+        # Starting the queue also writes feedback left in the spool by the last process
+        ("feedback queue", get_feedback_queue),
+    ]
+    return steps
+
+
+class Warmup:
+    """Runs the startup steps in order on a background thread.
+
+    A failing step is retried every `retry` seconds, so an instance started
+    before its database becomes ready once the database is up. `ready` is
+    true only after every step succeeded.
+    """
+
+    def __init__(self, steps: List[Tuple[Text, Callable[[], Any]]], retry: float = WARMUP_RETRY):
+        self.steps = steps
+        self.retry = retry
+        self.status: "OrderedDict[Text, Dict[Text, Any]]" = OrderedDict(
+            (name, {"status": "pending"}) for name, _ in steps
+        )
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _run_step(self, name: Text, step: Callable[[], Any]) -> None:
+        attempts = 0
+        while True:
+            attempts += 1
+            started = time.perf_counter()
+            self.status[name] = {"status": "running", "attempts": attempts}
+            try:
+                step()
+            except Exception as err:
+                self.status[name] = {"status": "error", "attempts": attempts, "error": str(err)}
+                print(f"Warmup: {name} failed, retrying in {self.retry}s:", err)
+                time.sleep(self.retry)
+                continue
+            seconds = time.perf_counter() - started
+            self.status[name] = {"status": "ok", "attempts": attempts, "seconds": round(seconds, 3)}
+            print(f"Warmup: {name} ready in {seconds:.2f}s")
+            return
+
+    def run(self) -> None:
+        started = time.perf_counter()
+        for name, step in self.steps:
+            self._run_step(name, step)
+        print(f"Warmup: done in {time.perf_counter() - started:.2f}s")
+        self._done.set()
+        publish_ready()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def report(self) -> Dict[Text, Any]:
+        return {"ready": self.ready, "components": dict(self.status)}
+
+
+_warmup: Optional[Warmup] = None
+_warmup_lock = threading.Lock()
+
+# rasa_sdk's plugin hooks (rasa_sdk.plugin)
+hookimpl = pluggy.HookimplMarker("rasa_sdk")
+
+# One flag per Sanic worker of the action server, shared through the app's
+# shared_ctx; None outside a worker started by rasa_sdk
+_worker_flags = None
+_worker_flags_lock = threading.Lock()
+
+
+def _report() -> Dict[Text, Any]:
+    if _warmup is None:
+        return {"ready": True, "components": {}}
+    return _warmup.report()
+
+
+def publish_ready() -> None:
+    """Record this worker's readiness where the other workers can see it."""
+    number = worker_number()
+    with _worker_flags_lock:
+        if _worker_flags is not None and number is not None and number < len(_worker_flags):
+            _worker_flags[number] = 1 if _report()["ready"] else 0
+
+
+def ready_response() -> Tuple[int, Text, Text]:
+    """GET /ready on the metrics port: 200 once this worker is warm, 503 before; the body lists each component."""
+    report = _report()
+    return (200 if report["ready"] else 503), "application/json", json.dumps(report)
+
+
+def server_ready_response() -> Tuple[int, Text, Text]:
+    """GET /ready on the action server's port: 200 only once every worker is warm."""
+    report = _report()
+    with _worker_flags_lock:
+        flags = None if _worker_flags is None else list(_worker_flags)
+    if flags is not None:
+        report["workers"] = {"ready": sum(flags), "total": len(flags)}
+        report["ready"] = report["ready"] and all(flags)
+    return (200 if report["ready"] else 503), "application/json", json.dumps(report)
+
+
+class ReadyPlugin:
+    """rasa_sdk plugin adding GET /ready to the action server's Sanic app.
+
+    The Sanic manager creates one flag per worker before starting them; a
+    worker sets its own once its warmup is done, and /ready answers 200 only
+    when all of them are set, whichever worker serves the probe. The flags
+    live in shared memory, so they work across spawned workers.
+    """
+
+    @staticmethod
+    @hookimpl
+    def attach_sanic_app_extensions(app) -> None:
+        from rasa_sdk.utils import number_of_sanic_workers
+        from sanic import response
+
+        @app.main_process_start
+        async def share_ready_flags(app):
+            app.shared_ctx.chaton_ready = multiprocessing.Array("b", number_of_sanic_workers())
+
+        @app.before_server_start
+        async def track_ready(app):
+            global _worker_flags
+            with _worker_flags_lock:
+                _worker_flags = getattr(app.shared_ctx, "chaton_ready", None)
+            publish_ready()
+
+        @app.get("/ready")
+        async def ready(request):
+            status, content_type, body = server_ready_response()
+            return response.text(body, status=status, content_type=content_type)
+
+
+def attach_ready_route() -> None:
+    """Serve /ready on the action server's own port too (any process running rasa_sdk)."""
+    from rasa_sdk.plugin import plugin_manager
+
+    manager = plugin_manager()
+    if not manager.is_registered(ReadyPlugin):
+        manager.register(ReadyPlugin)
+
+
+def warmup_metrics() -> List[Gauge]:
+    ready = Gauge("chaton_ready", "1 once the startup warmup has finished")
+    ready.set(1 if _warmup is None or _warmup.ready else 0)
+    seconds = Gauge("chaton_warmup_seconds", "Time each warmup step took", ["component"])
+    if _warmup is not None:
+        for name, status in _warmup.status.items():
+            if "seconds" in status:
+                seconds.set(status["seconds"], component=name)
+    return [ready, seconds]
+
+
+def start_warmup(steps: Optional[List[Tuple[Text, Callable[[], Any]]]] = None) -> Optional[Warmup]:
+    """Begin warming in the background (CHATON_WARMUP); safe to call more than once."""
+    global _warmup
+    if not WARMUP:
+        return None
+    with _warmup_lock:
+        if _warmup is None:
+            _warmup = Warmup(steps if steps is not None else default_steps())
+            _warmup.start()
+    return _warmup
+
+
+add_route("/ready", ready_response)
+REGISTRY.add_collector(warmup_metrics)
@@ -0,0 +1,38 @@
+import os
+import re
+import sys
+from typing import Optional
+
+# Sanic server processes started by `rasa run actions` / `python -m rasa_sdk`;
+# rasa_sdk reads the same variable
+WORKERS = int(os.environ.get("ACTION_SERVER_SANIC_WORKERS", "1") or 1)
+
+# Build the product-name index once and map it into every worker:
+# "1", "0", or "auto" (only when there is more than one worker)
+SHARED_INDEX = os.environ.get("CHATON_SHARED_INDEX", "auto").lower()
+
+
+def worker_number() -> Optional[int]:
+    """Index of this Sanic server process (0, 1, ...); None outside a worker."""
+    match = re.search(r"Server-(\d+)", os.environ.get("SANIC_WORKER_NAME", ""))
+    return int(match.group(1)) if match else None
+
+
+def is_server_manager() -> bool:
+    """True in the rasa_sdk process that only supervises the Sanic workers.
+
+    It imports the actions package to register them, but never runs one:
+    every action call is served by a worker process spawned from it.
+    """
+    if worker_number() is not None:
+        return False
+    spec = getattr(sys.modules.get("__main__"), "__spec__", None)
+    if spec is not None and spec.name.startswith("rasa_sdk"):
+        return True
+    return sys.argv[1:3] == ["run", "actions"]
+
+
+def shared_index_enabled() -> bool:
+    if SHARED_INDEX == "auto":
+        return WORKERS > 1
+    return SHARED_INDEX in ("1", "true", "yes")
@@ -1,35 +1,173 @@
-from flask import Flask, request, render_template, redirect, session, jsonify, abort
-import mysql.connector
+from flask import Flask, request, render_template, redirect, session, jsonify, abort, g, Response, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
-import requests
+import sys
+import json
+import shutil
+import tempfile
+import time
 from contextlib import contextmanager
 from functools import wraps
+from urllib.parse import urlencode
+
+# Metrics and tracing are shared with the action server's package next to app/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from actions import tracing
+from actions.db import mysql_connector
+from actions.metrics import CONTENT_TYPE, REGISTRY, TimedCursor, histogram, stats_metrics
+from db_pool import ConnectionPool
+from catalog_io import (
+    EXPORT_FETCH_SIZE, IMPORT_MAX_ERRORS, ImportFormatError,
+    export_csv, export_json, iter_batches, iter_rows,
+)
+from pagination import PAGE_SIZE, PRODUCT_LISTING, USER_LISTING, PageRequestError
+from rasa_proxy import RasaProxy
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'Abi2003#')
 
-RASA_API_URL = 'http://localhost:5005/webhooks/rest/webhook'
+rasa_proxy = RasaProxy()
+
+# Spans to CHATON_TRACE_FILE, when set
+tracing.configure('chaton-web')
+
+# Touched after product_catalog writes so the action server reads catalog_changes
+CATALOG_STAMP = os.environ.get(
+    'CHATON_CATALOG_STAMP',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'catalog.stamp')
+)
+
+# Bearer token required by /metrics when set
+METRICS_TOKEN = os.environ.get('CHATON_METRICS_TOKEN', '')
 
 # ---------------------------------
 # Database Connection Helper
 # ---------------------------------
-@contextmanager
-def db_cursor(dictionary=False):
-    db = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",
-        database="product_data",
-        port=3308
+db_pool = ConnectionPool()
+
+
+def get_db():
+    # One pooled connection per request, returned in close_db()
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+        g.db_broken = False
+    return g.db
+
+
+@app.teardown_appcontext
+def close_db(exc):
+    db = g.pop('db', None)
+    if db is not None:
+        db_pool.release(db, broken=g.pop('db_broken', False))
+
+
+def record_catalog_change(cursor, product_id, op):
+    # Same transaction as the product write; consumers read it by increasing id
+    cursor.execute(
+        "INSERT INTO catalog_changes (product_id, op) VALUES (%s, %s)",
+        (product_id, op)
     )
-    cursor = db.cursor(dictionary=dictionary)
+    g.catalog_changed = True
+
+
+def touch_catalog_stamp():
+    try:
+        with open(CATALOG_STAMP, 'w') as stamp:
+            stamp.write(str(time.time_ns()))
+    except OSError as e:
+        print("Could not update catalog stamp:", e)
+
+
+@app.after_request
+def notify_catalog_change(response):
+    # Runs once the view's db_cursor blocks have committed
+    if g.pop('catalog_changed', False):
+        touch_catalog_stamp()
+    return response
+
+
+@contextmanager
+def db_cursor(dictionary=False, buffered=True):
+    # buffered=False streams rows with fetchmany(); read them all before the block ends
+    db = get_db()
+    cursor = db.cursor(buffered=buffered, dictionary=dictionary)
     try:
-        yield cursor
+        yield TimedCursor(cursor)
         db.commit()
+    except BaseException:
+        try:
+            db.rollback()
+        except mysql_connector.Error:
+            g.db_broken = True
+        raise
     finally:
         cursor.close()
-        db.close()
+
+# ---------------------------------
+# Metrics
+# ---------------------------------
+REQUEST_SECONDS = histogram(
+    'chaton_http_request_seconds', 'Flask view latency; streamed bodies are not included',
+    ['endpoint', 'method', 'status']
+)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=request.endpoint or 'unmatched', method=request.method, status=response.status_code,
+        )
+    return response
+
+
+def pool_metrics():
+    return stats_metrics('chaton_db_pool', 'Web app connection pool', db_pool.stats(),
+                         counters=('checkouts', 'waits', 'wait_seconds', 'timeouts', 'opened', 'discarded'))
+
+
+REGISTRY.add_collector(pool_metrics)
+
+
+@app.route('/metrics')
+def metrics():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        abort(401)
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+# ---------------------------------
+# Pagination Helpers
+# ---------------------------------
+def page_args(prefix=''):
+    # Listing.page() keywords from the query string, e.g. ?sort=price&order=desc&after=...
+    args = request.args
+    return {
+        'sort': args.get(prefix + 'sort', 'id'),
+        'order': args.get(prefix + 'order', 'asc'),
+        'after': args.get(prefix + 'after') or None,
+        'before': args.get(prefix + 'before') or None,
+        'limit': args.get(prefix + 'limit', PAGE_SIZE, type=int),
+        'q': args.get(prefix + 'q', '').strip() or None,
+    }
+
+
+@app.template_global()
+def url_with(**changes):
+    # Current URL with some query arguments replaced; None removes one
+    args = request.args.to_dict()
+    for key, value in changes.items():
+        if value is None:
+            args.pop(key, None)
+        else:
+            args[key] = value
+    return request.path + ('?' + urlencode(args) if args else '')
 
 # ---------------------------------
 # Chatbot Route
@@ -39,19 +177,68 @@ def chatbot():
     return render_template("chatbot.html")
 
 
+def bot_messages(rasa_messages):
+    # Keep only what the chat page renders
+    return [{"text": m["text"]} for m in rasa_messages if m.get("text")]
+
+
+def webhook_trace(route):
+    # Continues a trace started by the caller (traceparent header) or starts one
+    return tracing.start_span(
+        f'POST {route}', tracing.SERVER, tracing.parse_traceparent(request.headers.get('traceparent')),
+        root=True, **{'http.route': route}
+    )
+
+
+def with_trace_id(response, span):
+    # Lets a slow reply seen in the browser be looked up in the trace files
+    if span.trace_id:
+        response.headers['X-Trace-Id'] = span.trace_id
+    return response
+
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
     user_message = request.json['message']
     print("User message:", user_message)
-    try:
-        rasa_response = requests.post(RASA_API_URL, json={'message': user_message})
-        rasa_response_json = rasa_response.json()
-        print("Rasa response:", rasa_response_json)
-        bot_response = rasa_response_json[0]['text'] if rasa_response_json else "Sorry, I did not understand that."
-    except Exception as e:
-        print("Error contacting Rasa:", e)
-        bot_response = "Sorry, the chatbot service is unavailable right now."
-    return jsonify({"response": bot_response})
+    with tracing.activate(webhook_trace('/webhook')) as span:
+        try:
+            rasa_response_json = rasa_proxy.send({'message': user_message})
+            print("Rasa response:", rasa_response_json)
+            messages = bot_messages(rasa_response_json or [])
+            if not messages:
+                messages = [{"text": "Sorry, I did not understand that."}]
+        except Exception as e:
+            print("Error contacting Rasa:", e)
+            span.record_error(e)
+            messages = [{"text": "Sorry, the chatbot service is unavailable right now."}]
+    return with_trace_id(jsonify({"response": messages[0]["text"], "messages": messages}), span)
+
+
+@app.route('/webhook/stream', methods=['POST'])
+def webhook_stream():
+    user_message = request.json['message']
+    print("User message:", user_message)
+    # Started here for the response header; the generator below runs it
+    trace = webhook_trace('/webhook/stream')
+
+    # One JSON message per line, flushed as soon as Rasa produces it
+    def generate():
+        with tracing.activate(trace):
+            sent = False
+            try:
+                for rasa_message in rasa_proxy.stream({'message': user_message}):
+                    for message in bot_messages([rasa_message]):
+                        sent = True
+                        yield json.dumps(message) + "\n"
+                if not sent:
+                    yield json.dumps({"text": "Sorry, I did not understand that."}) + "\n"
+            except Exception as e:
+                print("Error contacting Rasa:", e)
+                trace.record_error(e)
+                yield json.dumps({"text": "Sorry, the chatbot service is unavailable right now."}) + "\n"
+
+    return with_trace_id(Response(stream_with_context(generate()), mimetype='application/x-ndjson'), trace)
 
 # ---------------------------------
 # Index Route
@@ -119,7 +306,7 @@ def signup():
                 session['role'] = role
 
                 return redirect('/dashboard')
-            except mysql.connector.IntegrityError as err:
+            except mysql_connector.IntegrityError as err:
                 if err.errno == 1062:
                     return render_template("signup.html", error="Username already exists.")
                 return render_template("signup.html", error=f"Database error: {err}")
@@ -185,10 +372,13 @@ def dashboard():
                 (user_id, `Product Name`, Brand, Size, SellPrice, Description)
                 VALUES (%s, %s, %s, %s, %s, %s)
             """, (user_id, product_name, brand, size, price, description))
+            record_catalog_change(cursor, cursor.lastrowid, 'insert')
 
-        # Fetch products for this user
-        cursor.execute("SELECT * FROM product_catalog WHERE user_id = %s", (user_id,))
-        products = cursor.fetchall()
+        # One page of this user's products
+        try:
+            products = PRODUCT_LISTING.page(cursor, ['user_id = %s'], [user_id], **page_args())
+        except PageRequestError:
+            abort(400)
 
         # Fetch user profile info
         cursor.execute("""
@@ -198,15 +388,15 @@ def dashboard():
         """, (user_id,))
         user_profile = cursor.fetchone()
 
-        # Fetch feedbacks for this user's products
+        # Newest feedback on this user's products, linked when it was stored
         cursor.execute("""
-            SELECT 
+            SELECT
                 COALESCE(pc.`Product Name`, f.product_name) AS product_name,
                 f.feedback_text,
                 f.created_at
             FROM feedback f
-            LEFT JOIN product_catalog pc ON f.product_id = pc.id
-            WHERE (pc.user_id = %s OR f.product_id IS NULL)
+            LEFT JOIN product_catalog pc ON pc.id = f.product_id
+            WHERE f.user_id = %s
             ORDER BY f.created_at DESC
             LIMIT 20
         """, (user_id,))
@@ -244,6 +434,8 @@ def update_product(product_id):
                 SET `Product Name`=%s, Brand=%s, Size=%s, SellPrice=%s, Description=%s
                 WHERE id=%s AND user_id=%s
             """, (product_name, brand, size, price, description, product_id, user_id))
+            if cursor.rowcount:
+                record_catalog_change(cursor, product_id, 'update')
             return redirect('/dashboard')
 
         cursor.execute("""
@@ -271,24 +463,167 @@ def delete_product(product_id):
             DELETE FROM product_catalog
             WHERE id = %s AND user_id = %s
         """, (product_id, user_id))
+        if cursor.rowcount:
+            record_catalog_change(cursor, product_id, 'delete')
 
     return redirect('/dashboard')
 
+# ---------------------------------
+# Bulk Import / Export
+# ---------------------------------
+IMPORT_SQL = """
+    INSERT INTO product_catalog
+    (user_id, `Product Name`, Brand, Size, SellPrice, Description)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+# executemany() sends one multi-row INSERT, so lastrowid is the batch's first id;
+# rows from a concurrent import by the same user only add a redundant change
+IMPORT_CHANGES_SQL = """
+    INSERT INTO catalog_changes (product_id, op)
+    SELECT id, 'insert' FROM product_catalog WHERE user_id = %s AND id >= %s
+"""
+
+
+@app.route('/dashboard/import', methods=['POST'])
+def import_products():
+    if 'user_id' not in session:
+        return redirect('/login')
+
+    user_id = session['user_id']
+
+    # A multipart upload from the dashboard, or the file as the raw request body
+    upload = request.files.get('file')
+    if upload is not None:
+        source = upload.stream
+        fmt = request.form.get('format') or os.path.splitext(upload.filename or '')[1][1:]
+    else:
+        source = request.stream
+        fmt = request.args.get('format') or ('json' if 'json' in request.mimetype else 'csv')
+
+    # Uploads are closed before the response body runs, so keep a copy on disk
+    stream = tempfile.TemporaryFile()
+    shutil.copyfileobj(source, stream)
+    stream.seek(0)
+    try:
+        rows = iter_rows(stream, fmt.lower())
+    except ImportFormatError as e:
+        stream.close()
+        return jsonify({"error": str(e)}), 400
+
+    # One JSON progress line per committed batch, then a summary line
+    def generate():
+        report = {"processed": 0, "inserted": 0, "failed": 0}
+        reported_errors = 0
+        try:
+            for batch, errors, read in iter_batches(rows):
+                if batch:
+                    with db_cursor() as cursor:
+                        cursor.executemany(IMPORT_SQL, [(user_id,) + row for row in batch])
+                        cursor.execute(IMPORT_CHANGES_SQL, (user_id, cursor.lastrowid))
+                    touch_catalog_stamp()
+                report["processed"] += read
+                report["inserted"] += len(batch)
+                report["failed"] += len(errors)
+                shown = errors[:max(0, IMPORT_MAX_ERRORS - reported_errors)]
+                reported_errors += len(shown)
+                yield json.dumps(dict(report, errors=shown)) + "\n"
+        except ImportFormatError as e:
+            report["error"] = str(e)
+        except mysql_connector.Error as e:
+            print("Bulk import failed:", e)
+            report["error"] = f"Database error: {e}"
+        finally:
+            stream.close()
+        yield json.dumps(dict(report, done=True)) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/dashboard/export')
+def export_products():
+    if 'user_id' not in session:
+        return redirect('/login')
+
+    user_id = session['user_id']
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in ('csv', 'json'):
+        abort(400)
+
+    def rows():
+        with db_cursor(buffered=False) as cursor:
+            cursor.execute("""
+                SELECT id, `Product Name`, Brand, Size, SellPrice, Description
+                FROM product_catalog
+                WHERE user_id = %s
+                ORDER BY id
+            """, (user_id,))
+            while True:
+                chunk = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                if not chunk:
+                    break
+                yield from chunk
+
+    body = export_csv(rows()) if fmt == 'csv' else export_json(rows())
+    return Response(
+        stream_with_context(body),
+        mimetype='text/csv' if fmt == 'csv' else 'application/json',
+        headers={'Content-Disposition': f'attachment; filename=products.{fmt}'}
+    )
+
 # ---------------------------------
 # Admin Panel
 # ---------------------------------
+def product_filter():
+    # Shop owners only see their own products; admins may pick a shop with ?user_id=
+    if session.get('role') != 'admin':
+        return ['user_id = %s'], [session['user_id']]
+    owner = request.args.get('user_id', type=int)
+    return (['user_id = %s'], [owner]) if owner else ([], [])
+
+
 @app.route('/admin')
 @admin_required
 def admin_panel():
-    with db_cursor(dictionary=True) as cursor:
-        cursor.execute("SELECT id, username, role FROM users")
-        users = cursor.fetchall()
-        cursor.execute("SELECT * FROM product_catalog")
-        products = cursor.fetchall()
+    try:
+        with db_cursor(dictionary=True) as cursor:
+            users = USER_LISTING.page(cursor, **page_args('users_'))
+            products = PRODUCT_LISTING.page(cursor, *product_filter(), **page_args('products_'))
+    except PageRequestError:
+        abort(400)
 
     return render_template("admin_panel.html", users=users, products=products)
 
 
+@app.route('/api/products')
+def api_products():
+    if 'user_id' not in session:
+        return jsonify({"error": "Login required."}), 401
+    try:
+        with db_cursor(dictionary=True) as cursor:
+            page = PRODUCT_LISTING.page(cursor, *product_filter(), **page_args())
+    except PageRequestError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+
+@app.route('/api/users')
+@admin_required
+def api_users():
+    try:
+        with db_cursor(dictionary=True) as cursor:
+            page = USER_LISTING.page(cursor, **page_args())
+    except PageRequestError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+
+@app.route('/admin/pool_stats')
+@admin_required
+def pool_stats():
+    return jsonify(db_pool.stats())
+
+
 
 # Run App
 
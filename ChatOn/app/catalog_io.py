@@ -0,0 +1,209 @@
+import codecs
+import csv
+import io
+import json
+import os
+from decimal import Decimal, InvalidOperation
+
+# ---------------------------------
+# Bulk import / export settings
+# ---------------------------------
+# Rows written per executemany + commit
+IMPORT_BATCH_SIZE = int(os.environ.get('CHATON_IMPORT_BATCH_SIZE', '500'))
+# Per-row errors included in the progress report (all are counted)
+IMPORT_MAX_ERRORS = int(os.environ.get('CHATON_IMPORT_MAX_ERRORS', '100'))
+# Rows fetched per round trip while exporting
+EXPORT_FETCH_SIZE = int(os.environ.get('CHATON_EXPORT_FETCH_SIZE', '1000'))
+
+READ_CHUNK = 64 * 1024
+
+# Export/import columns, in file order, and the product_catalog column behind each
+FIELDS = ['product_name', 'brand', 'size', 'price', 'description']
+COLUMNS = ['`Product Name`', 'Brand', 'Size', 'SellPrice', 'Description']
+
+# Header spellings accepted on import besides the field names themselves
+ALIASES = {
+    'product name': 'product_name',
+    'name': 'product_name',
+    'sellprice': 'price',
+    'sell price': 'price',
+}
+
+# product_catalog column limits: VARCHAR(255), TEXT (bytes) and DECIMAL(10, 2)
+MAX_TEXT_LENGTH = 255
+MAX_DESCRIPTION_BYTES = 65535
+MAX_PRICE = Decimal('99999999.99')
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+# Utility: "Product Name" / "product_name" / "SellPrice" -> field name
+def normalise_header(header):
+    key = (header or '').strip().lower()
+    return ALIASES.get(key, key.replace(' ', '_'))
+
+
+def iter_csv(stream):
+    """(line number, row dict) for each CSV data row, read incrementally."""
+    reader = csv.reader(codecs.iterdecode(stream, 'utf-8-sig'))
+    try:
+        header = next(reader, None)
+        if header is None:
+            return
+        fields = [normalise_header(h) for h in header]
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            yield reader.line_num, dict(zip(fields, row))
+    except UnicodeDecodeError:
+        raise ImportFormatError(f'The file is not UTF-8 text (after line {reader.line_num}).')
+    except csv.Error as e:
+        raise ImportFormatError(f'Invalid CSV at line {reader.line_num}: {e}')
+
+
+def iter_json(stream):
+    """(item number, object) from a JSON array or JSON Lines, read incrementally."""
+    decoder = json.JSONDecoder()
+    reader = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    pos = 0
+    number = 0
+    in_array = None
+    eof = False
+    while True:
+        # Skip whitespace and the separators between items
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and in_array is None:
+            in_array = buffer[pos] == '['
+            if in_array:
+                pos += 1
+                continue
+        if pos < len(buffer) and buffer[pos] == ']' and in_array:
+            return
+        if pos < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if eof:
+                    raise ImportFormatError(f'Invalid JSON after item {number}.')
+                item = None
+            else:
+                # A number at the very end of the buffer may still be incomplete
+                if end < len(buffer) or eof:
+                    number += 1
+                    pos = end
+                    yield number, item
+                    continue
+        if eof:
+            if in_array:
+                raise ImportFormatError('JSON array is not closed.')
+            return
+        chunk = stream.read(READ_CHUNK)
+        eof = not chunk
+        try:
+            buffer = buffer[pos:] + reader.decode(chunk or b'', final=eof)
+        except UnicodeDecodeError:
+            raise ImportFormatError(f'The file is not UTF-8 text (after item {number}).')
+        pos = 0
+
+
+def iter_rows(stream, fmt):
+    if fmt == 'csv':
+        return iter_csv(stream)
+    if fmt in ('json', 'jsonl', 'ndjson'):
+        return iter_json(stream)
+    raise ImportFormatError(f"Unsupported format '{fmt}'; use csv or json.")
+
+
+def validate_row(raw):
+    """Row values in FIELDS order, or raise ValueError with the reason."""
+    if not isinstance(raw, dict):
+        raise ValueError('expected an object with product fields')
+    row = {normalise_header(k): v for k, v in raw.items()}
+    values = {}
+    for field in ('product_name', 'brand', 'size', 'description'):
+        value = row.get(field)
+        values[field] = '' if value is None else str(value).strip()
+    if not values['product_name']:
+        raise ValueError('product_name is required')
+    for field in ('product_name', 'brand', 'size'):
+        if len(values[field]) > MAX_TEXT_LENGTH:
+            raise ValueError(f'{field} is longer than {MAX_TEXT_LENGTH} characters')
+    if len(values['description'].encode('utf-8')) > MAX_DESCRIPTION_BYTES:
+        raise ValueError(f'description is longer than {MAX_DESCRIPTION_BYTES} bytes')
+    try:
+        price = Decimal(str(row.get('price', '')).strip().lstrip('$'))
+    except InvalidOperation:
+        raise ValueError(f"price '{row.get('price', '')}' is not a number")
+    if not price.is_finite() or price < 0:
+        raise ValueError('price must be zero or more')
+    # Checked before rounding too, since quantize fails on very large values
+    if price > MAX_PRICE or price.quantize(Decimal('0.01')) > MAX_PRICE:
+        raise ValueError(f'price must be at most {MAX_PRICE}')
+    values['price'] = price.quantize(Decimal('0.01'))
+    return tuple(values[field] for field in FIELDS)
+
+
+def iter_batches(rows, size=IMPORT_BATCH_SIZE):
+    """Groups of (valid rows, errors, rows read) of at most `size` valid rows."""
+    batch, errors, read = [], [], 0
+    for number, raw in rows:
+        read += 1
+        try:
+            batch.append(validate_row(raw))
+        except ValueError as e:
+            errors.append({'row': number, 'error': str(e)})
+        if len(batch) >= size:
+            yield batch, errors, read
+            batch, errors, read = [], [], 0
+    if batch or errors or read:
+        yield batch, errors, read
+
+
+# ---------------------------------
+# Export
+# ---------------------------------
+def export_record(row):
+    return {
+        'id': row[0],
+        'product_name': row[1],
+        'brand': row[2],
+        'size': row[3],
+        'price': None if row[4] is None else str(row[4]),
+        'description': row[5],
+    }
+
+
+def export_csv(rows):
+    """CSV text chunks for product rows, header first."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['id'] + FIELDS)
+    for row in rows:
+        record = export_record(row)
+        writer.writerow([record['id']] + [record[field] for field in FIELDS])
+        if out.tell() >= READ_CHUNK:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
+def export_json(rows):
+    """JSON array text chunks for product rows."""
+    parts = ['[']
+    size = 1
+    separator = '\n'
+    for row in rows:
+        part = separator + json.dumps(export_record(row))
+        separator = ',\n'
+        parts.append(part)
+        size += len(part)
+        if size >= READ_CHUNK:
+            yield ''.join(parts)
+            parts, size = [], 0
+    parts.append('\n]\n')
+    yield ''.join(parts)
@@ -0,0 +1,75 @@
+import time
+
+from actions import db
+from actions.db import DB_CONFIG
+
+# The web app commits each with-block itself (product writes and their
+# catalog_changes row go together), so it does not use the actions' autocommit
+APP_DB_CONFIG = dict(DB_CONFIG, autocommit=False)
+
+
+class ConnectionPool(db.ConnectionPool):
+    """The action server's connection pool with counters for sizing.
+
+    `stats()` reports how many checkouts were served, how many had to wait
+    for a free connection, how long they waited in total and how many gave
+    up after `timeout` seconds.
+    """
+
+    def __init__(self, size=db.POOL_SIZE, timeout=db.POOL_TIMEOUT,
+                 ping_after=db.POOL_PING_AFTER, **config):
+        super().__init__(size, timeout, ping_after, **(config or APP_DB_CONFIG))
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "opened": 0,
+            "discarded": 0,
+            "in_use": 0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _open(self):
+        connection = super()._open()
+        self._count("opened")
+        return connection
+
+    def _discard(self, connection):
+        self._count("discarded")
+        super()._discard(connection)
+
+    def _wait_for_slot(self):
+        if self._slots.acquire(blocking=False):
+            return True
+        started = time.monotonic()
+        acquired = super()._wait_for_slot()
+        with self._lock:
+            self._stats["waits"] += 1
+            self._stats["wait_seconds"] += time.monotonic() - started
+            if not acquired:
+                self._stats["timeouts"] += 1
+        return acquired
+
+    def acquire(self):
+        connection = super().acquire()
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+        return connection
+
+    def release(self, connection, broken=False):
+        try:
+            super().release(connection, broken)
+        finally:
+            self._count("in_use", -1)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, idle=len(self._idle))
+        stats["size"] = self.size
+        stats["timeout"] = self.timeout
+        return stats
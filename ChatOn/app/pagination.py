@@ -0,0 +1,180 @@
+import base64
+import json
+import os
+import re
+from decimal import Decimal
+
+# ---------------------------------
+# Pagination settings
+# ---------------------------------
+PAGE_SIZE = int(os.environ.get('CHATON_PAGE_SIZE', '50'))
+MAX_PAGE_SIZE = int(os.environ.get('CHATON_MAX_PAGE_SIZE', '500'))
+# Shortest word InnoDB puts in a FULLTEXT index (innodb_ft_min_token_size)
+FT_MIN_WORD_LENGTH = int(os.environ.get('CHATON_FT_MIN_WORD_LENGTH', '3'))
+
+# InnoDB's default full-text stopwords; required (+) stopwords match nothing
+FT_STOPWORDS = frozenset(
+    'a about an are as at be by com de en for from how i in is it la of on or '
+    'that the this to was what when where who will with und www'.split()
+)
+
+
+class PageRequestError(Exception):
+    pass
+
+
+# Utility: opaque page cursor holding the sort value and id of a boundary row
+def encode_cursor(value, row_id):
+    if isinstance(value, Decimal):
+        value = str(value)
+    raw = json.dumps([value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise PageRequestError('Invalid page cursor.')
+
+
+def keyset_condition(column, value, row_id, descending):
+    """WHERE clause for rows after (value, row_id) in ORDER BY column, id.
+
+    MySQL sorts NULLs first ascending and last descending; NULL sort values
+    are handled explicitly so those rows are not skipped.
+    """
+    if column == 'id':
+        return ('id < %s' if descending else 'id > %s'), [row_id]
+    if not descending:
+        if value is None:
+            return f'(({column} IS NULL AND id > %s) OR {column} IS NOT NULL)', [row_id]
+        return f'({column} > %s OR ({column} = %s AND id > %s))', [value, value, row_id]
+    if value is None:
+        return f'({column} IS NULL AND id < %s)', [row_id]
+    return f'({column} < %s OR ({column} = %s AND id < %s) OR {column} IS NULL)', [value, value, row_id]
+
+
+# Utility: LIKE pattern matching `text` literally anywhere in a column
+def like_pattern(text):
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def search_clause(q, columns, fulltext):
+    """WHERE clause requiring every word of `q`.
+
+    With `fulltext`, words long enough for the FULLTEXT index become
+    MATCH ... AGAINST('+word*' IN BOOLEAN MODE) prefix terms; shorter words
+    (sizes like "m8") fall back to a LIKE over `columns`.
+    """
+    words = re.findall(r'\w+', q.lower())
+    clauses, args = [], []
+    if fulltext:
+        indexed = [w for w in words if len(w) >= FT_MIN_WORD_LENGTH and w not in FT_STOPWORDS]
+        if indexed:
+            clauses.append(f"MATCH({', '.join(columns)}) AGAINST (%s IN BOOLEAN MODE)")
+            args.append(' '.join(f'+{w}*' for w in indexed))
+        words = [w for w in words if len(w) < FT_MIN_WORD_LENGTH]
+    elif not words:
+        words = [q]
+    for word in words:
+        clauses.append('(' + ' OR '.join(f'{c} LIKE %s' for c in columns) + ')')
+        args += [like_pattern(word)] * len(columns)
+    return ' AND '.join(clauses), args
+
+
+class Listing:
+    """Keyset-paginated SELECT over one table.
+
+    `sorts` maps a public sort name to (SQL column, row key). Pages are read
+    with `WHERE (sort column, id) > boundary ORDER BY sort column, id
+    LIMIT n + 1`, so a page costs the same however deep it is; the extra
+    row tells whether there is a next page.
+    """
+
+    def __init__(self, table, columns, sorts, search_columns=(), fulltext=False):
+        self.table = table
+        self.columns = columns
+        self.sorts = sorts
+        self.search_columns = search_columns
+        # search_columns are exactly the columns of a FULLTEXT index
+        self.fulltext = fulltext
+
+    def page(self, cursor, where=(), params=(), sort='id', order='asc',
+             after=None, before=None, limit=PAGE_SIZE, q=None):
+        if sort not in self.sorts:
+            raise PageRequestError(f"Unknown sort '{sort}'.")
+        if order not in ('asc', 'desc'):
+            raise PageRequestError(f"Unknown order '{order}'.")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        column, key = self.sorts[sort]
+
+        clauses, args = list(where), list(params)
+        if q and self.search_columns:
+            clause, search_args = search_clause(q, self.search_columns, self.fulltext)
+            if clause:
+                clauses.append(clause)
+                args += search_args
+
+        # Paging backwards reads the reversed order and flips the rows back
+        descending = order == 'desc'
+        boundary = before or after
+        if before:
+            descending = not descending
+        if boundary:
+            clause, boundary_args = keyset_condition(column, *decode_cursor(boundary), descending)
+            clauses.append(clause)
+            args += boundary_args
+
+        direction = 'DESC' if descending else 'ASC'
+        order_by = 'id ' + direction if column == 'id' else f'{column} {direction}, id {direction}'
+        cursor.execute(
+            f"SELECT {self.columns} FROM {self.table}"
+            + (' WHERE ' + ' AND '.join(clauses) if clauses else '')
+            + f' ORDER BY {order_by} LIMIT %s',
+            args + [limit + 1]
+        )
+        rows = cursor.fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if before:
+            rows.reverse()
+
+        def boundary_of(row):
+            return encode_cursor(row[key], row['id'])
+
+        has_next = (more and not before) or bool(before)
+        has_prev = (more and bool(before)) or bool(after)
+        return {
+            'items': rows,
+            'next': boundary_of(rows[-1]) if rows and has_next else None,
+            'prev': boundary_of(rows[0]) if rows and has_prev else None,
+            'sort': sort,
+            'order': order,
+            'limit': limit,
+        }
+
+
+PRODUCT_LISTING = Listing(
+    'product_catalog',
+    'id, user_id, `Product Name`, Brand, Size, SellPrice, Description',
+    {
+        'id': ('id', 'id'),
+        'name': ('`Product Name`', 'Product Name'),
+        'brand': ('Brand', 'Brand'),
+        'price': ('SellPrice', 'SellPrice'),
+    },
+    search_columns=('`Product Name`', 'Brand', 'Description'),
+    fulltext=True,
+)
+
+USER_LISTING = Listing(
+    'users',
+    'id, username, role, shop_name',
+    {
+        'id': ('id', 'id'),
+        'username': ('username', 'username'),
+    },
+    search_columns=('username', 'shop_name'),
+)
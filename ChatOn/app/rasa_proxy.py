@@ -0,0 +1,167 @@
+import itertools
+import json
+import os
+import threading
+import time
+
+from actions import tracing
+from actions.lazy import lazy_import
+from actions.metrics import counter, histogram
+
+# Imported with the first Rasa call, not when a worker starts
+requests = lazy_import('requests')
+urllib3_exceptions = lazy_import('urllib3.exceptions')
+
+# ---------------------------------
+# Rasa proxy settings
+# ---------------------------------
+# Comma-separated list of Rasa REST webhook URLs to balance across
+RASA_API_URLS = [
+    url.strip()
+    for url in os.environ.get('RASA_API_URLS', 'http://localhost:5005/webhooks/rest/webhook').split(',')
+    if url.strip()
+]
+RASA_CONNECT_TIMEOUT = float(os.environ.get('RASA_CONNECT_TIMEOUT', '2'))
+RASA_READ_TIMEOUT = float(os.environ.get('RASA_READ_TIMEOUT', '10'))
+# Upper bound on Rasa calls in flight from this web process; calls past it
+# fail at once instead of holding another worker for a Rasa that is behind
+RASA_MAX_INFLIGHT = int(os.environ.get('RASA_MAX_INFLIGHT', '64'))
+# Seconds a Rasa URL is skipped after a connection failure
+RASA_RETRY_AFTER = float(os.environ.get('RASA_RETRY_AFTER', '5'))
+
+RASA_SECONDS = histogram(
+    'chaton_rasa_request_seconds', 'Round trip to Rasa until response headers arrive', ['url', 'outcome']
+)
+RASA_ERRORS = counter('chaton_rasa_errors_total', 'Failed Rasa requests', ['url', 'error'])
+
+
+class RasaUnavailable(Exception):
+    pass
+
+
+# Utility: the request failed before any of it reached Rasa, so it is safe to resend
+def connect_failed(err):
+    if isinstance(err, requests.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason says which phase failed;
+    # NewConnectionError (refused, DNS) is a ConnectTimeoutError subclass
+    reason = getattr(err.args[0], 'reason', None) if err.args else None
+    return isinstance(reason, urllib3_exceptions.ConnectTimeoutError)
+
+
+class RasaProxy:
+    """Forwards chat messages to one of several Rasa servers.
+
+    Calls run in the caller's thread, so the Flask worker is busy for the
+    whole round trip; what this adds over a bare requests.post is a
+    keep-alive requests.Session (connections to Rasa are reused), the
+    connect + read timeouts, and `max_inflight`: calls beyond it raise
+    RasaUnavailable at once instead of tying up more workers. The session
+    (and requests itself) is set up by the first call. URLs are used round
+    robin; a URL that cannot be connected to is skipped for `retry_after`
+    seconds and the message is retried on the next one. Failures after the
+    request was sent are not retried, so Rasa never sees a message twice.
+    """
+
+    def __init__(self, urls=None, connect_timeout=RASA_CONNECT_TIMEOUT,
+                 read_timeout=RASA_READ_TIMEOUT, max_inflight=RASA_MAX_INFLIGHT,
+                 retry_after=RASA_RETRY_AFTER):
+        self.urls = list(urls or RASA_API_URLS)
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry_after = retry_after
+        self._cycle = itertools.cycle(range(len(self.urls)))
+        self._down_until = [0.0] * len(self.urls)
+        self._lock = threading.Lock()
+        self._max_inflight = max_inflight
+        self._inflight = threading.BoundedSemaphore(max_inflight)
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(
+                        pool_connections=len(self.urls), pool_maxsize=self._max_inflight
+                    )
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def _candidates(self):
+        # Next URL in rotation first, then the rest; URLs marked down go last
+        with self._lock:
+            start = next(self._cycle)
+            down = list(self._down_until)
+        now = time.monotonic()
+        order = [(start + i) % len(self.urls) for i in range(len(self.urls))]
+        return sorted(order, key=lambda i: down[i] > now)
+
+    def _mark_down(self, i):
+        with self._lock:
+            self._down_until[i] = time.monotonic() + self.retry_after
+
+    def _request(self, payload, **kwargs):
+        last_error = None
+        for i in self._candidates():
+            url = self.urls[i]
+            started = time.perf_counter()
+            outcome = 'ok'
+            span = tracing.start_span('rasa POST', tracing.CLIENT, **{'http.url': url})
+            body, headers = payload, {}
+            if span.traceparent:
+                # Actions read the trace from the message metadata; the header is for Rasa's own tracing
+                metadata = dict(payload.get('metadata') or {}, traceparent=span.traceparent)
+                body, headers = dict(payload, metadata=metadata), {'traceparent': span.traceparent}
+            try:
+                with tracing.activate(span):
+                    response = self.session.post(url, json=body, headers=headers, timeout=self.timeout, **kwargs)
+                    span.set_attribute('http.status_code', response.status_code)
+                    response.raise_for_status()
+                return response
+            except requests.ConnectionError as err:
+                outcome = 'error'
+                RASA_ERRORS.inc(url=url, error=type(err).__name__)
+                # Only failures before Rasa saw the message are retried elsewhere;
+                # a reset mid-response may come after Rasa has acted on it
+                if not connect_failed(err):
+                    raise
+                self._mark_down(i)
+                last_error = err
+            except requests.RequestException as err:
+                outcome = 'error'
+                RASA_ERRORS.inc(url=url, error=type(err).__name__)
+                raise
+            finally:
+                RASA_SECONDS.observe(time.perf_counter() - started, url=url, outcome=outcome)
+        raise RasaUnavailable(last_error)
+
+    def _slot(self):
+        if not self._inflight.acquire(blocking=False):
+            RASA_ERRORS.inc(url='', error='TooManyInflight')
+            raise RasaUnavailable(f"{self._max_inflight} Rasa calls already in flight")
+
+    def send(self, payload):
+        """Post `payload` to Rasa and return the decoded list of bot messages."""
+        self._slot()
+        try:
+            return self._request(payload).json()
+        finally:
+            self._inflight.release()
+
+    def stream(self, payload):
+        """Yield each bot message as Rasa emits it (REST channel `stream=true`).
+
+        The read timeout applies per message.
+        """
+        self._slot()
+        try:
+            response = self._request(payload, params={'stream': 'true'}, stream=True)
+            with response:
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+        finally:
+            self._inflight.release()
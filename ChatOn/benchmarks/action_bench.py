@@ -0,0 +1,162 @@
+"""Latency of every Action.run with in-process Tracker/CollectingDispatcher objects.
+
+Actions run against a SQLite catalog seeded by benchmarks.seed_data (a
+temporary one of --products rows unless --sqlite is given), or against the
+MySQL database in CHATON_DB_* with --mysql. Feedback is spooled to a
+temporary file and never flushed. Lookup caches are cleared before each
+action; its first call, which may build the indexes, is timed separately.
+Names repeat across calls, so later calls can hit the caches as in a
+conversation. Run from the ChatOn directory:
+
+    python -m benchmarks.action_bench --products 20000 --calls 500
+    python -m benchmarks.action_bench --save base.json
+    python -m benchmarks.action_bench --baseline base.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+# Keep the action module from binding its metrics port or warming its own resolver
+os.environ["CHATON_ACTIONS_METRICS_PORT"] = "0"
+os.environ["CHATON_WARMUP"] = "0"
+
+from rasa_sdk import Action, Tracker  # noqa: E402
+from rasa_sdk.executor import CollectingDispatcher  # noqa: E402
+
+from actions import actions as action_module  # noqa: E402
+from actions.feedback_queue import FeedbackQueue, set_feedback_queue  # noqa: E402
+from actions.products import (  # noqa: E402
+    CATALOG_SNAPSHOT, ProductResolver, SnapshotProductBackend, SQLiteProductBackend, get_resolver, set_resolver,
+)
+from benchmarks import seed_data  # noqa: E402
+from benchmarks.seed_data import product_names  # noqa: E402
+from benchmarks.synthetic import BRANDS, PRAISE, SIZES  # noqa: E402
+from benchmarks.timing import HEADER, add_report_arguments, format_row, report, summarize  # noqa: E402
+
+
+class SQLiteCursor:
+    """The part of a mysql.connector cursor the actions use, over sqlite3."""
+
+    def __init__(self, connection):
+        self._cursor = connection.cursor()
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace("%s", "?"), params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+
+def sqlite_db_cursor(path):
+    connection = sqlite3.connect(path, check_same_thread=False)
+
+    @contextmanager
+    def db_cursor(dictionary=False):
+        yield SQLiteCursor(connection)
+
+    return db_cursor
+
+
+def action_classes():
+    return [
+        cls for _, cls in inspect.getmembers(action_module, inspect.isclass)
+        if issubclass(cls, Action) and cls.__module__ == action_module.__name__ and not inspect.isabstract(cls)
+    ]
+
+
+def tracker(text, product_name=None):
+    entities = [{"entity": "product_name", "value": product_name}] if product_name else []
+    message = {"text": text, "entities": entities, "intent": {}}
+    return Tracker("bench", {"product_name": None, "sentiment": None}, message, [], False, None, {}, None)
+
+
+def make_trackers(action, names, seed):
+    rng = random.Random(seed)
+    if action.name() == "action_store_feedback":
+        return [tracker(f"{rng.choice(PRAISE)}, would buy again", name) for name in names]
+    if action.name() == "action_search_by_description":
+        return [tracker(f"{rng.choice(BRANDS)} {name.split()[-1]} {rng.choice(SIZES)}") for name in names]
+    return [tracker(f"tell me about {name}", name) for name in names]
+
+
+def reset_caches():
+    # Each action starts cold instead of reusing lookups of the one before
+    resolver = get_resolver()
+    resolver.cache.clear()
+    resolver.index._clear_memo()
+
+
+def bench(action, trackers, loop):
+    reset_caches()
+    dispatcher = CollectingDispatcher()
+    started = time.perf_counter()
+    loop.run_until_complete(action.run(dispatcher, trackers[0], {}))
+    first = time.perf_counter() - started
+
+    latencies = []
+    started = time.perf_counter()
+    for t in trackers[1:]:
+        dispatcher.messages.clear()
+        call_started = time.perf_counter()
+        loop.run_until_complete(action.run(dispatcher, t, {}))
+        latencies.append(time.perf_counter() - call_started)
+    return first, summarize(latencies, time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--sqlite", metavar="PATH", help="catalog seeded by benchmarks.seed_data")
+    source.add_argument("--mysql", action="store_true", help="use the database in CHATON_DB_*")
+    parser.add_argument("--products", type=int, default=20000, help="size of the temporary catalog")
+    parser.add_argument("--calls", type=int, default=500, help="calls per action")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--fsync", action="store_true", help="fsync spooled feedback, as in production")
+    parser.add_argument("--only", action="append", help="action name to run (repeatable)")
+    add_report_arguments(parser)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="chaton-bench-")
+    set_feedback_queue(FeedbackQueue(os.path.join(workdir, "feedback.spool"),
+                                     flush_size=sys.maxsize, fsync=args.fsync))
+    if args.mysql:
+        # Same generator and seed as seed_data, so these are the names of a database seeded with --products
+        path = os.path.join(workdir, "names.sqlite3")
+        seed_data.main(["--sqlite", path, "--products", str(args.products), "--feedback", "0"])
+    else:
+        path = args.sqlite or os.path.join(workdir, "catalog.sqlite3")
+        if not args.sqlite:
+            seed_data.main(["--sqlite", path, "--products", str(args.products)])
+        backend = SQLiteProductBackend(path)
+        # As get_resolver would; CHATON_CATALOG_SNAPSHOT=0 compares with a query per lookup
+        set_resolver(ProductResolver(SnapshotProductBackend(backend) if CATALOG_SNAPSHOT else backend))
+        action_module.db_cursor = sqlite_db_cursor(path)
+
+    names = product_names(path, args.calls + 1, args.seed)
+    print(f"backend: {'mysql' if args.mysql else path}  calls per action: {args.calls}")
+    print(f"{HEADER} {'first ms':>9}")
+    results = {}
+    # Actions are coroutines; one loop for the run, as in an action server worker
+    loop = asyncio.new_event_loop()
+    for cls in action_classes():
+        action = cls()
+        if args.only and action.name() not in args.only:
+            continue
+        first, summary = bench(action, make_trackers(action, names, args.seed), loop)
+        results[action.name()] = summary
+        print(f"{format_row(action.name(), summary)} {first * 1000:9.1f}")
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Memory and lookup latency of the catalog snapshot against plain records.
+
+Loads a SQLite catalog seeded by benchmarks.seed_data (a temporary one of
+--products rows unless --sqlite is given) three ways and reports the heap
+each holds, measured with tracemalloc: the ProductRecord list that
+`load_records` returns, a CatalogSnapshot, and the same snapshot mapped
+from its file (whose pages the kernel shares between processes). It then
+times `fetch` for --lookups random batches of --batch ids against SQLite
+and against SnapshotProductBackend. Run from the ChatOn directory:
+
+    python -m benchmarks.catalog_bench --products 200000
+    python -m benchmarks.catalog_bench --sqlite catalog.sqlite3 --save catalog.json
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from actions.catalog_snapshot import CatalogSnapshot
+from actions.products import SnapshotProductBackend, SQLiteProductBackend
+from benchmarks import seed_data
+from benchmarks.timing import HEADER, add_report_arguments, format_row, report, summarize
+
+
+def heap_bytes(build):
+    """(result, bytes still allocated by build() once it returned)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def time_fetch(backend, batches):
+    backend.fetch(batches[0])
+    latencies = []
+    started = time.perf_counter()
+    for ids in batches:
+        t = time.perf_counter()
+        found = backend.fetch(ids)
+        # Read every field, as an action composing its reply would
+        for record in found.values():
+            tuple(record)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sqlite", metavar="PATH", help="catalog seeded by benchmarks.seed_data")
+    parser.add_argument("--products", type=int, default=100000, help="size of the temporary catalog")
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=5, help="ids per fetch, like a fuzzy match")
+    parser.add_argument("--seed", type=int, default=3)
+    add_report_arguments(parser)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="chaton-catalog-")
+    path = args.sqlite or os.path.join(workdir, "catalog.sqlite3")
+    if not args.sqlite:
+        seed_data.main(["--sqlite", path, "--products", str(args.products), "--feedback", "0"])
+    source = SQLiteProductBackend(path)
+    records = source.load_records()
+
+    _, records_size = heap_bytes(source.load_records)
+    # From a fresh load, so strings the snapshot keeps are counted as its own
+    snapshot, snapshot_size = heap_bytes(lambda: CatalogSnapshot.from_records(source.load_records()))
+    file_size = snapshot.save(os.path.join(workdir, "catalog.bin"))
+    mapped, mapped_size = heap_bytes(lambda: CatalogSnapshot.open(os.path.join(workdir, "catalog.bin")))
+    estimate = sum(snapshot.memory_usage().values())
+
+    print(f"rows: {len(records)}")
+    print(f"{'':<34} {'heap MB':>9} {'per row B':>10}")
+    for label, size in [("ProductRecord list", records_size), ("CatalogSnapshot", snapshot_size),
+                        ("CatalogSnapshot mapped", mapped_size)]:
+        print(f"{label:<34} {size / 1e6:9.1f} {size / max(1, len(records)):10.1f}")
+    print(f"snapshot memory_usage(): {estimate / 1e6:.1f} MB, file: {file_size / 1e6:.1f} MB")
+
+    rng = random.Random(args.seed)
+    ids = [record.id for record in records]
+    batches = [rng.sample(ids, min(args.batch, len(ids))) for _ in range(args.lookups)]
+    snapshot_backend = SnapshotProductBackend(source)
+    snapshot_backend.fetch([])
+    del records, snapshot, mapped
+
+    print(HEADER)
+    results = {}
+    for label, backend in [("fetch sqlite", source), ("fetch snapshot", snapshot_backend)]:
+        results[label] = summary = time_fetch(backend, batches)
+        print(format_row(label, summary))
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Throughput of concurrent conversations with blocking vs. thread-pool action work.
+
+Runs --conversations conversations at once on one event loop, as a Sanic
+worker of the action server does: each sends --turns action calls in a row
+(price, availability, location, contact, feedback summary, store feedback)
+through rasa_sdk's ActionExecutor. Latency is per turn, counted from the
+answer to the previous turn of the same conversation. The catalog is a
+SQLite file seeded by benchmarks.seed_data (a temporary one of --products
+rows unless --sqlite is given); --db-latency adds a sleep to every catalog
+and feedback query, like the round trip to a MySQL server. Each run is
+repeated with the blocking work inline on the event loop
+(CHATON_ACTION_THREADS=0, how the synchronous actions ran) and on the
+action thread pool. Run from the ChatOn directory:
+
+    python -m benchmarks.concurrency_bench --conversations 32 --db-latency 5
+    CHATON_CATALOG_SNAPSHOT=0 python -m benchmarks.concurrency_bench --threads 4,8,16
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import rasa_sdk
+from rasa_sdk.executor import ActionExecutor as RasaActionExecutor
+
+# Sets the environment the action module reads, so import it first
+from benchmarks.action_bench import SQLiteCursor, action_classes, sqlite_db_cursor
+from actions import actions as action_module
+from actions.concurrency import ActionExecutor, set_action_executor
+from actions.feedback_queue import FeedbackQueue, set_feedback_queue
+from actions.products import (
+    CATALOG_SNAPSHOT, ProductResolver, SnapshotProductBackend, SQLiteProductBackend, get_resolver, set_resolver,
+)
+from benchmarks import seed_data
+from benchmarks.seed_data import product_names
+from benchmarks.synthetic import PRAISE
+from benchmarks.timing import HEADER, add_report_arguments, format_row, report, summarize
+
+TURNS = [
+    "action_getting_price", "action_check_availability", "action_getting_location",
+    "action_getting_contact", "action_query_feedback_summary", "action_store_feedback",
+]
+
+
+class RemoteSQLiteBackend(SQLiteProductBackend):
+    """SQLite with a fixed delay per query, standing in for a networked MySQL."""
+
+    def __init__(self, path, latency):
+        super().__init__(path)
+        self.latency = latency
+
+    def _query(self, sql, params=()):
+        time.sleep(self.latency)
+        return super()._query(sql, params)
+
+
+class RemoteSQLiteCursor(SQLiteCursor):
+    latency = 0.0
+
+    def execute(self, sql, params=()):
+        time.sleep(self.latency)
+        super().execute(sql, params)
+
+
+def remote_db_cursor(path, latency):
+    db_cursor = sqlite_db_cursor(path)
+
+    @contextmanager
+    def slow_cursor(dictionary=False):
+        with db_cursor(dictionary) as cursor:
+            cursor.__class__ = RemoteSQLiteCursor
+            cursor.latency = latency
+            yield cursor
+
+    return slow_cursor
+
+
+def action_call(action, name, sender, rng):
+    text = f"{rng.choice(PRAISE)}, would buy again" if action == "action_store_feedback" else f"about {name}"
+    message = {"text": text, "intent": {"name": "bench"},
+               "entities": [{"entity": "product_name", "value": name}]}
+    return {
+        "next_action": action,
+        "sender_id": sender,
+        "version": rasa_sdk.__version__,
+        "domain": {},
+        "tracker": {
+            "sender_id": sender, "slots": {"product_name": None, "sentiment": None}, "latest_message": message,
+            "events": [], "paused": False, "followup_action": None, "active_loop": {},
+            "latest_action_name": None,
+        },
+    }
+
+
+async def converse(executor, calls, latencies, started):
+    # A turn is ready when the one before it answered; the time until its own
+    # answer includes waiting for other conversations to free the loop
+    ready = started
+    for call in calls:
+        await executor.run(call)
+        now = time.perf_counter()
+        latencies.append(now - ready)
+        ready = now
+
+
+async def run_conversations(executor, conversations):
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(converse(executor, calls, latencies, started) for calls in conversations))
+    return latencies, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sqlite", metavar="PATH", help="catalog seeded by benchmarks.seed_data")
+    parser.add_argument("--products", type=int, default=20000, help="size of the temporary catalog")
+    parser.add_argument("--conversations", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=12, help="action calls per conversation")
+    parser.add_argument("--db-latency", type=float, default=5.0, metavar="MS", help="added to every query")
+    parser.add_argument("--threads", default="8", help="comma-separated thread pool sizes to compare")
+    parser.add_argument("--limit", type=int, default=16, help="calls of one action in progress at once")
+    parser.add_argument("--seed", type=int, default=3)
+    add_report_arguments(parser)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="chaton-concurrency-")
+    path = args.sqlite or os.path.join(workdir, "catalog.sqlite3")
+    if not args.sqlite:
+        seed_data.main(["--sqlite", path, "--products", str(args.products)])
+    latency = args.db_latency / 1000
+    backend = RemoteSQLiteBackend(path, latency)
+    set_resolver(ProductResolver(SnapshotProductBackend(backend) if CATALOG_SNAPSHOT else backend))
+    action_module.db_cursor = remote_db_cursor(path, latency)
+    set_feedback_queue(FeedbackQueue(os.path.join(workdir, "feedback.spool"), flush_size=sys.maxsize))
+
+    rasa_executor = RasaActionExecutor()
+    for cls in action_classes():
+        rasa_executor.register_action(cls)
+    names = product_names(path, args.conversations * args.turns, args.seed)
+    rng = random.Random(args.seed)
+    conversations = [
+        [action_call(rng.choice(TURNS), names[c * args.turns + t], f"bench-{c}", rng) for t in range(args.turns)]
+        for c in range(args.conversations)
+    ]
+
+    loop = asyncio.new_event_loop()
+    # Index build and first queries before any timing
+    get_resolver().index
+    set_action_executor(ActionExecutor(threads=0))
+    loop.run_until_complete(run_conversations(rasa_executor, conversations[:1]))
+
+    print(f"cpus: {os.cpu_count()}  conversations: {args.conversations}  turns: {args.turns}  "
+          f"db latency: {args.db_latency} ms  catalog snapshot: {'on' if CATALOG_SNAPSHOT else 'off'}")
+    print(HEADER)
+    results = {}
+    modes = [("blocking, on the event loop", 0)]
+    modes += [(f"async, {n} threads", n) for n in map(int, args.threads.split(","))]
+    for label, threads in modes:
+        executor = ActionExecutor(threads=threads, concurrency=args.limit, limits={})
+        set_action_executor(executor)
+        get_resolver().cache.clear()
+        latencies, elapsed = loop.run_until_complete(run_conversations(rasa_executor, conversations))
+        executor.shutdown()
+        results[label] = summary = summarize(latencies, elapsed)
+        print(format_row(label, summary))
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
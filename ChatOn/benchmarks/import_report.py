@@ -0,0 +1,156 @@
+"""Startup import cost of the Flask app and the action module, with budgets.
+
+Imports each target in a fresh interpreter under `python -X importtime`
+--runs times and reports the median total, the direct imports that cost
+the most and the modules with the largest self time. It fails when a
+target's median exceeds its --budget, when a module that should be
+deferred to first use (mysql.connector, requests, numpy, textblob) was
+imported at startup, or when the p95 regressed against --baseline. Run
+from the ChatOn directory:
+
+    python -m benchmarks.import_report
+    python -m benchmarks.import_report --target app --budget app=250 --top 20
+    python -m benchmarks.import_report --save imports.json
+    python -m benchmarks.import_report --baseline imports.json --tolerance 0.3
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from benchmarks.timing import HEADER, add_report_arguments, format_row, report, summarize
+
+CHATON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name: (directory the process starts in, module imported)
+TARGETS = {
+    "app": ("app", "app"),
+    "actions": (".", "actions.actions"),
+}
+
+# Loaded on first use by both targets; importing them at startup is a regression
+DEFERRED = ["mysql.connector", "requests", "numpy", "textblob"]
+
+# Import only: no warmup thread, metrics port or span exporter in the measured process
+QUIET_ENV = {"CHATON_WARMUP": "0", "CHATON_ACTIONS_METRICS_PORT": "0", "CHATON_TRACE_FILE": ""}
+
+
+def parse_importtime(stderr, module):
+    """{name: (self us, cumulative us, depth)} of `module` and what it imported.
+
+    -X importtime prints a module after everything it imported, one level
+    deeper, so the target's subtree is the run of deeper lines right above
+    it; what the interpreter loaded at startup (site, encodings) is left out.
+    """
+    lines = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the column header
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        lines.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    end = max(i for i, line in enumerate(lines) if line[0] == module)
+    start, depth = end, lines[end][3]
+    while start > 0 and lines[start - 1][3] > depth:
+        start -= 1
+    return {name: (self_us, cumulative_us, d - depth) for name, self_us, cumulative_us, d in lines[start:end + 1]}
+
+
+def import_once(directory, module):
+    env = dict(os.environ, **QUIET_ENV)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.join(CHATON_DIR, directory), env=env, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr, module)
+
+
+def profile(directory, module, runs):
+    """Per-run totals (seconds) and per-module median self/cumulative time (ms)."""
+    totals, self_ms, cumulative_ms, depths = [], defaultdict(list), defaultdict(list), {}
+    for _ in range(runs):
+        modules = import_once(directory, module)
+        totals.append(modules[module][1] / 1e6)
+        for name, (self_us, cumulative_us, depth) in modules.items():
+            self_ms[name].append(self_us / 1000)
+            cumulative_ms[name].append(cumulative_us / 1000)
+            depths[name] = depth
+    medians = {
+        name: (statistics.median(self_ms[name]), statistics.median(cumulative_ms[name]), depths[name])
+        for name in depths
+    }
+    return totals, medians
+
+
+def print_profile(name, module, totals, medians, top):
+    total_ms = statistics.median(totals) * 1000
+    print(f"\n{name}: import {module} {total_ms:.1f} ms "
+          f"(median of {len(totals)}; min {min(totals) * 1000:.1f}, max {max(totals) * 1000:.1f})")
+    direct = [(m, v) for m, v in medians.items() if v[2] == 1]
+    print(f"  {'direct imports':<40} {'cumul ms':>9} {'self ms':>9} {'share':>6}")
+    for m, (self_ms, cumulative_ms, _) in sorted(direct, key=lambda item: -item[1][1])[:top]:
+        print(f"  {m:<40} {cumulative_ms:9.1f} {self_ms:9.1f} {cumulative_ms / total_ms:6.0%}")
+    print(f"  {'largest self time':<40} {'cumul ms':>9} {'self ms':>9}")
+    for m, (self_ms, cumulative_ms, _) in sorted(medians.items(), key=lambda item: -item[1][0])[:top]:
+        print(f"  {m:<40} {cumulative_ms:9.1f} {self_ms:9.1f}")
+
+
+def parse_budgets(values):
+    budgets = {}
+    for value in values:
+        name, _, ms = value.partition("=")
+        if name not in TARGETS or not ms:
+            raise argparse.ArgumentTypeError(f"--budget expects TARGET=MS with TARGET in {sorted(TARGETS)}")
+        budgets[name] = float(ms)
+    return budgets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS), help="default: all")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="rows per table")
+    parser.add_argument("--budget", action="append", default=[], metavar="TARGET=MS",
+                        help="fail when the median import time exceeds MS")
+    parser.add_argument("--defer", action="append", default=[], metavar="MODULE",
+                        help="also fail when MODULE is imported at startup")
+    add_report_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        budgets = parse_budgets(args.budget)
+    except argparse.ArgumentTypeError as err:
+        parser.error(str(err))
+
+    results, failures = {}, []
+    for name in args.target or sorted(TARGETS):
+        directory, module = TARGETS[name]
+        totals, medians = profile(directory, module, args.runs)
+        print_profile(name, module, totals, medians, args.top)
+        results[f"import {name}"] = summarize(totals, 0)
+        total_ms = statistics.median(totals) * 1000
+        if name in budgets and total_ms > budgets[name]:
+            failures.append(f"{name}: import takes {total_ms:.1f} ms, budget {budgets[name]:.0f} ms")
+        for m in DEFERRED + args.defer:
+            if m in medians:
+                failures.append(f"{name}: {m} is imported at startup ({medians[m][1]:.1f} ms), "
+                                f"it should load on first use")
+
+    print()
+    print(HEADER)
+    for label, summary in results.items():
+        print(format_row(label, summary))
+    for message in failures:
+        print("BUDGET", message)
+    status = report(results, args)
+    return status or (1 if failures else 0)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Load generator for the Flask /webhook route.
+
+By default it starts the stub Rasa server and the Flask app (threaded
+werkzeug server) in this process, then sends --requests chat messages from
+--concurrency client threads and reports throughput and p50/p95/p99. The
+clients share the GIL with the app, so numbers are for comparing runs; use
+--target to drive a separately started app (e.g. under gunicorn, with
+RASA_API_URLS pointing at `python -m benchmarks.stub_rasa`). Run from the
+ChatOn directory:
+
+    python -m benchmarks.load_test --requests 2000 --concurrency 16
+    python -m benchmarks.load_test --stream --rasa-delay-ms 50
+    python -m benchmarks.load_test --target http://localhost:3000 --baseline load.json
+"""
+import argparse
+import itertools
+import os
+import sys
+import threading
+import time
+
+import requests
+
+from benchmarks import stub_rasa
+from benchmarks.synthetic import KINDS, MATERIALS
+from benchmarks.timing import HEADER, add_report_arguments, format_row, report, summarize
+
+# What the Flask app answers when Rasa failed; counted as an error
+FALLBACK_TEXT = "the chatbot service is unavailable"
+
+
+def start_app(rasa_url):
+    """Serve app/app.py on an ephemeral port; returns its base URL."""
+    os.environ["RASA_API_URLS"] = rasa_url
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import app as flask_app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    # The app prints every message; keep the report readable
+    flask_app.print = lambda *args, **kwargs: None
+    server = make_server("127.0.0.1", 0, flask_app.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, name="flask", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def messages():
+    for material, kind in itertools.cycle(itertools.product(MATERIALS, KINDS)):
+        yield f"what is the price of {material} {kind}"
+
+
+def worker(url, jobs, latencies, errors, lock):
+    session = requests.Session()
+    for message in jobs:
+        started = time.perf_counter()
+        try:
+            response = session.post(url, json={"message": message}, timeout=30)
+            body = response.text
+            ok = response.status_code == 200 and FALLBACK_TEXT not in body
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors.append(elapsed)
+
+
+def run(url, total, concurrency):
+    jobs_lock = threading.Lock()
+    source = itertools.islice(messages(), total)
+
+    def jobs():
+        while True:
+            with jobs_lock:
+                message = next(source, None)
+            if message is None:
+                return
+            yield message
+
+    latencies, errors, lock = [], [], threading.Lock()
+    threads = [
+        threading.Thread(target=worker, args=(url, jobs(), latencies, errors, lock))
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", help="base URL of a running app instead of an in-process one")
+    parser.add_argument("--rasa-url", help="Rasa webhook for the in-process app (default: start the stub)")
+    parser.add_argument("--rasa-delay-ms", type=float, default=20)
+    parser.add_argument("--rasa-jitter-ms", type=float, default=10)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--stream", action="store_true", help="use /webhook/stream")
+    add_report_arguments(parser)
+    args = parser.parse_args(argv)
+
+    base = args.target
+    if not base:
+        rasa_url = args.rasa_url
+        if not rasa_url:
+            rasa_url = stub_rasa.webhook_url(stub_rasa.start(delay=args.rasa_delay_ms, jitter=args.rasa_jitter_ms))
+        base = start_app(rasa_url)
+        print(f"app: {base}  rasa: {rasa_url}")
+    label = "webhook/stream" if args.stream else "webhook"
+    url = base.rstrip("/") + "/" + label
+
+    run(url, args.warmup, min(args.concurrency, args.warmup or 1))
+    latencies, errors, elapsed = run(url, args.requests, args.concurrency)
+    summary = summarize(latencies, elapsed)
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {elapsed:.1f}s, {len(errors)} errors")
+    print(HEADER)
+    print(format_row(f"POST /{label}", summary))
+    status = report({label: summary}, args)
+    return status or (1 if errors else 0)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Ranked fuzzy name matching against the old full-table is_similar scan.
+
+Queries are catalog names with one character dropped. Run from the ChatOn
+directory:
+
+    python -m benchmarks.match_bench --products 20000 --queries 200
+"""
+import argparse
+import random
+import time
+from difflib import SequenceMatcher
+
+from actions import product_index
+from actions.lazy import module_available
+from actions.product_index import IndexedProduct, ProductNameIndex
+from benchmarks.synthetic import make_records
+
+
+def make_queries(rows, count, seed):
+    rng = random.Random(seed)
+    queries = []
+    for row in rng.sample(rows, count):
+        name = row.name.lower()
+        cut = rng.randrange(len(name))
+        queries.append(name[:cut] + name[cut + 1:])
+    return queries
+
+
+def scan(rows, query, k):
+    # What the actions did before the index, but keeping every score
+    scored = []
+    for row in rows:
+        score = SequenceMatcher(None, query, row.name.lower()).ratio()
+        if score > product_index.SIMILARITY_THRESHOLD:
+            scored.append((row, score))
+    scored.sort(key=lambda item: -item[1])
+    return scored[:k]
+
+
+def per_query_ms(func, queries):
+    started = time.perf_counter()
+    results = [func(query) for query in queries]
+    return results, (time.perf_counter() - started) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-queries", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = [IndexedProduct(r.id, r.user_id, r.name) for r in make_records(args.products)]
+    index = ProductNameIndex(rows)
+    queries = make_queries(rows, args.queries, args.seed)
+    print(f"products: {len(rows)}  distinct names: {len(index._keys)}  queries: {len(queries)}")
+
+    expected, scan_ms = per_query_ms(lambda q: scan(rows, q, 5), queries[:args.scan_queries])
+    print(f"{'full scan, top 5':<28} {scan_ms:9.2f} ms/query")
+
+    modes = [("numpy", True)] if module_available("numpy") else []
+    modes.append(("pure python", False))
+    for label, use_numpy in modes:
+        product_index.USE_NUMPY = use_numpy
+        for k in (1, 5, None):
+            index._memo.clear()
+            results, ms = per_query_ms(lambda q: index.rank(q, k), queries)
+            print(f"{label + ', ' + ('all' if k is None else f'top {k}'):<28} {ms:9.2f} ms/query")
+            if k == 5:
+                scores = [[score for _, score in ranked] for ranked in results[:args.scan_queries]]
+                assert scores == [[score for _, score in ranked] for ranked in expected], "scores differ from scan"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Offline relevance and latency of ProductSearchIndex on a synthetic catalog.
+
+Each query is built from one target product (brand, size, a name word and a
+description word, in shuffled order); relevance is how high that product
+ranks. Run from the ChatOn directory:
+
+    python -m benchmarks.search_bench --products 50000 --queries 500
+"""
+import argparse
+import random
+import statistics
+import time
+
+from actions.search_index import ProductSearchIndex, parse_weights, tokenize
+from benchmarks.synthetic import make_records
+
+CONFIGS = {
+    # BM25 over descriptions alone. This is not the old MySQL FULLTEXT
+    # MATCH(Description) AGAINST(...) search, which needs a server to measure
+    "bm25 description only": "description=1",
+    "default": "name=3,brand=2,size=1,description=1",
+    "flat": "name=1,brand=1,size=1,description=1",
+}
+
+
+def make_queries(records, count, seed):
+    rng = random.Random(seed)
+    queries = []
+    for target in rng.sample(records, count):
+        words = [
+            target.brand, target.size,
+            rng.choice(tokenize(target.name)), rng.choice(tokenize(target.description)),
+        ]
+        rng.shuffle(words)
+        queries.append((" ".join(words), target.id))
+    return queries
+
+
+def evaluate(records, queries, weights, k):
+    started = time.perf_counter()
+    index = ProductSearchIndex(parse_weights(weights))
+    for record in records:
+        index.add(record)
+    build_time = time.perf_counter() - started
+
+    latencies, reciprocal_ranks, hits = [], [], 0
+    for query, target in queries:
+        started = time.perf_counter()
+        results = index.search(query, k)
+        latencies.append(time.perf_counter() - started)
+        ids = [record.id for record, _ in results]
+        if target in ids:
+            hits += 1
+            reciprocal_ranks.append(1 / (ids.index(target) + 1))
+        else:
+            reciprocal_ranks.append(0.0)
+
+    latencies.sort()
+    return {
+        "build_s": build_time,
+        "mrr": statistics.mean(reciprocal_ranks),
+        "recall": hits / len(queries),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--weights", action="append", help="extra field-weight spec to compare")
+    args = parser.parse_args()
+
+    records = make_records(args.products, seed=args.seed)
+    queries = make_queries(records, args.queries, args.seed)
+    configs = dict(CONFIGS)
+    for spec in args.weights or []:
+        configs[spec] = spec
+
+    print(f"products: {len(records)}  queries: {len(queries)}  k: {args.k}")
+    print(f"{'weights':<22} {'build s':>8} {'MRR':>6} {'recall':>7} {'p50 ms':>7} {'p95 ms':>7}")
+    for label, weights in configs.items():
+        r = evaluate(records, queries, weights, args.k)
+        print(f"{label:<22} {r['build_s']:8.2f} {r['mrr']:6.3f} {r['recall']:7.3f} {r['p50_ms']:7.2f} {r['p95_ms']:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Fill users, product_catalog and feedback with seeded synthetic rows.
+
+Writes to a SQLite file (schema created here, readable by
+CHATON_PRODUCT_BACKEND=sqlite) or to the MySQL database in CHATON_DB_*
+(migrated with `python -m schema.migrate up` first). Rows are streamed in
+batches, so 1M products need little memory. Run from the ChatOn directory:
+
+    python -m benchmarks.seed_data --products 100000 --sqlite bench.sqlite3
+    python -m benchmarks.seed_data --products 1000000 --feedback 200000 --mysql --reset
+
+The target tables must be empty unless --reset is given, which deletes
+every row in them first.
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from itertools import islice
+
+from benchmarks.synthetic import iter_feedback, iter_records, iter_users
+
+BATCH_SIZE = 5000
+
+# Password of every generated shop account
+PASSWORD = "bench"
+
+TABLES = ["feedback_product_rollup", "feedback", "catalog_changes", "product_catalog", "users"]
+
+# Columns as in sql/migrations, types as SQLite sees them
+SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY, username TEXT NOT NULL UNIQUE, password TEXT NOT NULL,
+        role TEXT NOT NULL DEFAULT 'user', shop_name TEXT, shop_address TEXT,
+        contact_email TEXT, phone_number TEXT, shop_description TEXT
+    );
+    CREATE TABLE IF NOT EXISTS product_catalog (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, `Product Name` TEXT,
+        Brand TEXT, Size TEXT, SellPrice NUMERIC, Description TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_product_catalog_user ON product_catalog (user_id);
+    CREATE TABLE IF NOT EXISTS catalog_changes (
+        id INTEGER PRIMARY KEY, product_id INTEGER NOT NULL, op TEXT NOT NULL,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS feedback (
+        id INTEGER PRIMARY KEY, product_id INTEGER, user_id INTEGER, product_name TEXT,
+        feedback_text TEXT, sentiment TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_feedback_user_created ON feedback (user_id, created_at);
+    CREATE TABLE IF NOT EXISTS feedback_product_rollup (
+        product_id INTEGER PRIMARY KEY, positive INTEGER NOT NULL DEFAULT 0,
+        negative INTEGER NOT NULL DEFAULT 0, neutral INTEGER NOT NULL DEFAULT 0,
+        other INTEGER NOT NULL DEFAULT 0, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+USERS_SQL = """
+    INSERT INTO users (id, username, password, role, shop_name, shop_address,
+                       contact_email, phone_number, shop_description)
+    VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p}, {p}, {p})
+"""
+
+PRODUCTS_SQL = """
+    INSERT INTO product_catalog (id, user_id, `Product Name`, Brand, Size, SellPrice, Description)
+    VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p})
+"""
+
+FEEDBACK_SQL = """
+    INSERT INTO feedback (product_id, user_id, product_name, feedback_text, sentiment, created_at)
+    VALUES ({p}, {p}, {p}, {p}, {p}, {p})
+"""
+
+SQLITE_ROLLUP_SQL = """
+    INSERT OR REPLACE INTO feedback_product_rollup (product_id, positive, negative, neutral, other)
+    SELECT product_id,
+           SUM(sentiment = 'positive'),
+           SUM(sentiment = 'negative'),
+           SUM(sentiment = 'neutral'),
+           SUM(sentiment IS NULL OR sentiment NOT IN ('positive', 'negative', 'neutral'))
+    FROM feedback
+    WHERE product_id IS NOT NULL
+    GROUP BY product_id
+"""
+
+
+def batched(rows, size=BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert(connection, sql, rows, label):
+    cursor = connection.cursor()
+    written = 0
+    for batch in batched(rows):
+        cursor.executemany(sql, batch)
+        connection.commit()
+        written += len(batch)
+        print(f"\r  {label}: {written}", end="", flush=True)
+    print()
+    cursor.close()
+
+
+def connect(args):
+    if args.mysql:
+        import mysql.connector
+        from actions.db import DB_CONFIG
+        from schema.link_feedback import REBUILD_ROLLUP_SQL
+        return mysql.connector.connect(**dict(DB_CONFIG, autocommit=False)), "%s", REBUILD_ROLLUP_SQL
+    connection = sqlite3.connect(args.sqlite)
+    connection.executescript(SQLITE_SCHEMA)
+    return connection, "?", SQLITE_ROLLUP_SQL
+
+
+def seed(connection, placeholder, rollup_sql, args):
+    cursor = connection.cursor()
+    if args.reset:
+        for table in TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        connection.commit()
+    else:
+        cursor.execute("SELECT COUNT(*) FROM product_catalog")
+        if cursor.fetchone()[0]:
+            raise SystemExit("product_catalog is not empty; pass --reset to replace its rows")
+    cursor.close()
+
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash(PASSWORD)
+    insert(connection, USERS_SQL.format(p=placeholder), (
+        (user_id,) + row for user_id, row in enumerate(iter_users(args.shops, password_hash), 1)
+    ), "users")
+
+    # Feedback needs each product's id, owner and name, not the whole record
+    products = []
+
+    def product_rows():
+        for record in iter_records(args.products, args.seed, args.shops):
+            products.append((record.id, record.user_id, record.name))
+            yield (record.id, record.user_id, record.name, record.brand, record.size,
+                   record.price, record.description)
+
+    insert(connection, PRODUCTS_SQL.format(p=placeholder), product_rows(), "products")
+    if args.feedback and products:
+        insert(connection, FEEDBACK_SQL.format(p=placeholder),
+               iter_feedback(args.feedback, products, args.seed), "feedback")
+        cursor = connection.cursor()
+        cursor.execute(rollup_sql)
+        connection.commit()
+        cursor.close()
+        print("  rebuilt feedback_product_rollup")
+
+
+def product_names(path, count, seed):
+    """`count` names from a seeded SQLite catalog as a user might type them, half with a typo."""
+    with sqlite3.connect(path) as connection:
+        names = [row[0] for row in connection.execute("SELECT `Product Name` FROM product_catalog")]
+    rng = random.Random(seed)
+    picked = []
+    for name in rng.choices(names, k=count):
+        name = name.lower()
+        if rng.random() < 0.5:
+            # Typo: one character dropped
+            cut = rng.randrange(len(name))
+            name = name[:cut] + name[cut + 1:]
+        picked.append(name)
+    return picked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--sqlite", metavar="PATH", help="SQLite file to create or fill")
+    target.add_argument("--mysql", action="store_true", help="use the database in CHATON_DB_*")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--shops", type=int, default=500)
+    parser.add_argument("--feedback", type=int, default=None, help="feedback rows (default: one per product)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help="delete existing rows in the target tables first")
+    args = parser.parse_args(argv)
+    if args.feedback is None:
+        args.feedback = args.products
+
+    started = time.perf_counter()
+    connection, placeholder, rollup_sql = connect(args)
+    try:
+        seed(connection, placeholder, rollup_sql, args)
+    finally:
+        connection.close()
+    print(f"Seeded {args.shops} shops, {args.products} products and {args.feedback} feedback rows "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
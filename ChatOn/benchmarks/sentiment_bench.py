@@ -0,0 +1,95 @@
+"""Throughput of the preloaded SentimentScorer against per-call TextBlob.
+
+Two text sets: short templated reviews that repeat a lot, which is where
+score_batch's dedup pays off, and longer reviews that are almost all
+distinct, which is closer to what real feedback looks like.
+
+Run from the ChatOn directory:
+
+    python -m benchmarks.sentiment_bench --texts 5000
+"""
+import argparse
+import random
+import time
+
+from textblob import TextBlob
+
+from actions.sentiment import SentimentScorer, sentiment_label
+
+OPENERS = ["I think", "Honestly", "Overall", "To be fair", "Sadly", "", "Wow,"]
+SUBJECTS = ["this drill", "the bolts", "the pipe fitting", "delivery", "the paint", "it"]
+OPINIONS = [
+    "is great", "is terrible", "works fine", "is not good", "broke after a week",
+    "is really excellent", "was okay I guess", "is very bad", "is the best I've bought",
+    "did not fit at all", "arrived on time", "feels cheap",
+]
+DETAILS = [
+    "after {n} days", "for {n} dollars", "on my {n}th order", "with {n} spare parts",
+    "compared to the last {n} I bought", "and I waited {n} hours for support",
+]
+
+
+def make_texts(count, seed):
+    rng = random.Random(seed)
+    return [
+        " ".join(filter(None, [rng.choice(OPENERS), rng.choice(SUBJECTS), rng.choice(OPINIONS)])) + "."
+        for _ in range(count)
+    ]
+
+
+def make_unique_texts(count, seed):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        clauses = [
+            " ".join(filter(None, [rng.choice(OPENERS), rng.choice(SUBJECTS), rng.choice(OPINIONS),
+                                   rng.choice(DETAILS).format(n=rng.randint(2, 400))]))
+            for _ in range(rng.randint(2, 4))
+        ]
+        texts.append(". ".join(clauses) + rng.choice([".", "!", "..."]))
+    return texts
+
+
+def textblob_labels(texts):
+    return [sentiment_label(TextBlob(text).sentiment.polarity) for text in texts]
+
+
+def timed(func, texts):
+    started = time.perf_counter()
+    result = func(texts)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # Both paths share the lexicon; without the preload TextBlob's first call pays this
+    scorer = SentimentScorer()
+    started = time.perf_counter()
+    scorer.load()
+    print(f"lexicon load (once)  {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    for name, texts in [
+        ("templated", make_texts(args.texts, args.seed)),
+        ("mostly unique", make_unique_texts(args.texts, args.seed)),
+    ]:
+        expected, blob_time = timed(textblob_labels, texts)
+        single, single_time = timed(lambda batch: [scorer.score(text) for text in batch], texts)
+        batched, batch_time = timed(scorer.score_batch, texts)
+
+        assert expected == single == batched, "labels differ from TextBlob"
+
+        print(f"\n{name}: {len(texts)} texts ({len(set(texts))} distinct)")
+        for label, seconds in [
+            ("TextBlob per call", blob_time),
+            ("scorer.score", single_time),
+            ("scorer.score_batch", batch_time),
+        ]:
+            print(f"{label:<20} {len(texts) / seconds:10.0f} texts/s  ({seconds * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
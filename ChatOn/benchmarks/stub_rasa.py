@@ -0,0 +1,87 @@
+"""Stand-in for the Rasa REST channel, for load tests without a trained model.
+
+Answers POST /webhooks/rest/webhook like Rasa does: a JSON list of bot
+messages, or one JSON message per line with ?stream=true. Each reply waits
+--delay-ms (plus up to --jitter-ms) to mimic NLU and action time.
+
+    python -m benchmarks.stub_rasa --port 5005 --delay-ms 20
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WEBHOOK_PATH = "/webhooks/rest/webhook"
+
+
+class StubRasaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        path, _, query = self.path.partition("?")
+        if path != WEBHOOK_PATH:
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            message = json.loads(body or b"{}").get("message", "")
+        except ValueError:
+            self.send_error(400)
+            return
+
+        server = self.server
+        time.sleep((server.delay + random.uniform(0, server.jitter)) / 1000)
+        replies = [
+            {"recipient_id": "stub", "text": f"You said: {message}"},
+            {"recipient_id": "stub", "text": "Would you like to know anything else?"},
+        ]
+        if "stream=true" in query:
+            payload = "".join(json.dumps(reply) + "\n" for reply in replies).encode()
+            content_type = "application/x-ndjson"
+        else:
+            payload = json.dumps(replies).encode()
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(port=0, delay=0.0, jitter=0.0, host="127.0.0.1"):
+    """Serve on a daemon thread; returns the server (its URL is webhook_url(server))."""
+    server = ThreadingHTTPServer((host, port), StubRasaHandler)
+    server.daemon_threads = True
+    server.delay, server.jitter = delay, jitter
+    threading.Thread(target=server.serve_forever, name="stub-rasa", daemon=True).start()
+    return server
+
+
+def webhook_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}{WEBHOOK_PATH}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--delay-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    args = parser.parse_args(argv)
+
+    server = start(args.port, args.delay_ms, args.jitter_ms, args.host)
+    print(f"Stub Rasa listening on {webhook_url(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Seeded synthetic catalog rows shaped like product_catalog joined with users.
+
+Rows are generated lazily, so a million-row catalog can be streamed into a
+database without holding it in memory; the same seed always gives the same
+rows.
+"""
+import random
+from datetime import datetime, timedelta
+
+from actions.products import ProductRecord
+
+MATERIALS = ["steel", "brass", "copper", "zinc", "nylon", "pvc", "aluminium", "stainless", "carbon", "rubber"]
+KINDS = [
+    "bolt", "nut", "washer", "screw", "rivet", "anchor", "hinge", "valve", "pipe", "elbow",
+    "coupling", "clamp", "bracket", "spring", "bearing", "gasket", "hose", "cable", "drill bit", "socket",
+]
+STYLES = ["hex", "flat", "round", "wing", "lock", "heavy duty", "mini", "threaded", "flanged", "quick release"]
+BRANDS = ["Acme", "Bosch", "Stanley", "Makita", "Dewalt", "Fischer", "Wurth", "Hilti", "Irwin", "Bahco"]
+SIZES = ["M4", "M5", "M6", "M8", "M10", "M12", "1/4in", "1/2in", "3/4in", "1in", "10mm", "25mm"]
+USES = [
+    "for outdoor use", "for marine fittings", "for furniture assembly", "for plumbing repairs",
+    "for electrical panels", "for concrete walls", "for heavy machinery", "for garden irrigation",
+]
+FINISHES = ["corrosion resistant", "galvanised", "powder coated", "polished", "anodised", "self locking"]
+
+
+PRAISE = ["great", "excellent", "works perfectly", "good value", "very sturdy", "fast delivery"]
+COMPLAINTS = ["broke after a week", "poor quality", "arrived damaged", "too expensive", "rusted quickly", "wrong size"]
+REMARKS = ["as described", "ordered two", "bought for a repair", "average", "does the job", "no complaints or praise"]
+SENTIMENTS = {"positive": PRAISE, "negative": COMPLAINTS, "neutral": REMARKS}
+
+# Fixed so that repeated runs with one seed produce identical feedback dates
+FEEDBACK_EPOCH = datetime(2025, 1, 1)
+
+
+def iter_records(count, seed=1, shops=500):
+    rng = random.Random(seed)
+    for product_id in range(1, count + 1):
+        material, kind, style = rng.choice(MATERIALS), rng.choice(KINDS), rng.choice(STYLES)
+        name = f"{style} {material} {kind}".title()
+        if rng.random() < 0.3:
+            name += f" {rng.randint(2, 999)}"
+        user_id = rng.randint(1, shops)
+        yield ProductRecord(
+            id=product_id,
+            user_id=user_id,
+            name=name,
+            brand=rng.choice(BRANDS),
+            size=rng.choice(SIZES),
+            price=round(rng.uniform(0.1, 250), 2),
+            description=f"{rng.choice(FINISHES)} {material} {kind} {rng.choice(USES)}",
+            shop_address=f"{user_id} Industrial Estate",
+            contact_email=f"shop{user_id}@example.com",
+            phone_number=f"555-{user_id:04d}",
+        )
+
+
+def make_records(count, seed=1, shops=500):
+    return list(iter_records(count, seed, shops))
+
+
+def iter_users(shops, password_hash):
+    """users rows (without id) matching the owner details on iter_records."""
+    for user_id in range(1, shops + 1):
+        yield (
+            f"shop{user_id}", password_hash, "user", f"Shop {user_id}",
+            f"{user_id} Industrial Estate", f"shop{user_id}@example.com",
+            f"555-{user_id:04d}", f"Fasteners and fittings, branch {user_id}",
+        )
+
+
+def iter_feedback(count, products, seed=1, linked=0.9, scored=0.8):
+    """feedback rows (product_id, user_id, product_name, feedback_text, sentiment, created_at).
+
+    `products` is a list of (product_id, user_id, name). A `linked` share of
+    rows carries product_id/user_id like rows stored by the feedback queue;
+    the rest only has the name, like rows from before products were linked.
+    A `scored` share has a sentiment, the rest is left for the scorer.
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        product_id, user_id, name = rng.choice(products)
+        sentiment = rng.choice(list(SENTIMENTS))
+        text = f"{rng.choice(SENTIMENTS[sentiment])}, {rng.choice(SENTIMENTS[sentiment])}"
+        if rng.random() >= linked:
+            product_id = user_id = None
+        created_at = FEEDBACK_EPOCH + timedelta(seconds=rng.randrange(365 * 86400))
+        yield (
+            product_id, user_id, name.lower(), text,
+            sentiment if rng.random() < scored else None, created_at,
+        )
@@ -0,0 +1,65 @@
+"""Latency summaries and regression checks shared by the benchmarks."""
+import json
+
+
+def summarize(latencies, elapsed):
+    """Throughput and percentiles (ms) of per-call latencies in seconds."""
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"calls": 0, "per_s": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000
+
+    return {
+        "calls": len(latencies),
+        "per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+HEADER = f"{'':<34} {'calls':>7} {'per s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+
+
+def format_row(label, summary):
+    s = summary
+    return (f"{label:<34} {s['calls']:7d} {s['per_s']:9.1f} {s['p50_ms']:8.2f} "
+            f"{s['p95_ms']:8.2f} {s['p99_ms']:8.2f} {s['max_ms']:8.2f}")
+
+
+def save(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def regressions(results, baseline_path, tolerance):
+    """Labels whose p95 grew by more than `tolerance` (0.2 = 20%) over the baseline file."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    slower = []
+    for label, summary in results.items():
+        before = baseline.get(label)
+        if before and before["p95_ms"] and summary["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            slower.append(f"{label}: p95 {before['p95_ms']:.2f} ms -> {summary['p95_ms']:.2f} ms")
+    return slower
+
+
+def add_report_arguments(parser):
+    parser.add_argument("--save", metavar="JSON", help="write the results here, e.g. as a new baseline")
+    parser.add_argument("--baseline", metavar="JSON", help="fail when p95 regressed against this file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth over the baseline")
+
+
+def report(results, args):
+    """Save and compare results as asked on the command line; returns the exit status."""
+    if args.save:
+        save(args.save, results)
+    if not args.baseline:
+        return 0
+    slower = regressions(results, args.baseline, args.tolerance)
+    for message in slower:
+        print("REGRESSION", message)
+    return 1 if slower else 0
@@ -0,0 +1,116 @@
+"""Break slow chat turns down hop by hop from CHATON_TRACE_FILE span files.
+
+Reads the OTLP/JSON lines written by the Flask app and the action server,
+joins spans of the same trace across processes and prints the slowest
+traces as trees (offset and duration of every span), then the time spent
+per span name over all traces. Run from the ChatOn directory:
+
+    python -m benchmarks.trace_report traces/*.jsonl --slowest 5
+    python -m benchmarks.trace_report traces/*.jsonl --trace 4bf92f3577b34da6a3ce929d0e0e4736
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+from benchmarks.timing import summarize
+
+
+def attribute_value(value):
+    for key in ("stringValue", "intValue", "doubleValue", "boolValue"):
+        if key in value:
+            return value[key]
+    return None
+
+
+def load_spans(paths):
+    spans = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for resource_spans in json.loads(line).get("resourceSpans", []):
+                    resource = {
+                        a["key"]: attribute_value(a["value"])
+                        for a in resource_spans.get("resource", {}).get("attributes", [])
+                    }
+                    for scope_spans in resource_spans.get("scopeSpans", []):
+                        for span in scope_spans.get("spans", []):
+                            span["service"] = resource.get("service.name", "?")
+                            span["start"] = int(span["startTimeUnixNano"])
+                            span["end"] = int(span["endTimeUnixNano"])
+                            span["attrs"] = {a["key"]: attribute_value(a["value"]) for a in span.get("attributes", [])}
+                            spans.append(span)
+    return spans
+
+
+def print_trace(trace_id, spans):
+    by_id = {span["spanId"]: span for span in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in sorted(spans, key=lambda s: s["start"]):
+        parent = span.get("parentSpanId")
+        if parent in by_id:
+            children[parent].append(span)
+        else:
+            roots.append(span)
+    started = min(span["start"] for span in spans)
+    total = (max(span["end"] for span in spans) - started) / 1e6
+    print(f"\ntrace {trace_id}  {total:.1f} ms  {len(spans)} spans")
+
+    def show(span, depth):
+        offset = (span["start"] - started) / 1e6
+        duration = (span["end"] - span["start"]) / 1e6
+        notes = [f"{key}={value}" for key, value in span["attrs"].items()
+                 if key.startswith(("match.", "cache.", "product.matches", "http.status_code"))]
+        if "status" in span:
+            notes.append(f"ERROR {span['status'].get('message', '')}")
+        label = f"{'  ' * depth}{span['name']} [{span['service']}]"
+        print(f"  {offset:8.1f} {duration:8.1f} ms  {label:<56} {' '.join(notes)}")
+        for child in children[span["spanId"]]:
+            show(child, depth + 1)
+
+    print(f"  {'at ms':>8} {'took':>8}")
+    for root in roots:
+        show(root, 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--slowest", type=int, default=5, help="number of trace trees to print")
+    parser.add_argument("--trace", help="print only this trace id")
+    args = parser.parse_args(argv)
+
+    traces = defaultdict(list)
+    for span in load_spans(args.paths):
+        traces[span["traceId"]].append(span)
+    if args.trace:
+        if args.trace not in traces:
+            print(f"No spans for trace {args.trace}")
+            return 1
+        print_trace(args.trace, traces[args.trace])
+        return 0
+
+    def duration(spans):
+        return max(s["end"] for s in spans) - min(s["start"] for s in spans)
+
+    print(f"{len(traces)} traces")
+    for trace_id, spans in sorted(traces.items(), key=lambda item: -duration(item[1]))[:args.slowest]:
+        print_trace(trace_id, spans)
+
+    by_name = defaultdict(list)
+    for spans in traces.values():
+        for span in spans:
+            by_name[f"{span['name']} [{span['service']}]"].append((span["end"] - span["start"]) / 1e9)
+    print(f"\n{'span':<48} {'calls':>7} {'total ms':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, latencies in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+        s = summarize(latencies, 0)
+        print(f"{label:<48} {s['calls']:7d} {sum(latencies) * 1000:10.1f} "
+              f"{s['p50_ms']:8.2f} {s['p95_ms']:8.2f} {s['p99_ms']:8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""Throughput and memory of the action server with one or more Sanic workers.
+
+For each --workers count it starts `python -m rasa_sdk --actions actions`
+with ACTION_SERVER_SANIC_WORKERS set, against a SQLite catalog (a temporary
+one of --products rows unless --sqlite is given), waits until its /ready
+reports every worker warm, then posts --requests action_getting_price calls
+for misspelt catalog names from --concurrency client threads. Lookup caches
+are off, so every call runs the fuzzy match. It reports throughput and
+latency percentiles, and the proportional set size (PSS) of the manager and
+workers together plus the private memory per worker: with the shared index
+the latter stays flat as workers are added; --private repeats each run with
+every worker building its own index. Run from the ChatOn directory:
+
+    python -m benchmarks.worker_bench --workers 1,2,4 --products 100000
+    python -m benchmarks.worker_bench --workers 4 --private --save workers.json
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+import rasa_sdk
+
+from benchmarks import seed_data
+from benchmarks.seed_data import product_names
+from benchmarks.timing import HEADER, add_report_arguments, format_row, report, summarize
+
+CHATON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def action_call(name, i):
+    message = {"text": f"price of {name}", "intent": {"name": "ask_price"},
+               "entities": [{"entity": "product_name", "value": name}]}
+    return {
+        "next_action": "action_getting_price",
+        "sender_id": f"bench-{i}",
+        "version": rasa_sdk.__version__,
+        "domain": {},
+        "tracker": {
+            "sender_id": f"bench-{i}", "slots": {"product_name": None}, "latest_message": message,
+            "events": [], "paused": False, "followup_action": None, "active_loop": {},
+            "latest_action_name": None,
+        },
+    }
+
+
+def start_server(workers, shared, args, workdir):
+    env = dict(
+        os.environ,
+        ACTION_SERVER_SANIC_WORKERS=str(workers),
+        CHATON_SHARED_INDEX="1" if shared else "0",
+        CHATON_PRODUCT_BACKEND="sqlite",
+        CHATON_SQLITE_PATH=args.catalog,
+        CHATON_ACTIONS_METRICS_PORT=str(args.metrics_port),
+        CHATON_SHARED_INDEX_DIR=workdir,
+        CHATON_FEEDBACK_SPOOL=os.path.join(workdir, "feedback.spool"),
+        CHATON_DB_POOL_WARM="0",
+        CHATON_PRODUCT_CACHE_SIZE="0",
+        CHATON_INDEX_MEMO_SIZE="0",
+    )
+    log = open(os.path.join(workdir, f"server-{workers}-{'shared' if shared else 'private'}.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "rasa_sdk", "--actions", "actions", "--port", str(args.port)],
+        cwd=CHATON_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+    )
+    return process, log
+
+
+def wait_ready(process, args, timeout=600):
+    # /ready on the action port answers 200 once every worker is warm
+    deadline = time.monotonic() + timeout
+    while True:
+        if process.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("action server did not become ready")
+        try:
+            if requests.get(f"http://127.0.0.1:{args.port}/ready", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+
+
+def stop_server(process, log):
+    try:
+        os.killpg(process.pid, signal.SIGINT)
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
+    log.close()
+
+
+def process_tree(pid):
+    pids = [pid]
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def memory_kb(pid):
+    """(PSS, private) in kB from /proc/<pid>/smaps_rollup (Linux)."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if rest.strip().endswith("kB"):
+                    values[key] = int(rest.split()[0])
+    except OSError:
+        return 0, 0
+    return values.get("Pss", 0), values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+
+
+def load(url, names, concurrency):
+    latencies, errors, lock = [], [], threading.Lock()
+    jobs = iter(enumerate(names))
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                job = next(jobs, None)
+            if job is None:
+                return
+            started = time.perf_counter()
+            try:
+                ok = session.post(url, data=json.dumps(action_call(job[1], job[0])), timeout=60).status_code == 200
+            except requests.RequestException:
+                ok = False
+            with lock:
+                (latencies if ok else errors).append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--private", action="store_true", help="also run without the shared index")
+    parser.add_argument("--sqlite", metavar="PATH", help="catalog seeded by benchmarks.seed_data")
+    parser.add_argument("--products", type=int, default=50000, help="size of the temporary catalog")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=5155)
+    parser.add_argument("--metrics-port", type=int, default=5160, help="worker n serves /metrics on this + n")
+    parser.add_argument("--seed", type=int, default=3)
+    add_report_arguments(parser)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="chaton-workers-")
+    args.catalog = args.sqlite or os.path.join(workdir, "catalog.sqlite3")
+    if not args.sqlite:
+        seed_data.main(["--sqlite", args.catalog, "--products", str(args.products), "--feedback", "0"])
+    names = product_names(args.catalog, args.requests, args.seed)
+    url = f"http://127.0.0.1:{args.port}/webhook"
+
+    print(f"cpus: {os.cpu_count()}  requests: {args.requests}  concurrency: {args.concurrency}  logs: {workdir}")
+    print(f"{HEADER} {'errors':>7} {'PSS MB':>8} {'priv/worker MB':>15}")
+    results, failed = {}, False
+    modes = [True, False] if args.private else [True]
+    for workers in [int(n) for n in args.workers.split(",")]:
+        for shared in modes:
+            label = f"{workers} workers, {'shared' if shared else 'private'} index"
+            process, log = start_server(workers, shared, args, workdir)
+            try:
+                wait_ready(process, args)
+                load(url, names[:max(1, args.concurrency)], args.concurrency)
+                latencies, errors, elapsed = load(url, names, args.concurrency)
+                pids = process_tree(process.pid)
+                memory = [memory_kb(pid) for pid in pids]
+            finally:
+                stop_server(process, log)
+            summary = summarize(latencies, elapsed)
+            results[label] = summary
+            failed = failed or bool(errors)
+            pss = sum(p for p, _ in memory) / 1024
+            private = sum(m for _, m in memory[1:]) / 1024 / max(1, len(memory) - 1)
+            print(f"{format_row(label, summary)} {len(errors):7d} {pss:8.1f} {private:15.1f}")
+    status = report(results, args)
+    return status or (1 if failed else 0)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+from typing import Any, Dict, Optional, Text
+
+from rasa.core.channels.rest import RestInput
+from sanic.request import Request
+
+
+class MetadataRestInput(RestInput):
+    """The stock REST channel (same name and /webhooks/rest/webhook URL) that
+    keeps the message `metadata`.
+
+    The Flask proxy sends the trace context there; RestInput in some Rasa 3
+    releases inherits InputChannel.get_metadata, which returns None, and the
+    actions would then never see it. Registered in credentials.yml.
+    """
+
+    def get_metadata(self, request: Request) -> Optional[Dict[Text, Any]]:
+        metadata = (request.json or {}).get("metadata")
+        return metadata if isinstance(metadata, dict) else None
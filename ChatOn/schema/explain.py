@@ -0,0 +1,180 @@
+"""EXPLAIN every query the app and the action server issue and flag full scans.
+
+Run from the ChatOn directory against a migrated database:
+
+    python -m schema.explain [--min-rows 1000]
+
+A plan step is flagged when it reads a whole table (type ALL) or a whole
+index (type index) and MySQL expects at least --min-rows rows there, so
+tiny development tables do not raise false alarms. Queries that are full
+scans by design (building the in-process name index) are listed as
+allowed. Exits with status 1 when anything is flagged.
+"""
+import argparse
+import os
+import sys
+from collections import namedtuple
+
+import mysql.connector
+
+from actions.db import DB_CONFIG
+from actions.feedback_queue import DAILY_ROLLUP_SQL, INSERT_SQL, PRODUCT_ROLLUP_SQL
+from actions.products import ALL_RECORDS_SQL, CHANGES_SQL, LATEST_CHANGE_SQL, NAMES_SQL, RECORDS_SQL
+
+# The Flask app is a script directory, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+from pagination import PRODUCT_LISTING, USER_LISTING, encode_cursor  # noqa: E402
+
+# `scan_ok` names tables a query is expected to read in full
+Query = namedtuple("Query", ["name", "sql", "params", "scan_ok"])
+
+SCAN_TYPES = ("ALL", "index")
+
+
+class RecordingCursor:
+    """Captures the statement a Listing would run instead of running it."""
+
+    def execute(self, sql, params=()):
+        self.sql, self.params = sql, tuple(params)
+
+    def fetchall(self):
+        return []
+
+
+def listing_query(name, listing, **page_kwargs):
+    cursor = RecordingCursor()
+    listing.page(cursor, **page_kwargs)
+    return Query(name, cursor.sql, cursor.params, ())
+
+
+def app_queries(user_id=1):
+    # Mirrors the statements in app/app.py
+    product_cursor = encode_cursor("m", 1)
+    price_cursor = encode_cursor("10.00", 1)
+    own = {"where": ["user_id = %s"], "params": [user_id]}
+    queries = [
+        Query("login", "SELECT * FROM users WHERE username = %s", ("admin",), ()),
+        Query("dashboard profile", """
+            SELECT shop_name, shop_address, contact_email, phone_number, shop_description
+            FROM users WHERE id = %s
+        """, (user_id,), ()),
+        Query("dashboard feedback", """
+            SELECT
+                COALESCE(pc.`Product Name`, f.product_name) AS product_name,
+                f.feedback_text,
+                f.created_at
+            FROM feedback f
+            LEFT JOIN product_catalog pc ON pc.id = f.product_id
+            WHERE f.user_id = %s
+            ORDER BY f.created_at DESC
+            LIMIT 20
+        """, (user_id,), ()),
+        Query("update product", """
+            UPDATE product_catalog
+            SET `Product Name`=%s, Brand=%s, Size=%s, SellPrice=%s, Description=%s
+            WHERE id=%s AND user_id=%s
+        """, ("x", "x", "x", 1, "x", 1, user_id), ()),
+        Query("edit product form", """
+            SELECT * FROM product_catalog WHERE id = %s AND user_id = %s
+        """, (1, user_id), ()),
+        Query("delete product", """
+            DELETE FROM product_catalog WHERE id = %s AND user_id = %s
+        """, (1, user_id), ()),
+        Query("bulk import changes", """
+            INSERT INTO catalog_changes (product_id, op)
+            SELECT id, 'insert' FROM product_catalog WHERE user_id = %s AND id >= %s
+        """, (user_id, 1), ()),
+        Query("export", """
+            SELECT id, `Product Name`, Brand, Size, SellPrice, Description
+            FROM product_catalog WHERE user_id = %s ORDER BY id
+        """, (user_id,), ()),
+    ]
+    for sort in PRODUCT_LISTING.sorts:
+        for order in ("asc", "desc"):
+            boundary = price_cursor if sort == "price" else product_cursor
+            queries.append(listing_query(f"dashboard page sort={sort} {order}", PRODUCT_LISTING,
+                                         sort=sort, order=order, after=boundary, **own))
+            queries.append(listing_query(f"admin products sort={sort} {order}", PRODUCT_LISTING,
+                                         sort=sort, order=order, after=boundary))
+    queries.append(listing_query("dashboard search", PRODUCT_LISTING, q="steel bolt", **own))
+    queries.append(listing_query("admin products search", PRODUCT_LISTING, q="steel bolt"))
+    for sort in USER_LISTING.sorts:
+        queries.append(listing_query(f"admin users sort={sort}", USER_LISTING,
+                                     sort=sort, after=encode_cursor("m", 1)))
+    return queries
+
+
+def action_queries():
+    return [
+        Query("resolver names", NAMES_SQL, (), ("product_catalog",)),
+        Query("search index records", ALL_RECORDS_SQL + " ORDER BY pc.id", (), ("product_catalog",)),
+        Query("resolver records", RECORDS_SQL.format(placeholders="%s, %s"), (1, 2), ()),
+        Query("catalog feed head", LATEST_CHANGE_SQL, (), ()),
+        Query("catalog feed changes", CHANGES_SQL.format(placeholder="%s", limit=500), (0,), ()),
+        Query("feedback summary", """
+            SELECT positive, negative, neutral
+            FROM feedback_product_rollup
+            WHERE product_id = %s
+        """, (1,), ()),
+        Query("feedback insert", INSERT_SQL, ("bolt", 1, 1, "great", "positive"), ()),
+        Query("feedback product rollup", PRODUCT_ROLLUP_SQL, (1, 1, 0, 0, 0), ()),
+        Query("feedback daily rollup", DAILY_ROLLUP_SQL, (1, 1, 0, 0, 0), ()),
+    ]
+
+
+def all_queries():
+    return app_queries() + action_queries()
+
+
+def explain(cursor, query):
+    cursor.execute("EXPLAIN " + query.sql, query.params)
+    return cursor.fetchall()
+
+
+def problems(plan, query, min_rows):
+    flagged = []
+    for step in plan:
+        if step["type"] in SCAN_TYPES and (step["rows"] or 0) >= min_rows \
+                and step["table"] not in query.scan_ok:
+            kind = "full table scan" if step["type"] == "ALL" else "full index scan"
+            flagged.append(f"{kind} on {step['table']} (~{step['rows']} rows)")
+    return flagged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-rows", type=int, default=1000,
+                        help="ignore scans of tables MySQL expects to be smaller than this")
+    parser.add_argument("--verbose", action="store_true", help="print every plan step")
+    args = parser.parse_args(argv)
+
+    connection = mysql.connector.connect(**DB_CONFIG)
+    cursor = connection.cursor(dictionary=True)
+    flagged_queries = 0
+    try:
+        for query in all_queries():
+            try:
+                plan = explain(cursor, query)
+            except mysql.connector.Error as e:
+                print(f"ERROR {query.name}: {e}")
+                flagged_queries += 1
+                continue
+            flagged = problems(plan, query, args.min_rows)
+            print(f"{'SCAN ' if flagged else 'ok   '} {query.name}")
+            for message in flagged:
+                print(f"        {message}")
+            if args.verbose or flagged:
+                for step in plan:
+                    print(f"        {step['table']}: type={step['type']} key={step['key']} "
+                          f"rows={step['rows']} {step.get('Extra') or ''}")
+            flagged_queries += bool(flagged)
+    finally:
+        cursor.close()
+        connection.close()
+
+    print(f"\n{flagged_queries} flagged queries")
+    return 1 if flagged_queries else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
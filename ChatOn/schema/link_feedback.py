@@ -0,0 +1,210 @@
+"""Link stored feedback to catalog products and count it in the per-product rollups.
+
+Feedback written before migration 0005 only carries the product name the
+user typed. This job resolves each name with the same matcher the feedback
+queue uses, fills in product_id and user_id, and adds the rows it links to
+feedback_product_rollup and feedback_product_daily in the same
+transaction, so it can run while the action server writes feedback. It
+then copies user_id onto rows that already had a product_id. It works in
+id order and in batches, and is safe to re-run; names that still do not
+resolve stay unlinked. Run from the ChatOn directory after
+`python -m schema.migrate up`:
+
+    python -m schema.link_feedback [--batch-size 1000] [--rebuild]
+
+--rebuild recounts both rollups from the feedback table instead, holding
+table locks so the feedback queue waits (its rows stay spooled) meanwhile.
+"""
+import argparse
+import sys
+
+from mysql.connector import Error
+
+from actions.db import db_cursor, db_transaction
+from actions.products import ProductLookupError, get_resolver
+
+UNLINKED_SQL = """
+    SELECT id, product_name
+    FROM feedback
+    WHERE product_id IS NULL AND id > %s
+    ORDER BY id
+    LIMIT %s
+"""
+
+# Rows another run linked since they were read are skipped
+CLAIM_SQL = "SELECT id FROM feedback WHERE id IN ({ids}) AND product_id IS NULL FOR UPDATE"
+
+LINK_SQL = "UPDATE feedback SET product_id = %s, user_id = %s WHERE id = %s"
+
+# Rows counted when they are linked, on top of what the feedback queue added
+ADD_ROLLUP_SQL = """
+    INSERT INTO feedback_product_rollup (product_id, positive, negative, neutral, other)
+    SELECT product_id,
+           SUM(sentiment <=> 'positive'),
+           SUM(sentiment <=> 'negative'),
+           SUM(sentiment <=> 'neutral'),
+           SUM(sentiment IS NULL OR sentiment NOT IN ('positive', 'negative', 'neutral'))
+    FROM feedback
+    WHERE id IN ({ids})
+    GROUP BY product_id
+    ON DUPLICATE KEY UPDATE
+        positive = positive + VALUES(positive),
+        negative = negative + VALUES(negative),
+        neutral = neutral + VALUES(neutral),
+        other = other + VALUES(other)
+"""
+
+ADD_DAILY_SQL = """
+    INSERT INTO feedback_product_daily (product_id, day, positive, negative, neutral, other)
+    SELECT product_id,
+           DATE(created_at),
+           SUM(sentiment <=> 'positive'),
+           SUM(sentiment <=> 'negative'),
+           SUM(sentiment <=> 'neutral'),
+           SUM(sentiment IS NULL OR sentiment NOT IN ('positive', 'negative', 'neutral'))
+    FROM feedback
+    WHERE id IN ({ids})
+    GROUP BY product_id, DATE(created_at)
+    ON DUPLICATE KEY UPDATE
+        positive = positive + VALUES(positive),
+        negative = negative + VALUES(negative),
+        neutral = neutral + VALUES(neutral),
+        other = other + VALUES(other)
+"""
+
+OWNER_SQL = """
+    UPDATE feedback f
+    JOIN product_catalog pc ON pc.id = f.product_id
+    SET f.user_id = pc.user_id
+    WHERE f.user_id IS NULL AND f.id > %s AND f.id <= %s
+"""
+
+MAX_ID_SQL = "SELECT COALESCE(MAX(id), 0) FROM feedback"
+
+# Counts from the feedback rows themselves replace whatever was accumulated;
+# only safe while nothing else writes the rollups (see rebuild_rollups)
+REBUILD_ROLLUP_SQL = """
+    INSERT INTO feedback_product_rollup (product_id, positive, negative, neutral, other)
+    SELECT product_id,
+           SUM(sentiment <=> 'positive'),
+           SUM(sentiment <=> 'negative'),
+           SUM(sentiment <=> 'neutral'),
+           SUM(sentiment IS NULL OR sentiment NOT IN ('positive', 'negative', 'neutral'))
+    FROM feedback
+    WHERE product_id IS NOT NULL
+    GROUP BY product_id
+    ON DUPLICATE KEY UPDATE
+        positive = VALUES(positive),
+        negative = VALUES(negative),
+        neutral = VALUES(neutral),
+        other = VALUES(other)
+"""
+
+REBUILD_DAILY_SQL = """
+    INSERT INTO feedback_product_daily (product_id, day, positive, negative, neutral, other)
+    SELECT product_id,
+           DATE(created_at),
+           SUM(sentiment <=> 'positive'),
+           SUM(sentiment <=> 'negative'),
+           SUM(sentiment <=> 'neutral'),
+           SUM(sentiment IS NULL OR sentiment NOT IN ('positive', 'negative', 'neutral'))
+    FROM feedback
+    WHERE product_id IS NOT NULL
+    GROUP BY product_id, DATE(created_at)
+    ON DUPLICATE KEY UPDATE
+        positive = VALUES(positive),
+        negative = VALUES(negative),
+        neutral = VALUES(neutral),
+        other = VALUES(other)
+"""
+
+
+def link_unlinked(batch_size):
+    resolver = get_resolver()
+    links = {}
+    last_id, linked, seen = 0, 0, 0
+    while True:
+        with db_cursor() as cursor:
+            cursor.execute(UNLINKED_SQL, (last_id, batch_size))
+            rows = cursor.fetchall()
+        if not rows:
+            return seen, linked
+        updates = []
+        for feedback_id, product_name in rows:
+            name = (product_name or "").strip().lower()
+            if name and name not in links:
+                record = resolver.resolve_first(name)
+                links[name] = (record.id, record.user_id) if record else None
+            if links.get(name):
+                updates.append(links[name] + (feedback_id,))
+        if updates:
+            updates = link_batch(updates)
+        seen += len(rows)
+        linked += len(updates)
+        last_id = rows[-1][0]
+        print(f"  checked {seen} unlinked rows, linked {linked}")
+
+
+def link_batch(updates):
+    """Link (product_id, user_id, feedback id) rows still unlinked and count them; returns those linked."""
+    ids = ", ".join(["%s"] * len(updates))
+    with db_transaction() as cursor:
+        cursor.execute(CLAIM_SQL.format(ids=ids), [update[2] for update in updates])
+        unlinked = {row[0] for row in cursor.fetchall()}
+        updates = [update for update in updates if update[2] in unlinked]
+        if updates:
+            linked_ids = [update[2] for update in updates]
+            ids = ", ".join(["%s"] * len(updates))
+            cursor.executemany(LINK_SQL, updates)
+            cursor.execute(ADD_ROLLUP_SQL.format(ids=ids), linked_ids)
+            cursor.execute(ADD_DAILY_SQL.format(ids=ids), linked_ids)
+    return updates
+
+
+def rebuild_rollups():
+    # LOCK TABLES holds off the feedback queue's increments until the counts are replaced
+    with db_cursor() as cursor:
+        cursor.execute("LOCK TABLES feedback READ, feedback_product_rollup WRITE, feedback_product_daily WRITE")
+        try:
+            cursor.execute(REBUILD_ROLLUP_SQL)
+            cursor.execute(REBUILD_DAILY_SQL)
+        finally:
+            cursor.execute("UNLOCK TABLES")
+
+
+def copy_owners(batch_size):
+    with db_cursor() as cursor:
+        cursor.execute(MAX_ID_SQL)
+        max_id = cursor.fetchone()[0]
+    updated = 0
+    for start in range(0, max_id, batch_size):
+        with db_transaction() as cursor:
+            cursor.execute(OWNER_SQL, (start, start + batch_size))
+            updated += cursor.rowcount
+    return updated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recount the rollups from the feedback table instead of linking")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.rebuild:
+            rebuild_rollups()
+            print("Rebuilt feedback_product_rollup and feedback_product_daily")
+            return 0
+        print("Linking feedback to products by name")
+        seen, linked = link_unlinked(args.batch_size)
+        print(f"Linked {linked} of {seen} unlinked rows")
+        print(f"Set the owning shop on {copy_owners(args.batch_size)} linked rows")
+    except (Error, ProductLookupError) as e:
+        print("Backfill failed:", e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Versioned schema migrations for the ChatOn MySQL database.
+
+Migrations are the numbered files in sql/migrations (0001_base_schema.sql,
+...). They are applied in order, once each, and recorded in
+schema_migrations. Run from the ChatOn directory:
+
+    python -m schema.migrate status
+    python -m schema.migrate up [--to VERSION] [--dry-run]
+    python -m schema.migrate baseline VERSION
+
+A database that already has the tables of 0001-0003 (created by hand from
+the old sql/*.sql files) should run `baseline 3` once, then `up`.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+from collections import namedtuple
+
+import mysql.connector
+
+from actions.db import DB_CONFIG
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql", "migrations")
+
+MIGRATION_FILE_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+Migration = namedtuple("Migration", ["version", "name", "path", "sql", "checksum"])
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT NOT NULL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+class MigrationError(Exception):
+    pass
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        migrations.append(Migration(
+            int(match.group(1)), match.group(2), path, sql,
+            hashlib.sha256(sql.encode("utf-8")).hexdigest(),
+        ))
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise MigrationError("Two migration files share a version number.")
+    return migrations
+
+
+def split_statements(sql):
+    """Statements of a migration file, without `--` comments."""
+    statements, current = [], []
+    quote = None
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if quote:
+            current.append(char)
+            if char == "\\" and quote != "`" and i + 1 < len(sql):
+                current.append(sql[i + 1])
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in ("'", '"', "`"):
+            quote = char
+            current.append(char)
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = len(sql) if end < 0 else end
+            continue
+        elif char == ";":
+            statements.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    statements.append("".join(current).strip())
+    return [s for s in statements if s]
+
+
+def applied_migrations(cursor):
+    cursor.execute(CREATE_TABLE_SQL)
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cursor.fetchall())
+
+
+def record(cursor, migration):
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+        (migration.version, migration.name, migration.checksum)
+    )
+
+
+def apply(connection, migration):
+    # MySQL commits DDL implicitly, so a failed migration is not rolled back;
+    # it stays unrecorded and has to be fixed up by hand before re-running.
+    cursor = connection.cursor()
+    try:
+        for statement in split_statements(migration.sql):
+            cursor.execute(statement)
+            if cursor.with_rows:
+                cursor.fetchall()
+        record(cursor, migration)
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def status(connection, migrations):
+    cursor = connection.cursor()
+    applied = applied_migrations(cursor)
+    cursor.close()
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum is None:
+            state = "pending"
+        elif checksum != migration.checksum:
+            state = "applied, file changed since"
+        else:
+            state = "applied"
+        print(f"{migration.version:04d}  {migration.name:<32} {state}")
+    return 0
+
+
+def up(connection, migrations, target=None, dry_run=False):
+    cursor = connection.cursor()
+    applied = applied_migrations(cursor)
+    cursor.close()
+    pending = [
+        m for m in migrations
+        if m.version not in applied and (target is None or m.version <= target)
+    ]
+    if not pending:
+        print("Schema is up to date.")
+    for migration in pending:
+        print(f"Applying {migration.version:04d}_{migration.name}")
+        if dry_run:
+            for statement in split_statements(migration.sql):
+                print(statement + ";\n")
+            continue
+        try:
+            apply(connection, migration)
+        except mysql.connector.Error as e:
+            print(f"Migration {migration.version:04d} failed: {e}", file=sys.stderr)
+            return 1
+    return 0
+
+
+def baseline(connection, migrations, target):
+    """Mark migrations up to `target` as applied without running them."""
+    cursor = connection.cursor()
+    applied = applied_migrations(cursor)
+    for migration in migrations:
+        if migration.version <= target and migration.version not in applied:
+            record(cursor, migration)
+            print(f"Marked {migration.version:04d}_{migration.name} as applied")
+    connection.commit()
+    cursor.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status")
+    up_parser = commands.add_parser("up")
+    up_parser.add_argument("--to", type=int, dest="target")
+    up_parser.add_argument("--dry-run", action="store_true")
+    baseline_parser = commands.add_parser("baseline")
+    baseline_parser.add_argument("version", type=int)
+    args = parser.parse_args(argv)
+
+    migrations = load_migrations()
+    connection = mysql.connector.connect(**dict(DB_CONFIG, autocommit=False))
+    try:
+        if args.command == "status":
+            return status(connection, migrations)
+        if args.command == "up":
+            return up(connection, migrations, args.target, args.dry_run)
+        return baseline(connection, migrations, args.version)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+-- Tables the Flask app and the action server have always used. Existing
+-- databases already have them, so every statement is IF NOT EXISTS.
+CREATE TABLE IF NOT EXISTS users (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(255) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    role VARCHAR(20) NOT NULL DEFAULT 'user',
+    shop_name VARCHAR(255),
+    shop_address VARCHAR(255),
+    contact_email VARCHAR(255),
+    phone_number VARCHAR(50),
+    shop_description TEXT,
+    UNIQUE KEY uq_users_username (username)
+);
+
+CREATE TABLE IF NOT EXISTS product_catalog (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    `Product Name` VARCHAR(255),
+    Brand VARCHAR(255),
+    Size VARCHAR(255),
+    SellPrice DECIMAL(10, 2),
+    Description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS feedback (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    product_id INT NULL,
+    product_name VARCHAR(255),
+    feedback_text TEXT,
+    sentiment VARCHAR(20),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,10 @@
+-- Change feed for product_catalog, written by the Flask app in the same
+-- transaction as each insert/update/delete. The auto-increment id is the
+-- catalog version; the action server applies rows with id > its last seen.
+CREATE TABLE IF NOT EXISTS catalog_changes (
+    id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    product_id INT NOT NULL,
+    op ENUM('insert', 'update', 'delete') NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_catalog_changes_product (product_id)
+);
@@ -0,0 +1,48 @@
+-- Per-product sentiment counters kept up to date by the action server's
+-- feedback queue, in the same transaction as each feedback batch.
+-- `other` counts sentiments outside positive/negative/neutral, and rows
+-- not scored yet. The sums below never see NULL (`<=>`, IS NULL), or a
+-- product whose feedback is all unscored would sum to NULL and break the
+-- NOT NULL columns.
+CREATE TABLE IF NOT EXISTS feedback_sentiment_rollup (
+    product_name VARCHAR(255) NOT NULL PRIMARY KEY,
+    positive INT UNSIGNED NOT NULL DEFAULT 0,
+    negative INT UNSIGNED NOT NULL DEFAULT 0,
+    neutral INT UNSIGNED NOT NULL DEFAULT 0,
+    other INT UNSIGNED NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Same counters bucketed by UTC day, for trends.
+CREATE TABLE IF NOT EXISTS feedback_sentiment_daily (
+    product_name VARCHAR(255) NOT NULL,
+    day DATE NOT NULL,
+    positive INT UNSIGNED NOT NULL DEFAULT 0,
+    negative INT UNSIGNED NOT NULL DEFAULT 0,
+    neutral INT UNSIGNED NOT NULL DEFAULT 0,
+    other INT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_name, day)
+);
+
+-- One-off backfill from existing feedback, run right after creating
+-- the tables and before the action server starts writing to them.
+INSERT INTO feedback_sentiment_rollup (product_name, positive, negative, neutral, other)
+SELECT product_name,
+       SUM(sentiment <=> 'positive'),
+       SUM(sentiment <=> 'negative'),
+       SUM(sentiment <=> 'neutral'),
+       SUM(sentiment IS NULL OR sentiment NOT IN ('positive', 'negative', 'neutral'))
+FROM feedback
+WHERE product_name IS NOT NULL
+GROUP BY product_name;
+
+INSERT INTO feedback_sentiment_daily (product_name, day, positive, negative, neutral, other)
+SELECT product_name,
+       DATE(created_at),
+       SUM(sentiment <=> 'positive'),
+       SUM(sentiment <=> 'negative'),
+       SUM(sentiment <=> 'neutral'),
+       SUM(sentiment IS NULL OR sentiment NOT IN ('positive', 'negative', 'neutral'))
+FROM feedback
+WHERE product_name IS NOT NULL
+GROUP BY product_name, DATE(created_at);
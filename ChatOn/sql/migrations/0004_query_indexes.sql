@@ -0,0 +1,22 @@
+-- Indexes for the hot queries; `python -m schema.explain` checks them.
+
+-- Dashboard listing, export and bulk import: one shop's products by id,
+-- name, brand or price (keyset pages), plus the admin-wide sorts.
+ALTER TABLE product_catalog
+    ADD INDEX idx_product_catalog_user (user_id),
+    ADD INDEX idx_product_catalog_user_name (user_id, `Product Name`),
+    ADD INDEX idx_product_catalog_user_brand (user_id, Brand),
+    ADD INDEX idx_product_catalog_user_price (user_id, SellPrice),
+    ADD INDEX idx_product_catalog_name (`Product Name`),
+    ADD INDEX idx_product_catalog_brand (Brand),
+    ADD INDEX idx_product_catalog_price (SellPrice);
+
+-- Listing search (?q=) on words of three or more letters.
+ALTER TABLE product_catalog
+    ADD FULLTEXT INDEX ft_product_catalog_search (`Product Name`, Brand, Description);
+
+-- Dashboard "Feedback Received": newest feedback per product and newest
+-- unlinked feedback; per-product lookups by name.
+ALTER TABLE feedback
+    ADD INDEX idx_feedback_product_created (product_id, created_at),
+    ADD INDEX idx_feedback_product_name (product_name);
@@ -0,0 +1,30 @@
+-- Feedback resolved to the catalog product it is about (and that product's
+-- shop) when it is stored. Rows written before this stay NULL until
+-- `python -m schema.link_feedback` resolves them.
+ALTER TABLE feedback
+    ADD COLUMN user_id INT NULL AFTER product_id,
+    ADD INDEX idx_feedback_user_created (user_id, created_at);
+
+-- Per-product sentiment counters, the id-keyed twin of
+-- feedback_sentiment_rollup; filled by the feedback queue from now on and
+-- by the link_feedback job as it links older rows.
+CREATE TABLE IF NOT EXISTS feedback_product_rollup (
+    product_id INT NOT NULL PRIMARY KEY,
+    positive INT UNSIGNED NOT NULL DEFAULT 0,
+    negative INT UNSIGNED NOT NULL DEFAULT 0,
+    neutral INT UNSIGNED NOT NULL DEFAULT 0,
+    other INT UNSIGNED NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Backfill from the feedback linked so far; link_feedback adds the rows it
+-- links later.
+INSERT INTO feedback_product_rollup (product_id, positive, negative, neutral, other)
+SELECT product_id,
+       SUM(sentiment <=> 'positive'),
+       SUM(sentiment <=> 'negative'),
+       SUM(sentiment <=> 'neutral'),
+       SUM(sentiment IS NULL OR sentiment NOT IN ('positive', 'negative', 'neutral'))
+FROM feedback
+WHERE product_id IS NOT NULL
+GROUP BY product_id;
@@ -0,0 +1,26 @@
+-- Per-product sentiment counters bucketed by UTC day, the id-keyed twin of
+-- feedback_sentiment_daily. The feedback queue writes this table and
+-- feedback_product_rollup from now on; migration 0007 drops the name-keyed
+-- feedback_sentiment_rollup and feedback_sentiment_daily.
+CREATE TABLE IF NOT EXISTS feedback_product_daily (
+    product_id INT NOT NULL,
+    day DATE NOT NULL,
+    positive INT UNSIGNED NOT NULL DEFAULT 0,
+    negative INT UNSIGNED NOT NULL DEFAULT 0,
+    neutral INT UNSIGNED NOT NULL DEFAULT 0,
+    other INT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, day)
+);
+
+-- Backfill from the feedback linked so far; link_feedback adds the rows it
+-- links later.
+INSERT INTO feedback_product_daily (product_id, day, positive, negative, neutral, other)
+SELECT product_id,
+       DATE(created_at),
+       SUM(sentiment <=> 'positive'),
+       SUM(sentiment <=> 'negative'),
+       SUM(sentiment <=> 'neutral'),
+       SUM(sentiment IS NULL OR sentiment NOT IN ('positive', 'negative', 'neutral'))
+FROM feedback
+WHERE product_id IS NOT NULL
+GROUP BY product_id, DATE(created_at);
@@ -0,0 +1,6 @@
+-- The name-keyed rollups from 0003 stopped being written when the feedback
+-- queue moved to feedback_product_rollup and feedback_product_daily (0005,
+-- 0006), so their counts only cover feedback from before then. Nothing reads
+-- them any more.
+DROP TABLE IF EXISTS feedback_sentiment_daily;
+DROP TABLE IF EXISTS feedback_sentiment_rollup;
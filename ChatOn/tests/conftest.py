@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The project packages (actions, app, channels) live next to tests/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,80 @@
+import pytest
+
+mysql_connector = pytest.importorskip("mysql.connector")
+
+from actions.db import ConnectionPool
+
+
+class ServerConnection:
+    """Stands in for a MySQL connection the server can drop (wait_timeout, restart, KILL)."""
+
+    def __init__(self):
+        self.alive = True
+        self.pings = 0
+
+    def kill(self):
+        self.alive = False
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self.pings += 1
+        if not self.alive:
+            if not reconnect:
+                raise mysql_connector.InterfaceError(msg="Connection to MySQL is not available")
+            self.alive = True
+
+    def query(self):
+        if not self.alive:
+            raise mysql_connector.OperationalError(msg="Lost connection to MySQL server during query")
+        return "ok"
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.alive = False
+
+
+def make_pool(**kwargs):
+    pool = ConnectionPool(size=2, timeout=1, **kwargs)
+    pool._open = ServerConnection
+    return pool
+
+
+def test_connection_killed_right_after_release_is_revived_on_checkout():
+    pool = make_pool()
+    with pool.connection() as connection:
+        assert connection.query() == "ok"
+    # Killed well inside any idle threshold
+    connection.kill()
+
+    with pool.connection() as reused:
+        assert reused is connection
+        assert reused.query() == "ok"
+    assert connection.pings == 1
+
+
+def test_idle_threshold_is_opt_in():
+    pool = make_pool(ping_after=30)
+    with pool.connection() as connection:
+        pass
+    connection.kill()
+
+    # Not pinged: a connection killed under the threshold is handed out as is
+    with pytest.raises(mysql_connector.OperationalError):
+        with pool.connection() as reused:
+            reused.query()
+    assert connection.pings == 0
+
+
+def test_unreachable_connection_is_replaced():
+    pool = make_pool()
+    with pool.connection() as connection:
+        pass
+
+    def refuse(reconnect=False, attempts=1, delay=0):
+        raise mysql_connector.InterfaceError(msg="Can't connect to MySQL server")
+    connection.ping = refuse
+
+    with pool.connection() as replacement:
+        assert replacement is not connection
+        assert replacement.query() == "ok"
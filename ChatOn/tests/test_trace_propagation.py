@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+pytest.importorskip("rasa")
+pytest.importorskip("sanic_testing")
+
+from rasa.core.channels.channel import register
+from rasa.shared.utils.common import class_from_module_path
+from rasa.shared.utils.io import read_yaml_file
+from rasa_sdk import Action, Tracker
+from sanic import Sanic
+
+from actions import tracing
+from app.rasa_proxy import RasaProxy
+
+CREDENTIALS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "credentials.yml")
+
+
+class SpanCollector(list):
+    """Stands in for the span exporter and keeps every finished span."""
+
+    def export(self, span):
+        self.append(span)
+
+
+class ChannelSession:
+    """requests.Session stand-in that posts to a Sanic app's test client."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def post(self, url, json=None, headers=None, **kwargs):
+        _, response = self.app.test_client.post("/webhooks/rest/webhook", json=json, headers=headers)
+        return ChannelResponse(response)
+
+
+class ChannelResponse:
+    # sanic_testing's response has `json` as a property, requests has a method
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.body = response.json
+
+    def raise_for_status(self):
+        assert self.status_code == 200, self.status_code
+
+    def json(self):
+        return self.body
+
+
+class RecordingAgent:
+    """Takes the place of Rasa's Agent: keeps the messages the channel hands over."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_message(self, message):
+        self.messages.append(message)
+
+
+class ActionEcho(Action):
+    def name(self):
+        return "action_echo"
+
+    @tracing.traced_action
+    def run(self, dispatcher, tracker, domain):
+        return []
+
+
+def rest_channel():
+    # The class Rasa builds from credentials.yml
+    credentials = read_yaml_file(CREDENTIALS)
+    path = next(key for key in credentials if key.endswith("RestInput"))
+    return class_from_module_path(path).from_credentials(credentials[path])
+
+
+def test_action_span_continues_proxy_span(monkeypatch):
+    spans = SpanCollector()
+    monkeypatch.setattr(tracing, "_exporter", spans)
+
+    channel = rest_channel()
+    assert channel.name() == "rest"
+    app = Sanic("trace_propagation_test")
+    app.ctx.agent = RecordingAgent()
+    register([channel], app, "/webhooks/")
+
+    proxy = RasaProxy(urls=["http://rasa/webhooks/rest/webhook"])
+    proxy._session = ChannelSession(app)
+    with tracing.start_trace("POST /webhook"):
+        assert proxy.send({"sender": "tester", "message": "price of drill"}) == []
+
+    # What Rasa stores in the tracker and sends to the action server
+    [message] = app.ctx.agent.messages
+    tracker = Tracker(
+        message.sender_id, {}, {"text": message.text, "intent": {}, "metadata": message.metadata},
+        [], False, None, {}, None,
+    )
+    ActionEcho().run(None, tracker, {})
+
+    [proxy_span] = [span for span in spans if span.name == "rasa POST"]
+    [action_span] = [span for span in spans if span.name == "action action_echo"]
+    assert action_span.trace_id == proxy_span.trace_id
+    assert action_span.parent_id == proxy_span.span_id